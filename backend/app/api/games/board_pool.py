@@ -0,0 +1,180 @@
+"""
+Pre-built memory match boards.
+
+Every board is derived deterministically from a seed, so a board can be
+shared or replayed by passing its seed back. A background task keeps a pool
+of ready boards per level, already rendered to JSON bytes, so starting a
+game is a pop from a queue. Boards built from an older meme index snapshot
+are discarded rather than served, and content filters (by default memes
+labelled ``very_offensive``) are applied when boards are built.
+"""
+import os
+import json
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, FrozenSet, List, NamedTuple, Optional
+
+from app.api.games.meme_index import MemeIndex
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+BOARD_POOL_SIZE = int(os.getenv("MEME_BOARD_POOL_SIZE", "32"))
+EXCLUDED_OFFENSIVE: FrozenSet[str] = frozenset(
+    label.strip() for label in os.getenv("MEME_BOARD_EXCLUDE_OFFENSIVE", "very_offensive").split(",") if label.strip()
+)
+
+# Number of distinct memes on a board per level
+LEVEL_MEME_COUNTS = {1: 6, 2: 25}
+
+
+class Board(NamedTuple):
+    """A rendered board ready to be sent"""
+    level: int
+    seed: int
+    version: Optional[float]  # Meme index snapshot the board was built from
+    memes: List[Dict[str, Any]]
+    body: bytes
+
+
+def board_rng(level: int, seed: int) -> random.Random:
+    """Random generator that reproduces the board for ``seed`` at ``level``"""
+    return random.Random(f"{level}:{seed}")
+
+
+def board_memes(records) -> List[Dict[str, Any]]:
+    """Card data for the sampled memes, in the shape returned by /initialize_game"""
+    return [
+        {
+            "id": i,
+            "image_name": record.image_name,
+            "humour": record.humour,
+            "sarcasm": record.sarcasm,
+            "offensive": record.offensive,
+            "motivational": record.motivational,
+            "overall_sentiment": record.overall_sentiment,
+        }
+        for i, record in enumerate(records, start=1)
+    ]
+
+
+class BoardPool:
+    """Per-level queues of pre-built boards, refilled in the background"""
+
+    def __init__(
+        self,
+        index: MemeIndex,
+        pool_size: int = BOARD_POOL_SIZE,
+        exclude_offensive: FrozenSet[str] = EXCLUDED_OFFENSIVE,
+    ):
+        self.index = index
+        self.pool_size = pool_size
+        self.exclude_offensive = exclude_offensive
+        self._boards: Dict[int, Deque[Board]] = {level: deque() for level in LEVEL_MEME_COUNTS}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.served_from_pool = 0
+        self.built_on_demand = 0
+        self.discarded = 0
+
+    def build(self, level: int, seed: Optional[int] = None) -> Optional[Board]:
+        """
+        Build the board for ``seed`` (a fresh random seed when omitted).
+
+        Returns:
+            The board, or None while the meme index is still loading
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+        version = self.index.version
+        records = self.index.sample(LEVEL_MEME_COUNTS[level], board_rng(level, seed), self.exclude_offensive)
+        if records is None:
+            return None
+        memes = board_memes(records)
+        return Board(level, seed, version, memes, json.dumps(memes).encode("utf-8"))
+
+    def get(self, level: int, seed: Optional[int] = None) -> Optional[Board]:
+        """
+        Return a board for ``level``: the seeded board if ``seed`` is given,
+        otherwise the next pre-built one (building on demand if the pool is empty).
+        """
+        if seed is not None:
+            return self.build(level, seed)
+
+        queue = self._boards[level]
+        while queue:
+            board = queue.popleft()
+            if board.version != self.index.version:
+                self.discarded += 1
+                continue
+            self.served_from_pool += 1
+            self._request_refill()
+            return board
+
+        self._request_refill()
+        board = self.build(level)
+        if board is not None:
+            self.built_on_demand += 1
+        return board
+
+    def _request_refill(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _fill(self) -> int:
+        built = 0
+        for level, queue in self._boards.items():
+            # Drop boards from an older index snapshot before topping up
+            while queue and queue[0].version != self.index.version:
+                queue.popleft()
+                self.discarded += 1
+            while len(queue) < self.pool_size:
+                board = self.build(level)
+                if board is None:
+                    return built
+                queue.append(board)
+                built += 1
+        return built
+
+    async def _refill_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                if self.index.ready:
+                    self._fill()
+            except Exception as e:
+                logger.error(f"Board pool refill failed: {e}", exc_info=True)
+            # Refill when a board is taken, and periodically to catch index reloads
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=5 if not self.index.ready else 60)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start refilling the pool on the running loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        """Cancel the refill task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool depth and counters"""
+        return {
+            "pool_size": self.pool_size,
+            "ready_boards": {level: len(queue) for level, queue in self._boards.items()},
+            "exclude_offensive": sorted(self.exclude_offensive),
+            "served_from_pool": self.served_from_pool,
+            "built_on_demand": self.built_on_demand,
+            "discarded": self.discarded,
+        }
@@ -0,0 +1,203 @@
+"""
+Image-presence manifest for the memory match game.
+
+The meme image directory is scanned once at boot, with file stats and
+content hashes spread over a thread pool, and the result is kept in memory
+so that request handlers never stat files and can answer conditional
+requests from the precomputed strong ETag. The manifest is reconciled
+against ``meme_fetch`` to count memes without images and images without a
+row, and a lightweight watcher rescans when the directory changes and
+notifies listeners (the meme index) so boards only ever contain playable
+memes.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Any
+
+from app.api.utils.http_cache import content_etag
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+MANIFEST_POLL_SECONDS = float(os.getenv("MEME_MANIFEST_POLL_SECONDS", "30"))
+MANIFEST_SCAN_WORKERS = int(os.getenv("MEME_MANIFEST_SCAN_WORKERS", "8"))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+class ImageEntry(NamedTuple):
+    """Metadata recorded for one image file"""
+    size: int
+    mtime_ns: int
+    etag: str  # Strong ETag (quoted content hash)
+
+
+class ImageManifest:
+    """In-memory record of the image files available on disk"""
+
+    def __init__(self, image_dir: Path, poll_seconds: float = MANIFEST_POLL_SECONDS):
+        self.image_dir = Path(image_dir)
+        self.poll_seconds = poll_seconds
+        self._entries: Dict[str, ImageEntry] = {}
+        self._dir_exists = False
+        self._dir_mtime_ns: Optional[int] = None
+        self._scanned_at: Optional[float] = None
+        self._scan_lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._mismatch: Dict[str, Any] = {
+            "db_rows": 0,
+            "playable": 0,
+            "missing_images": 0,
+            "unreferenced_images": 0,
+            "missing_examples": [],
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self._scanned_at is not None
+
+    @property
+    def dir_exists(self) -> bool:
+        return self._dir_exists
+
+    def __contains__(self, image_name: str) -> bool:
+        return image_name in self._entries
+
+    def get(self, image_name: str) -> Optional[ImageEntry]:
+        return self._entries.get(image_name)
+
+    def names(self) -> Iterable[str]:
+        return self._entries.keys()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback run after every rescan that changed the manifest"""
+        self._listeners.append(callback)
+
+    def _describe(self, name: str) -> Optional[ImageEntry]:
+        path = os.path.join(self.image_dir, name)
+        try:
+            st = os.stat(path)
+            previous = self._entries.get(name)
+            if previous is not None and (previous.size, previous.mtime_ns) == (st.st_size, st.st_mtime_ns):
+                return previous  # Unchanged since the last scan: keep its hash
+            return ImageEntry(st.st_size, st.st_mtime_ns, content_etag(path))
+        except OSError:
+            return None
+
+    def scan(self) -> bool:
+        """
+        Rescan the image directory (blocking).
+
+        Returns:
+            True if the set of files or their metadata changed
+        """
+        with self._scan_lock:
+            started = time.perf_counter()
+            try:
+                dir_mtime_ns = os.stat(self.image_dir).st_mtime_ns
+            except OSError:
+                changed = self._dir_exists or not self.ready
+                self._entries, self._dir_exists, self._dir_mtime_ns = {}, False, None
+                self._scanned_at = time.time()
+                if changed:
+                    logger.warning(f"Meme image directory does not exist: {self.image_dir}")
+                return changed
+
+            with os.scandir(self.image_dir) as it:
+                names = [
+                    entry.name for entry in it
+                    if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file()
+                ]
+            with ThreadPoolExecutor(max_workers=MANIFEST_SCAN_WORKERS) as pool:
+                stats = list(pool.map(self._describe, names, chunksize=64))
+            entries = {name: entry for name, entry in zip(names, stats) if entry is not None}
+
+            changed = entries != self._entries or not self._dir_exists
+            self._entries, self._dir_exists, self._dir_mtime_ns = entries, True, dir_mtime_ns
+            self._scanned_at = time.time()
+            logger.info(
+                f"Meme image manifest: {len(entries)} files in {self.image_dir} "
+                f"({time.perf_counter() - started:.2f}s)"
+            )
+            return changed
+
+    def reconcile(self, db_names: Iterable[str]) -> List[str]:
+        """
+        Compare catalogue rows with the files on disk and record mismatch counts.
+
+        Args:
+            db_names: ``image_name`` of every catalogue row
+
+        Returns:
+            The names that are playable (row and image both present)
+        """
+        db_names = list(db_names)
+        if not self._dir_exists:
+            # Development environments may not have the images; treat every row as playable
+            playable = db_names
+            missing: List[str] = []
+        else:
+            entries = self._entries
+            playable = [name for name in db_names if name in entries]
+            missing = [name for name in db_names if name not in entries]
+        unreferenced = len(set(self._entries) - set(db_names))
+        self._mismatch = {
+            "db_rows": len(db_names),
+            "playable": len(playable),
+            "missing_images": len(missing),
+            "unreferenced_images": unreferenced,
+            "missing_examples": missing[:10],
+        }
+        if missing:
+            logger.warning(f"{len(missing)} meme_fetch rows have no image in {self.image_dir}")
+        return playable
+
+    def _directory_changed(self) -> bool:
+        try:
+            return os.stat(self.image_dir).st_mtime_ns != self._dir_mtime_ns
+        except OSError:
+            return self._dir_exists
+
+    async def _watch_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                # Adding, removing or renaming files updates the directory mtime
+                if self._directory_changed() and await asyncio.to_thread(self.scan):
+                    for callback in self._listeners:
+                        callback()
+            except Exception as e:
+                logger.error(f"Meme image manifest rescan failed: {e}", exc_info=True)
+
+    def start_watching(self) -> None:
+        """Poll the directory for changes on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        """Stop watching the directory"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return manifest size and the last reconciliation counts"""
+        return {
+            "ready": self.ready,
+            "directory": str(self.image_dir),
+            "directory_exists": self._dir_exists,
+            "files": len(self._entries),
+            "scanned_at": self._scanned_at,
+            "poll_seconds": self.poll_seconds,
+            **self._mismatch,
+        }
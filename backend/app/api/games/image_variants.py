@@ -0,0 +1,243 @@
+"""
+Resized and re-encoded variants of meme images.
+
+A game board shows up to 25 small cards, so sending the full-size original
+JPEG/PNG for each card wastes most of the bytes. Variants are rendered with
+Pillow in a process pool, either lazily on first request or ahead of time
+with ``python -m app.api.games.image_variants <image_dir>``, and stored in an
+on-disk cache keyed by the source file's size and mtime. The best format the
+client accepts (AVIF when this Pillow build can encode it, then WebP) is
+chosen from the ``Accept`` header; the original is served if a variant
+cannot be produced.
+"""
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+VARIANT_CACHE_DIR = Path(os.getenv("MEME_VARIANT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "meme_variants")))
+VARIANT_WORKERS = int(os.getenv("MEME_VARIANT_WORKERS", str(min(4, os.cpu_count() or 1))))
+VARIANT_QUALITY = int(os.getenv("MEME_VARIANT_QUALITY", "80"))
+
+# Longest edge in pixels per size; None keeps the original dimensions
+SIZES: Dict[str, Optional[int]] = {
+    "thumb": int(os.getenv("MEME_THUMB_MAX_PX", "320")),
+    "full": None,
+}
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+}
+
+Image.init()
+# Encoders in order of preference: (format, Pillow format name, media type)
+ENCODERS = [
+    (fmt, pil_format, media_type)
+    for fmt, pil_format, media_type in (
+        ("avif", "AVIF", "image/avif"),
+        ("webp", "WEBP", "image/webp"),
+    )
+    if pil_format in Image.SAVE
+]
+
+
+def media_type_for(path) -> str:
+    """Return the media type for an image path based on its extension"""
+    return MEDIA_TYPES.get(os.path.splitext(str(path))[1].lower(), "image/jpeg")
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the best encoder the client accepts.
+
+    Args:
+        accept: Value of the request's Accept header
+
+    Returns:
+        "avif", "webp", or None to keep the original format
+    """
+    if not accept:
+        return None
+    accepted = {part.split(";", 1)[0].strip().lower() for part in accept.split(",")}
+    for fmt, _, media_type in ENCODERS:
+        if media_type in accepted:
+            return fmt
+    return None
+
+
+def _render(source: str, target: str, max_px: Optional[int], pil_format: Optional[str], quality: int) -> str:
+    """Render one variant (runs in a worker process)"""
+    with Image.open(source) as image:
+        save_format = pil_format or image.format
+        image = ImageOps.exif_transpose(image)
+        if max_px and max(image.size) > max_px:
+            image.thumbnail((max_px, max_px), Image.LANCZOS)
+        if save_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode == "P":
+            image = image.convert("RGBA")
+        options = {"quality": quality}
+        if save_format == "WEBP":
+            options["method"] = 4
+        elif save_format in ("JPEG", "PNG"):
+            options["optimize"] = True
+        tmp = f"{target}.{os.getpid()}.tmp"
+        image.save(tmp, format=save_format, **options)
+    os.replace(tmp, target)
+    return target
+
+
+class ImageVariantCache:
+    """Lazily rendered, disk-cached image variants"""
+
+    def __init__(self, cache_dir: Path = VARIANT_CACHE_DIR, workers: int = VARIANT_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.renders = 0
+        self.failures = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def run(self, fn, *args):
+        """Run a rendering function in the worker process pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+
+    def variant_path(self, source: Path, size: str, fmt: Optional[str]) -> Tuple[Path, Optional[str]]:
+        """
+        Cache location of a variant and the Pillow format used to encode it.
+
+        The name embeds the source size and mtime, so replacing an image
+        yields a new variant instead of a stale one.
+        """
+        st = source.stat()
+        if fmt:
+            pil_format = next(pil for name, pil, _ in ENCODERS if name == fmt)
+            ext = f".{fmt}"
+        else:
+            pil_format, ext = None, source.suffix.lower()
+        name = f"{source.stem}.{st.st_size:x}{st.st_mtime_ns:x}{ext}"
+        return self.cache_dir / size / name, pil_format
+
+    def wants_variant(self, source: Path, size: str, fmt: Optional[str]) -> bool:
+        """Whether a variant differs from the original (animated GIFs are left alone)"""
+        if source.suffix.lower() == ".gif":
+            return False
+        return SIZES.get(size) is not None or fmt is not None
+
+    async def get(self, source: Path, size: str = "full", fmt: Optional[str] = None) -> Path:
+        """
+        Return the path to serve for ``source``, rendering the variant if needed.
+
+        Falls back to the original file if the variant cannot be produced.
+        """
+        if size not in SIZES or not self.wants_variant(source, size, fmt):
+            return source
+        try:
+            target, pil_format = self.variant_path(source, size, fmt)
+        except OSError:
+            return source
+        if target.is_file():
+            self.hits += 1
+            return target
+
+        key = str(target)
+        pending = self._pending.get(key)
+        if pending is None:
+            # First request for this variant renders it; concurrent ones wait on the same future
+            target.parent.mkdir(parents=True, exist_ok=True)
+            pending = asyncio.ensure_future(
+                self.run(_render, str(source), key, SIZES[size], pil_format, VARIANT_QUALITY)
+            )
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+            self.renders += 1
+        try:
+            await asyncio.shield(pending)
+            return target
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Could not render {size}/{fmt or 'original'} variant of {source.name}: {e}")
+            return source
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, object]:
+        """Return cache counters"""
+        return {
+            "cache_dir": str(self.cache_dir),
+            "encoders": [fmt for fmt, _, _ in ENCODERS],
+            "hits": self.hits,
+            "renders": self.renders,
+            "failures": self.failures,
+        }
+
+
+# Process-wide variant cache shared by the image endpoints
+variant_cache = ImageVariantCache()
+
+
+def pregenerate(image_dir: Path, cache: ImageVariantCache = variant_cache) -> int:
+    """
+    Render every variant for the images in ``image_dir`` ahead of time.
+
+    Returns:
+        Number of variants rendered
+    """
+    jobs = []
+    for source in sorted(Path(image_dir).iterdir()):
+        if not source.is_file() or source.suffix.lower() not in MEDIA_TYPES:
+            continue
+        for size in SIZES:
+            for fmt in [None] + [name for name, _, _ in ENCODERS]:
+                if not cache.wants_variant(source, size, fmt):
+                    continue
+                target, pil_format = cache.variant_path(source, size, fmt)
+                if not target.is_file():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    jobs.append((str(source), str(target), SIZES[size], pil_format, VARIANT_QUALITY))
+
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=cache.workers) as pool:
+        futures = [pool.submit(_render, *job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                future.result()
+                rendered += 1
+            except Exception as e:
+                logger.warning(f"Could not render {job[1]}: {e}")
+    return rendered
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("/app/meme_images")
+    count = pregenerate(directory)
+    print(f"Rendered {count} variants into {variant_cache.cache_dir}")
@@ -0,0 +1,347 @@
+"""
+Meme metadata CSVs and image directory listings, loaded once per process.
+
+The legacy meme endpoints used to re-read the metadata CSV with
+``pd.read_csv`` and glob the image directory on every request. A
+``MemeCatalogue`` parses the CSV once, keeps a columnar cache of it next to
+the variant cache (Parquet when pyarrow is installed, otherwise a pickle of
+the DataFrame) so later processes skip CSV parsing, and exposes the rows as
+dicts indexed by image name. A ``DirectoryListing`` keeps the image file
+names of a directory from a single ``os.scandir`` pass, which async handlers
+run in a worker thread via ``arefresh``. Both re-check the file or directory
+mtime at most every ``MEME_CATALOGUE_CHECK_SECONDS`` and reload only when it
+changed. An ``ImageResolver`` maps requested image names to files across
+several listings without touching the filesystem per request.
+"""
+import os
+import time
+import asyncio
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+CATALOGUE_CACHE_DIR = Path(os.getenv("MEME_CATALOGUE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "meme_catalogue")))
+CHECK_SECONDS = float(os.getenv("MEME_CATALOGUE_CHECK_SECONDS", "30"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+
+
+def _clean(value: Any) -> Any:
+    """Convert NaN to None and numpy scalars to Python types so rows serialise as JSON"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+class MemeCatalogue:
+    """Rows of the first existing CSV among ``csv_paths``, reloaded when it changes"""
+
+    def __init__(self, csv_paths: Sequence[str], cache_dir: Path = CATALOGUE_CACHE_DIR, check_seconds: float = CHECK_SECONDS):
+        """
+        Args:
+            csv_paths: Candidate CSV files in order of preference
+            cache_dir: Where the Parquet/pickle copy of the parsed CSV is kept
+            check_seconds: Minimum interval between mtime checks
+        """
+        self.csv_paths = list(csv_paths)
+        self.cache_dir = Path(cache_dir)
+        self.check_seconds = check_seconds
+        self._source: Optional[Tuple[str, int, int]] = None  # (path, size, mtime_ns) of the loaded CSV
+        self._frame = pd.DataFrame()
+        self._rows: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _current_source(self) -> Optional[Tuple[str, int, int]]:
+        for path in self.csv_paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return path, st.st_size, st.st_mtime_ns
+        return None
+
+    def _cache_path(self, source: Tuple[str, int, int]) -> Path:
+        digest = hashlib.blake2b(repr(source).encode(), digest_size=10).hexdigest()
+        return self.cache_dir / f"{Path(source[0]).stem}.{digest}.{'parquet' if HAS_PARQUET else 'pkl'}"
+
+    def _read(self, source: Tuple[str, int, int]) -> pd.DataFrame:
+        """Read the cached columnar copy of ``source``, parsing the CSV if there is none"""
+        cache_path = self._cache_path(source)
+        if cache_path.is_file():
+            try:
+                return pd.read_parquet(cache_path) if HAS_PARQUET else pd.read_pickle(cache_path)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable meme catalogue cache {cache_path}: {e}")
+
+        frame = pd.read_csv(source[0])
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            if HAS_PARQUET:
+                frame.to_parquet(tmp, index=False)
+            else:
+                frame.to_pickle(tmp)
+            os.replace(tmp, cache_path)
+        except Exception as e:
+            logger.warning(f"Could not write meme catalogue cache {cache_path}: {e}")
+        return frame
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload if the source CSV changed (checked at most every ``check_seconds``)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.check_seconds:
+                return
+            source = self._current_source()
+            self._checked_at = now
+            if source == self._source:
+                return
+            frame = pd.DataFrame()
+            if source is not None:
+                try:
+                    frame = self._read(source)
+                except Exception as e:
+                    logger.error(f"Error loading meme data from {source[0]}: {e}")
+            rows = [
+                {column: _clean(value) for column, value in row.items()}
+                for row in frame.to_dict(orient="records")
+            ]
+            by_name = {row["image_name"]: i for i, row in enumerate(rows) if row.get("image_name")}
+            self._frame, self._rows, self._by_name, self._source = frame, rows, by_name, source
+            self.loads += 1
+            logger.info(f"Meme catalogue loaded {len(rows)} rows from {source[0] if source else 'nowhere'}")
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """The parsed CSV (shared: do not modify)"""
+        self.refresh()
+        return self._frame
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.frame.columns)
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._rows)
+
+    def rows(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Copies of the first ``limit`` rows (all rows by default)"""
+        self.refresh()
+        rows = self._rows
+        return [dict(row) for row in (rows if limit is None else rows[:limit])]
+
+    def get(self, image_name: str) -> Optional[Dict[str, Any]]:
+        """Look up a row by image name"""
+        self.refresh()
+        rows, by_name = self._rows, self._by_name
+        index = by_name.get(image_name)
+        return dict(rows[index]) if index is not None else None
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Draw up to ``count`` distinct rows.
+
+        Returns:
+            (row position, row copy) pairs
+        """
+        self.refresh()
+        rows = self._rows
+        positions = (rng or random).sample(range(len(rows)), min(count, len(rows)))
+        return [(i, dict(rows[i])) for i in positions]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self._source[0] if self._source else None,
+            "rows": len(self._rows),
+            "loads": self.loads,
+            "cache_format": "parquet" if HAS_PARQUET else "pickle",
+        }
+
+
+class DirectoryListing:
+    """Image file names in a directory, re-listed when the directory mtime changes"""
+
+    def __init__(self, directory: str, extensions: Sequence[str] = IMAGE_EXTENSIONS, check_seconds: float = CHECK_SECONDS):
+        self.directory = directory
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.check_seconds = check_seconds
+        self._mtime_ns: Optional[int] = None
+        self._names: List[str] = []
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.scans = 0
+
+    def due(self) -> bool:
+        """Whether the next access will re-check the directory"""
+        return time.monotonic() - self._checked_at >= self.check_seconds
+
+    async def arefresh(self) -> None:
+        """Re-check the directory in a worker thread so a rescan does not block the event loop"""
+        if self.due():
+            await asyncio.to_thread(self.refresh)
+
+    def refresh(self, force: bool = False) -> None:
+        """Re-list the directory if its mtime changed (checked at most every ``check_seconds``)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.check_seconds:
+                return
+            self._checked_at = now
+            try:
+                mtime_ns = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                if self._mtime_ns is not None:
+                    self._mtime_ns, self._names = None, []
+                return
+            if mtime_ns == self._mtime_ns:
+                return
+            with os.scandir(self.directory) as entries:
+                names = sorted(
+                    entry.name for entry in entries
+                    if entry.name.lower().endswith(self.extensions) and entry.is_file()
+                )
+            self._mtime_ns, self._names = mtime_ns, names
+            self.scans += 1
+
+    @property
+    def exists(self) -> bool:
+        self.refresh()
+        return self._mtime_ns is not None
+
+    def names(self) -> List[str]:
+        self.refresh()
+        return self._names
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Draw up to ``count`` distinct file names"""
+        names = self.names()
+        return (rng or random).sample(names, min(count, len(names)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"directory": self.directory, "files": len(self._names), "scans": self.scans}
+
+
+class ImageResolver:
+    """
+    Name -> path index over directory listings.
+
+    A name resolves to an exact file name in one of the ``exact`` listings,
+    else to a file with the same stem in one of the ``by_stem`` listings
+    (extensions tried in ``extension_order``). Listings earlier in each list
+    win. Names that resolve to nothing are remembered until a listing changes.
+    """
+
+    def __init__(
+        self,
+        exact: Sequence[DirectoryListing],
+        by_stem: Sequence[DirectoryListing],
+        extension_order: Sequence[str],
+        max_misses: int = 10000,
+    ):
+        self.exact = list(exact)
+        self.by_stem = list(by_stem)
+        self.extension_order = {ext: rank for rank, ext in enumerate(extension_order)}
+        self.max_misses = max_misses
+        self._sources: Optional[List[List[str]]] = None
+        self._exact: Dict[str, str] = {}
+        self._stems: Dict[str, str] = {}
+        self._misses: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+        self.rebuilds = 0
+        self.negative_hits = 0
+
+    @property
+    def listings(self) -> List[DirectoryListing]:
+        return self.exact + [listing for listing in self.by_stem if listing not in self.exact]
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback run whenever a listing change rebuilds the index"""
+        self._listeners.append(callback)
+
+    async def arefresh(self) -> None:
+        """Re-check every listing off the event loop"""
+        for listing in self.listings:
+            await listing.arefresh()
+
+    def _index(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        sources = [listing.names() for listing in self.listings]
+        if self._sources is not None and all(a is b for a, b in zip(sources, self._sources)):
+            return self._exact, self._stems
+        with self._lock:
+            exact: Dict[str, str] = {}
+            for listing in self.exact:
+                for name in listing.names():
+                    exact.setdefault(name, os.path.join(listing.directory, name))
+
+            stems: Dict[str, str] = {}
+            for listing in self.by_stem:
+                best: Dict[str, Tuple[int, str]] = {}
+                for name in listing.names():
+                    stem, ext = os.path.splitext(name)
+                    rank = self.extension_order.get(ext)
+                    if rank is not None and (stem not in best or rank < best[stem][0]):
+                        best[stem] = (rank, name)
+                for stem, (_, name) in best.items():
+                    stems.setdefault(stem, os.path.join(listing.directory, name))
+
+            self._exact, self._stems, self._sources = exact, stems, sources
+            self._misses.clear()
+            self.rebuilds += 1
+        for callback in self._listeners:
+            callback()
+        return exact, stems
+
+    def resolve(self, image_name: str) -> Optional[str]:
+        """
+        Find the file to serve for ``image_name``.
+
+        Returns:
+            The file path, or None if no listing has a match
+        """
+        exact, stems = self._index()
+        if image_name in self._misses:
+            self.negative_hits += 1
+            return None
+        path = exact.get(image_name) or stems.get(os.path.splitext(image_name)[0])
+        if path is None:
+            with self._lock:
+                self._misses[image_name] = None
+                while len(self._misses) > self.max_misses:
+                    self._misses.popitem(last=False)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exact_names": len(self._exact),
+            "stems": len(self._stems),
+            "cached_misses": len(self._misses),
+            "negative_hits": self.negative_hits,
+            "rebuilds": self.rebuilds,
+        }
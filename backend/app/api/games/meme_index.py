@@ -0,0 +1,231 @@
+"""
+In-memory meme catalogue index for the memory match game.
+
+Game initialisation used to run ``ORDER BY random() LIMIT n`` against
+``meme_fetch``, which sorts the whole table on every request. The index
+loads the catalogue once, keeps the positions of memes whose images are
+listed in the image manifest in a compact array, and draws boards from
+memory in O(n). It is refreshed periodically in the background and is
+invalidated whenever the manifest sees the image directory change. Until
+the first load completes, ``sample_from_db`` serves boards with a
+TABLESAMPLE (PostgreSQL) or random-offset query instead of a full sort.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from array import array
+from collections import namedtuple
+from typing import List, Optional, Dict, Any, FrozenSet
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.meme import MemeFetch
+from app.api.games.image_manifest import ImageManifest
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+MEME_INDEX_REFRESH_SECONDS = float(os.getenv("MEME_INDEX_REFRESH_SECONDS", "600"))
+
+# Rows fetched per wanted meme by the cold-path queries, so that memes with
+# missing images can be skipped without a second round trip
+COLD_OVERSAMPLE = 4
+
+# Lightweight row with the same attribute names as MemeFetch
+MemeRow = namedtuple(
+    "MemeRow",
+    ["image_name", "humour", "sarcasm", "offensive", "motivational", "overall_sentiment"],
+)
+
+_MEME_COLUMNS = (
+    MemeFetch.image_name,
+    MemeFetch.humour,
+    MemeFetch.sarcasm,
+    MemeFetch.offensive,
+    MemeFetch.motivational,
+    MemeFetch.overall_sentiment,
+)
+
+
+def _has_image_name():
+    return sqlalchemy.and_(MemeFetch.image_name.is_not(None), MemeFetch.image_name != '')
+
+
+class MemeIndex:
+    """Catalogue of playable memes held in memory"""
+
+    def __init__(self, manifest: ImageManifest, refresh_seconds: float = MEME_INDEX_REFRESH_SECONDS):
+        self.manifest = manifest
+        self.refresh_seconds = refresh_seconds
+        self._rows: List[MemeRow] = []
+        self._playable = array('I')  # Positions in _rows whose image file is present
+        self._filtered: Dict[FrozenSet[str], array] = {}  # Playable positions per excluded offensive labels
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._load_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        manifest.add_listener(self.invalidate)
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def version(self) -> Optional[float]:
+        """Load time of the current snapshot; changes whenever the index reloads"""
+        return self._loaded_at
+
+    def load(self) -> int:
+        """
+        Reload the catalogue from the database (blocking).
+
+        Returns:
+            Number of playable memes
+        """
+        with self._load_lock:
+            started = time.perf_counter()
+            with SessionLocal() as db:
+                # Ordered so that seeded sampling is reproducible across reloads
+                query = db.query(*_MEME_COLUMNS).filter(_has_image_name()).order_by(MemeFetch.image_name)
+                rows = [MemeRow(*row) for row in query.all()]
+
+            if not self.manifest.ready:
+                self.manifest.scan()
+            present = set(self.manifest.reconcile(row.image_name for row in rows))
+            playable = array('I', (i for i, row in enumerate(rows) if row.image_name in present))
+
+            # Swap in the new snapshot; readers keep whichever pair they already hold
+            self._rows, self._playable, self._filtered = rows, playable, {}
+            self._loaded_at = time.time()
+            self._stale = False
+            logger.info(
+                f"Meme index loaded: {len(playable)}/{len(rows)} memes playable "
+                f"({time.perf_counter() - started:.2f}s)"
+            )
+            return len(playable)
+
+    def _positions(self, rows: List[MemeRow], playable: array, filtered: Dict, exclude_offensive: FrozenSet[str]) -> array:
+        if not exclude_offensive:
+            return playable
+        positions = filtered.get(exclude_offensive)
+        if positions is None:
+            positions = array('I', (i for i in playable if rows[i].offensive not in exclude_offensive))
+            filtered[exclude_offensive] = positions
+        return positions
+
+    def sample(
+        self,
+        count: int,
+        rng: Optional[random.Random] = None,
+        exclude_offensive: FrozenSet[str] = frozenset(),
+    ) -> Optional[List[MemeRow]]:
+        """
+        Draw ``count`` distinct playable memes.
+
+        Args:
+            count: Number of memes wanted
+            rng: Seeded generator for reproducible boards (module RNG by default)
+            exclude_offensive: ``offensive`` labels to leave out, e.g. {"very_offensive"}
+
+        Returns:
+            The sampled rows (fewer if the catalogue is smaller), or None if
+            the index has not been loaded yet
+        """
+        if not self.ready:
+            return None
+        rows, playable, filtered = self._rows, self._playable, self._filtered
+        candidates = self._positions(rows, playable, filtered, exclude_offensive)
+        positions = (rng or random).sample(candidates, min(count, len(candidates)))
+        return [rows[i] for i in positions]
+
+    def invalidate(self) -> None:
+        """Mark the index stale so the background task reloads it promptly"""
+        self._stale = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error(f"Meme index refresh failed: {e}", exc_info=True)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start loading and periodically refreshing the index on the running loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Cancel the background refresh task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size and freshness"""
+        return {
+            "ready": self.ready,
+            "stale": self._stale,
+            "memes": len(self._rows),
+            "playable": len(self._playable),
+            "loaded_at": self._loaded_at,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+def sample_from_db(db: Session, count: int) -> List[Any]:
+    """
+    Cold-path sampling used before the index is loaded.
+
+    PostgreSQL reads a block sample sized from the planner's row estimate;
+    other databases (and undersized samples) read a window at a random
+    offset along the primary key. Neither sorts the table.
+
+    Returns:
+        Up to ``count * COLD_OVERSAMPLE`` rows in random order
+    """
+    wanted = count * COLD_OVERSAMPLE
+    if db.bind.dialect.name == "postgresql":
+        estimate = db.execute(sqlalchemy.text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'meme_fetch'"
+        )).scalar() or 0
+        if estimate > 0:
+            percent = min(100.0, 100.0 * wanted / estimate)
+            rows = db.execute(sqlalchemy.text(
+                "SELECT image_name, humour, sarcasm, offensive, motivational, overall_sentiment "
+                "FROM meme_fetch TABLESAMPLE SYSTEM (:percent) "
+                "WHERE image_name IS NOT NULL AND image_name <> ''"
+            ), {"percent": percent}).all()
+            if len(rows) >= count:
+                random.shuffle(rows)
+                return rows[:wanted]
+
+    total = db.query(sqlalchemy.func.count(MemeFetch.image_name)).filter(_has_image_name()).scalar() or 0
+    offset = random.randint(0, max(0, total - wanted))
+    rows = (
+        db.query(*_MEME_COLUMNS)
+        .filter(_has_image_name())
+        .order_by(MemeFetch.image_name)
+        .offset(offset)
+        .limit(wanted)
+        .all()
+    )
+    random.shuffle(rows)
+    return rows
@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse
 import pandas as pd
-import random
 import os
-import glob
+import re
 from typing import List, Dict, Optional, Any
 import asyncpg
 from pathlib import Path
 import logging
+import asyncio
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.models.meme import MemeFetch
+from app.api.games.meme_index import MemeIndex, sample_from_db
+from app.api.games.meme_catalogue import MemeCatalogue, DirectoryListing
+from app.api.games.board_pool import BoardPool, EXCLUDED_OFFENSIVE, LEVEL_MEME_COUNTS, board_memes
+from app.api.games.image_manifest import ImageManifest
+from app.api.games.image_variants import SIZES, variant_cache, negotiate_format, media_type_for
+from app.api.games.sprites import SPRITE_FORMATS, sprite_cache, sprite_layout
+from app.api.utils.http_cache import cached_file_response, file_response, static_file_response
+from app.api.utils.byte_cache import image_cache
 import sqlalchemy
 
 router = APIRouter()
@@ -34,9 +41,27 @@ PUBLIC_MEME_PATH = "frontend/public/memes"
 # This path should correspond to where images were downloaded in your Dockerfile
 MEME_IMAGE_DIR = Path("/app/meme_images") 
 
+# Files present in MEME_IMAGE_DIR, scanned at boot and watched for changes
+image_manifest = ImageManifest(MEME_IMAGE_DIR)
+
+# Process-wide catalogue of playable memes, loaded and refreshed in the background
+meme_index = MemeIndex(image_manifest)
+
+# Boards pre-built from the index so a game starts without sampling or serialising
+board_pool = BoardPool(meme_index)
+
+# Cached image bytes are keyed by name, not by file: drop them when files change on disk
+image_manifest.add_listener(image_cache.invalidate)
+
+# Cold-path queries attempted before settling for a partial board
+COLD_SAMPLE_ATTEMPTS = 3
+
+SPRITE_FILENAME_PATTERN = re.compile(r"^[0-9a-f]{24}\.(" + "|".join(SPRITE_FORMATS) + r")$")
+
 # Pydantic models for new endpoints
 class GameInitRequest(BaseModel):
     level: int
+    seed: Optional[int] = None  # Replays the board with this seed
 
 # Renamed Pydantic model for clarity
 class MemeDataWithLocalURL(BaseModel):
@@ -123,14 +148,15 @@ async def initialize_game_data_with_local_urls_get(http_request: Request, db: Se
         # Get level value from query parameters
         params = dict(http_request.query_params)
         level = int(params.get("level", 1))
+        seed = int(params["seed"]) if params.get("seed") else None
         
         logger.info(f"Initializing game (GET request): level {level}")
         
         # Reuse existing logic to process request
-        result = await initialize_game_common(GameInitRequest(level=level), http_request)
+        result = await initialize_game_common(GameInitRequest(level=level, seed=seed), http_request)
         
-        # If result is a JSONResponse, apply CORS headers
-        if isinstance(result, JSONResponse):
+        # If result is a Response, apply CORS headers
+        if isinstance(result, Response):
             return add_cors_headers(result, http_request)
         return result
     except Exception as e:
@@ -147,8 +173,8 @@ async def initialize_game_data_with_local_urls_post(game_request: GameInitReques
         logger.info(f"Initializing game (POST request): level {game_request.level}")
         result = await initialize_game_common(game_request, http_request)
         
-        # If result is a JSONResponse, apply CORS headers
-        if isinstance(result, JSONResponse):
+        # If result is a Response, apply CORS headers
+        if isinstance(result, Response):
             return add_cors_headers(result, http_request)
         return result
     except Exception as e:
@@ -159,55 +185,59 @@ async def initialize_game_data_with_local_urls_post(game_request: GameInitReques
         )
         return add_cors_headers(response, http_request)
 
+def _image_available(image_name: str) -> bool:
+    """Check an image against the manifest, or the disk if the boot scan has not finished"""
+    if image_manifest.ready:
+        return not image_manifest.dir_exists or image_name in image_manifest
+    return not MEME_IMAGE_DIR.exists() or (MEME_IMAGE_DIR / image_name).is_file()
+
+def _sample_playable_from_db(count: int) -> List[Any]:
+    """Cold-path sampling that tops the board up until it is full or attempts run out"""
+    selected: Dict[str, Any] = {}
+    with SessionLocal() as db:
+        for _ in range(COLD_SAMPLE_ATTEMPTS):
+            for record in sample_from_db(db, count):
+                if record.offensive in EXCLUDED_OFFENSIVE:
+                    continue
+                if record.image_name not in selected and _image_available(record.image_name):
+                    selected[record.image_name] = record
+                    if len(selected) >= count:
+                        return list(selected.values())
+    return list(selected.values())
+
 # Shared processing function
 async def initialize_game_common(game_request: GameInitRequest, http_request: Request):
     level = game_request.level
-    num_memes_to_fetch = 0
-    if level == 1:
-        num_memes_to_fetch = 6
-    elif level == 2:
-        num_memes_to_fetch = 25
-    else:
+    num_memes_to_fetch = LEVEL_MEME_COUNTS.get(level, 0)
+    if not num_memes_to_fetch:
         logger.warning(f"Invalid game level specified: {level}")
         return JSONResponse(
             status_code=400,
             content={"detail": "Invalid game level specified. Must be 1 or 2 for standard game setup."}
         )
 
-    # Use ORM approach with SQLAlchemy
     try:
-        logger.info(f"Attempting to connect to database using ORM for level {level}, requesting {num_memes_to_fetch} memes")
-        
-        # Create a new session from the SessionLocal factory
-        with SessionLocal() as db:
-            # Using SQLAlchemy ORM to fetch random memes
-            # We use func.random() from SQLAlchemy for the ORDER BY RANDOM()
-            query = db.query(MemeFetch).filter(
-                sqlalchemy.and_(
-                    MemeFetch.image_name.is_not(None),
-                    MemeFetch.image_name != ''
+        # Serve a pre-built board (or the seeded one); its memes are already known to have images
+        board = board_pool.get(level, game_request.seed)
+        if board is not None:
+            return Response(
+                content=board.body,
+                media_type="application/json",
+                headers={"X-Board-Seed": str(board.seed)}
+            )
+
+        # Index still loading: sample without sorting the table
+        logger.info(f"Meme index not ready, sampling {num_memes_to_fetch} memes from database for level {level}")
+        db_records = _sample_playable_from_db(num_memes_to_fetch)
+
+        if not db_records or len(db_records) < num_memes_to_fetch:
+            logger.warning(f"Retrieved only {len(db_records) if db_records else 0}/{num_memes_to_fetch} memes from 'meme_fetch' for level {level}.")
+            if not db_records:
+                logger.error(f"No playable memes found (manifest: {image_manifest.stats()}).")
+                return JSONResponse(
+                    status_code=404,
+                    content={"detail": "Not enough memes found in database for game setup. Please contact the administrator."}
                 )
-            ).order_by(sqlalchemy.func.random()).limit(num_memes_to_fetch)
-            
-            # Log the SQL that would be executed
-            logger.info(f"ORM Query: {query}")
-            
-            # Execute the query
-            logger.info(f"Executing ORM query to fetch {num_memes_to_fetch} random memes from database")
-            db_records = query.all()
-            
-            if not db_records or len(db_records) < num_memes_to_fetch:
-                logger.warning(f"DB: Retrieved only {len(db_records) if db_records else 0}/{num_memes_to_fetch} memes from 'meme_fetch' for level {level}.")
-                # If no records at all, try to provide a fallback for testing
-                if not db_records:
-                    logger.error("No meme records found in database. Attempting to generate test data.")
-                    # Here we can create dummy test data if needed
-                    
-                    # For now, return a clear error message
-                    return JSONResponse(
-                        status_code=404,
-                        content={"detail": "Not enough memes found in database for game setup. Please contact the administrator."}
-                    )
         
         processed_memes_data: List[MemeDataWithLocalURL] = []
         meme_id_counter = 1 
@@ -215,24 +245,8 @@ async def initialize_game_common(game_request: GameInitRequest, http_request: Re
         logger.info(f"Base URL for image URLs: {base_url}")
 
         for record in db_records:
-            # With ORM, we access attributes directly rather than using dictionary keys
             image_name_from_db = record.image_name
             
-            # Verify the image file actually exists in our downloaded image directory
-            expected_image_path = MEME_IMAGE_DIR / image_name_from_db
-            # Log the path being checked
-            logger.info(f"Checking if image exists at: {expected_image_path}")
-            
-            # Check if the directory itself exists
-            if not MEME_IMAGE_DIR.exists():
-                logger.error(f"Meme image directory does not exist: {MEME_IMAGE_DIR}")
-                # Continue with the image even if the directory doesn't exist locally
-                # This could happen in development environments
-            
-            if MEME_IMAGE_DIR.exists() and not expected_image_path.is_file():
-                logger.warning(f"Image file not found in backend storage for '{image_name_from_db}' at path '{expected_image_path}'. Skipping this meme.")
-                continue # Skip this meme if its image isn't found locally
-            
             # Construct the new image URL pointing to our API endpoint
             # Make sure we're using the /api/games/memory_match/images/ prefix
             image_url = f"/api/games/memory_match/images/{image_name_from_db}"
@@ -248,19 +262,6 @@ async def initialize_game_common(game_request: GameInitRequest, http_request: Re
             ))
             meme_id_counter += 1
         
-        if not processed_memes_data and db_records: # All fetched records had missing image files
-            logger.error(f"Fetched {len(db_records)} records from DB, but all corresponding image files were missing from {MEME_IMAGE_DIR}.")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "Meme data found, but image files are missing in backend storage. Please contact the administrator."}
-            )
-        elif not processed_memes_data:
-            logger.error("No processable meme data after checking file existence.")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "No valid meme data available. Please contact the administrator."}
-            )
-
         logger.info(f"Successfully processed {len(processed_memes_data)} meme data objects for level {level}")
         return processed_memes_data
         
@@ -277,6 +278,72 @@ async def initialize_game_common(game_request: GameInitRequest, http_request: Re
             content={"detail": f"An error occurred during game initialization. Please try again later."}
         )
 
+@router.get("/board_sprite")
+async def get_board_sprite(
+    http_request: Request,
+    level: int = Query(1, description="Game level: 1 (6 memes) or 2 (25 memes)"),
+    seed: Optional[int] = Query(None, description="Board seed; the same seed replays the same board")
+):
+    """
+    Select a board and return its memes with coordinates in a single sprite sheet.
+
+    The sheet is fetched once from ``sprite_url`` and each card is drawn from
+    its ``sprite`` rectangle, so a game loads with two requests.
+    """
+    try:
+        if level not in LEVEL_MEME_COUNTS:
+            response = JSONResponse(status_code=400, content={"detail": "Invalid game level specified. Must be 1 or 2."})
+            return add_cors_headers(response, http_request)
+        # Same seed, same board as /initialize_game
+        board = board_pool.build(level, seed)
+        if board is not None:
+            seed, memes = board.seed, [dict(meme) for meme in board.memes]
+        else:
+            # Index still loading: the board cannot be replayed from its seed
+            logger.info("Meme index not ready, building sprite board from a database sample")
+            records = await asyncio.to_thread(_sample_playable_from_db, LEVEL_MEME_COUNTS[level])
+            memes = board_memes(records)
+        if not memes:
+            response = JSONResponse(status_code=404, content={"detail": "Not enough memes found in database for game setup."})
+            return add_cors_headers(response, http_request)
+
+        fmt = negotiate_format(http_request.headers.get("accept")) or "jpg"
+        names = [meme["image_name"] for meme in memes]
+        key, _ = await sprite_cache.build([MEME_IMAGE_DIR / name for name in names], names, fmt)
+        width, height, tiles = sprite_layout(len(memes), sprite_cache.tile_px)
+        for meme, tile in zip(memes, tiles):
+            meme["sprite"] = tile
+
+        response = JSONResponse(content={
+            "level": level,
+            "seed": seed,
+            "sprite_url": f"/api/games/memory_match/board_sprites/{key}.{fmt}",
+            "sprite_width": width,
+            "sprite_height": height,
+            "tile_size": sprite_cache.tile_px,
+            "memes": memes
+        })
+        response.headers["Vary"] = "Accept"
+        return add_cors_headers(response, http_request)
+    except Exception as e:
+        logger.error(f"Building board sprite failed: {e}", exc_info=True)
+        response = JSONResponse(status_code=500, content={"detail": "An error occurred while building the board. Please try again later."})
+        return add_cors_headers(response, http_request)
+
+@router.get("/board_sprites/{sprite_filename}")
+async def serve_board_sprite(sprite_filename: str, request: Request):
+    """Serve a composed board sprite sheet (immutable: the name is a content key)"""
+    if not SPRITE_FILENAME_PATTERN.match(sprite_filename):
+        response = JSONResponse(status_code=400, content={"detail": "Invalid sprite filename."})
+        return add_cors_headers(response, request)
+    key, fmt = sprite_filename.split(".", 1)
+    path = sprite_cache.path_for(key, fmt)
+    if not path.is_file():
+        response = JSONResponse(status_code=404, content={"detail": "Sprite sheet not found; request the board again."})
+        return add_cors_headers(response, request)
+    response = static_file_response(request, str(path), SPRITE_FORMATS[fmt][1], cache=image_cache)
+    return add_cors_headers(response, request)
+
 # Add OPTIONS method handler for CORS preflight requests
 @router.options("/initialize_game")
 async def options_initialize_game(http_request: Request):
@@ -318,13 +385,29 @@ async def options_initialize_game(http_request: Request):
 
 # --- New Endpoint to Serve Images --- 
 @router.get("/images/{image_filename}")
-async def serve_meme_image(image_filename: str, request: Request):
+async def serve_meme_image(
+    image_filename: str,
+    request: Request,
+    size: str = Query("full", description="Image size variant: 'thumb' for board cards or 'full'")
+):
     try:
         # Sanitize filename to prevent directory traversal - basic check
         if "..." in image_filename or image_filename.startswith("/"):
             response = JSONResponse(status_code=400, content={"detail": "Invalid image filename."})
             return add_cors_headers(response, request)
 
+        if size not in SIZES:
+            response = JSONResponse(status_code=400, content={"detail": f"Unknown image size '{size}'."})
+            return add_cors_headers(response, request)
+
+        # Hot images are answered from memory by (name, size, format), without touching the disk
+        fmt = negotiate_format(request.headers.get("accept"))
+        cache_key = f"meme:{image_filename}:{size}:{fmt or 'original'}"
+        cached = image_cache.get(cache_key) if image_cache.enabled else None
+        if cached is not None:
+            response = cached_file_response(request, cached, headers={"Vary": "Accept"})
+            return add_cors_headers(response, request)
+
         image_path = MEME_IMAGE_DIR / image_filename
         
         # Check if directory exists
@@ -338,17 +421,23 @@ async def serve_meme_image(image_filename: str, request: Request):
             response = JSONResponse(status_code=404, content={"detail": "Image not found."})
             return add_cors_headers(response, request)
         
-        media_type = "image/jpeg" # Default
-        if image_filename.lower().endswith(".png"):
-            media_type = "image/png"
-        elif image_filename.lower().endswith(".gif"):
-            media_type = "image/gif"
-        elif image_filename.lower().endswith(".jpg") or image_filename.lower().endswith(".jpeg"):
-            media_type = "image/jpeg"
-        # Add more as needed: webp, etc.
-
-        logger.info(f"Serving image: {image_filename} from {image_path} with media type {media_type}")
-        response = FileResponse(str(image_path), media_type=media_type)
+        # Serve the smallest variant the client can decode (rendered and cached on first use)
+        variant_path = await variant_cache.get(image_path, size, fmt)
+        media_type = media_type_for(variant_path)
+
+        # Originals reuse the content hash computed by the manifest scan
+        entry = image_manifest.get(image_filename) if variant_path == image_path else None
+
+        logger.debug(f"Serving image: {image_filename} from {variant_path} with media type {media_type}")
+        response = file_response(
+            request,
+            str(variant_path),
+            media_type,
+            etag=entry.etag if entry else None,
+            headers={"Vary": "Accept"},
+            cache=image_cache,
+            cache_key=cache_key,
+        )
         return add_cors_headers(response, request)
         
     except Exception as e:
@@ -407,34 +496,25 @@ def ensure_meme_directory_exists():
         with open(os.path.join(MEME_DATASET_PATH, "README.md"), "w") as f:
             f.write("# Meme Dataset Directory\n\nThis directory contains meme images from the Memotion dataset for the memory match game.")
 
+# Legacy CSV catalogue: the full dataset, falling back to the sample dataset
+csv_catalogue = MemeCatalogue([
+    os.path.join(MEME_DATASET_PATH, "memotion_dataset.csv"),
+    "backend/datasets/memotion_sample.csv",
+])
+
 def get_meme_data() -> pd.DataFrame:
     """
     Load the meme dataset from a CSV file.
     Falls back to the sample dataset if the full dataset is not available.
+    The frame is parsed once and shared: do not modify it.
     """
     logger.info("get_meme_data() called - this may be deprecated by the new DB approach.")
     # Ensure directory exists
     ensure_meme_directory_exists()
     
-    # Try to load the full dataset
-    full_dataset_path = os.path.join(MEME_DATASET_PATH, "memotion_dataset.csv")
-    
-    # Check for sample dataset if full dataset doesn't exist
-    sample_dataset_path = "backend/datasets/memotion_sample.csv"
-    
-    # Load the dataset
-    if os.path.exists(full_dataset_path):
-        try:
-            return pd.read_csv(full_dataset_path)
-        except Exception as e:
-            print(f"Error loading full dataset: {e}")
-    
-    # Try sample dataset as fallback
-    if os.path.exists(sample_dataset_path):
-        try:
-            return pd.read_csv(sample_dataset_path)
-        except Exception as e:
-            print(f"Error loading sample dataset: {e}")
+    df = csv_catalogue.frame
+    if not df.empty:
+        return df
             
     # If both fail, return an empty DataFrame with the expected columns
     return pd.DataFrame({
@@ -469,15 +549,15 @@ async def get_memes_for_memory_match(
     num_memes = 6 if level == 1 else 25
     
     # Load the dataset
-    df = get_meme_data()
+    ensure_meme_directory_exists()
     
     # Check if the dataset is empty
-    if df.empty:
+    if not len(csv_catalogue):
         raise HTTPException(status_code=404, detail="Meme dataset (CSV) not found or empty")
     
     # Ensure we have required columns
     required_columns = ['image_name', 'overall_sentiment']
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    missing_columns = [col for col in required_columns if col not in csv_catalogue.columns]
     
     if missing_columns:
         raise HTTPException(
@@ -489,14 +569,11 @@ async def get_memes_for_memory_match(
     selected_memes_output = [] # Renamed to avoid conflict with MemeData model
     
     # If dataset has fewer rows than required, use them all
-    if len(df) < num_memes: # Adjusted to check for less than, not less than or equal
-        selected_indices = list(range(len(df)))
-        logger.warning(f"Dataset (CSV) has only {len(df)} memes, requested {num_memes}. Using all available.")
-    else:
-        selected_indices = random.sample(range(len(df)), num_memes)
+    selected_rows = csv_catalogue.sample(num_memes)
+    if len(selected_rows) < num_memes:
+        logger.warning(f"Dataset (CSV) has only {len(selected_rows)} memes, requested {num_memes}. Using all available.")
     
-    for idx_val in selected_indices: # Renamed idx to idx_val to avoid conflict
-        row = df.iloc[idx_val]
+    for idx_val, row in selected_rows: # Renamed idx to idx_val to avoid conflict
         
         sentiment_data = {
             'overall': row.get('overall_sentiment', 'neutral'),
@@ -520,34 +597,33 @@ async def get_memes_for_memory_match(
         "message": "This endpoint is deprecated. Use POST /api/games/memory_match/initialize_game."
     }
 
+# Listings behind /scan-memes; the test directory seems specific to a dev setup
+scan_listings = [DirectoryListing(PUBLIC_MEME_PATH), DirectoryListing("backend/datasets/test_memes")]
+_scan_merged: Dict[str, Any] = {"sources": None, "names": []}
+
 @router.get("/scan-memes")
-async def scan_available_memes() -> List[str]:
+async def scan_available_memes(
+    response: Response,
+    offset: int = Query(0, ge=0, description="Index of the first file name to return"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of file names to return")
+) -> List[str]:
     """
     Scan for available meme images in the public directory and test_memes.
     (This function's relevance might change with the new DB-focused approach)
+
+    Listings are cached per directory and rescanned off the event loop when the
+    directory changes. The total number of files is returned in ``X-Total-Count``.
     """
-    logger.info("scan_available_memes() called - its relevance may change.")
-    all_meme_paths = []
-    
-    # Check the main public meme directory
-    if os.path.exists(PUBLIC_MEME_PATH):
-        for ext in ['jpg', 'jpeg', 'png', 'gif']:
-            pattern = os.path.join(PUBLIC_MEME_PATH, f"*.{ext}")
-            all_meme_paths.extend(glob.glob(pattern))
-    
-    # Always include the fallback test meme directory if we're in development
-    test_meme_paths = []
-    test_dir = "backend/datasets/test_memes" # This path seems specific to a dev setup
-    if os.path.exists(test_dir):
-        for ext in ['jpg', 'jpeg', 'png', 'gif']:
-            pattern = os.path.join(test_dir, f"*.{ext}")
-            test_meme_paths.extend(glob.glob(pattern))
-    
-    public_meme_files = [os.path.basename(p) for p in all_meme_paths]
-    test_meme_files = [os.path.basename(p) for p in test_meme_paths]
-    
-    all_meme_files = list(set(public_meme_files + test_meme_files))
-    
-    logger.info(f"Found {len(all_meme_files)} unique meme files across {PUBLIC_MEME_PATH} and {test_dir}")
-    
-    return all_meme_files 
\ No newline at end of file
+    for listing in scan_listings:
+        await listing.arefresh()
+
+    # Re-merge only when one of the listings was rescanned
+    sources = [listing.names() for listing in scan_listings]
+    if _scan_merged["sources"] is None or any(a is not b for a, b in zip(sources, _scan_merged["sources"])):
+        _scan_merged["names"] = sorted(set().union(*sources))
+        _scan_merged["sources"] = sources
+        logger.info(f"Found {len(_scan_merged['names'])} unique meme files across {PUBLIC_MEME_PATH} and {scan_listings[1].directory}")
+
+    all_meme_files = _scan_merged["names"]
+    response.headers["X-Total-Count"] = str(len(all_meme_files))
+    return all_meme_files[offset:offset + limit]
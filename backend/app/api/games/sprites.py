@@ -0,0 +1,233 @@
+"""
+Sprite sheets for memory match boards.
+
+A level 2 board otherwise needs one image request per card. The sprite
+endpoint composes every card of a board into a single image (Pillow, in the
+image variant process pool) and returns tile coordinates with the board
+data, so a game loads with two requests. Sheets are stored on disk under a
+key derived from the board contents and output format, so a board replayed
+from the same seed reuses its sheet.
+
+Unseeded boards each produce a new sheet, so the directory is capped at
+``MEME_SPRITE_CACHE_MAX_FILES`` sheets and ``MEME_SPRITE_CACHE_MB``
+megabytes. Reusing a sheet touches its mtime, and once a cap is exceeded
+the least recently used sheets are deleted until the directory is back
+under 90% of it.
+"""
+import os
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.api.games.image_variants import VARIANT_CACHE_DIR, VARIANT_QUALITY, ENCODERS, variant_cache
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+SPRITE_CACHE_DIR = Path(os.getenv("MEME_SPRITE_CACHE_DIR", str(VARIANT_CACHE_DIR / "sprites")))
+SPRITE_TILE_PX = int(os.getenv("MEME_SPRITE_TILE_PX", "200"))
+SPRITE_CACHE_MAX_FILES = int(os.getenv("MEME_SPRITE_CACHE_MAX_FILES", "500"))
+SPRITE_CACHE_MAX_BYTES = int(float(os.getenv("MEME_SPRITE_CACHE_MB", "256")) * 1024 * 1024)
+
+# Pruning goes below the caps so it does not run again on the next sheet
+PRUNE_TARGET = 0.9
+
+# Output formats: extension -> (Pillow format, media type)
+SPRITE_FORMATS = {"jpg": ("JPEG", "image/jpeg")}
+SPRITE_FORMATS.update({fmt: (pil_format, media_type) for fmt, pil_format, media_type in ENCODERS})
+
+
+def sprite_layout(count: int, tile_px: int = SPRITE_TILE_PX) -> Tuple[int, int, List[Dict[str, int]]]:
+    """
+    Arrange ``count`` square tiles in a near-square grid.
+
+    Returns:
+        (sheet width, sheet height, list of {"x", "y", "width", "height"} per tile)
+    """
+    columns = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / columns))
+    tiles = [
+        {"x": (i % columns) * tile_px, "y": (i // columns) * tile_px, "width": tile_px, "height": tile_px}
+        for i in range(count)
+    ]
+    return columns * tile_px, rows * tile_px, tiles
+
+
+def _compose(paths: List[str], target: str, tile_px: int, pil_format: str, quality: int) -> str:
+    """Compose a sprite sheet (runs in a worker process)"""
+    width, height, tiles = sprite_layout(len(paths), tile_px)
+    sheet = Image.new("RGB", (width, height), (255, 255, 255))
+    for path, tile in zip(paths, tiles):
+        try:
+            with Image.open(path) as image:
+                image = ImageOps.exif_transpose(image).convert("RGB")
+                # Letterbox rather than crop: meme text often runs to the edges
+                image = ImageOps.pad(image, (tile_px, tile_px), method=Image.LANCZOS, color=(255, 255, 255))
+                sheet.paste(image, (tile["x"], tile["y"]))
+        except OSError:
+            pass  # Leave a blank tile; the card still has its own image URL
+    tmp = f"{target}.{os.getpid()}.tmp"
+    sheet.save(tmp, format=pil_format, quality=quality)
+    os.replace(tmp, target)
+    return target
+
+
+class SpriteSheetCache:
+    """Composes and caches board sprite sheets, bounded by file count and total size"""
+
+    def __init__(
+        self,
+        cache_dir: Path = SPRITE_CACHE_DIR,
+        tile_px: int = SPRITE_TILE_PX,
+        max_files: int = SPRITE_CACHE_MAX_FILES,
+        max_bytes: int = SPRITE_CACHE_MAX_BYTES,
+    ):
+        """
+        Args:
+            cache_dir: Directory holding the sheets
+            tile_px: Edge of one card tile in pixels
+            max_files: Most sheets kept on disk (0 for no limit)
+            max_bytes: Most bytes of sheets kept on disk (0 for no limit)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.tile_px = tile_px
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._prune_lock = threading.Lock()
+        # Estimated directory size: exact after each scan, then advanced per composed sheet
+        self._files: Optional[int] = None
+        self._bytes = 0
+        self.hits = 0
+        self.composed = 0
+        self.evictions = 0
+
+    def board_key(self, image_names: List[str], fmt: str) -> str:
+        """Content key of a sheet: the ordered image names, tile size and format"""
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{self.tile_px}:{fmt}:".encode())
+        digest.update("\0".join(image_names).encode())
+        return digest.hexdigest()
+
+    def path_for(self, key: str, fmt: str) -> Path:
+        return self.cache_dir / f"{key}.{fmt}"
+
+    async def build(self, image_paths: List[Path], image_names: List[str], fmt: str) -> Tuple[str, Path]:
+        """
+        Return the key and path of the sheet for these images, composing it if needed.
+        """
+        key = self.board_key(image_names, fmt)
+        target = self.path_for(key, fmt)
+        try:
+            # Mark the sheet as recently used for eviction
+            os.utime(target)
+            self.hits += 1
+            return key, target
+        except OSError:
+            pass
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            pil_format = SPRITE_FORMATS[fmt][0]
+            pending = asyncio.ensure_future(variant_cache.run(
+                _compose, [str(p) for p in image_paths], str(target), self.tile_px, pil_format, VARIANT_QUALITY
+            ))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+            self.composed += 1
+            await asyncio.shield(pending)
+            await asyncio.to_thread(self._added, target)
+            return key, target
+        await asyncio.shield(pending)
+        return key, target
+
+    def _over(self, files: int, size: int, factor: float = 1.0) -> bool:
+        return bool(
+            (self.max_files and files > self.max_files * factor)
+            or (self.max_bytes and size > self.max_bytes * factor)
+        )
+
+    def _added(self, target: Path) -> None:
+        """Account for a new sheet and prune if a cap is exceeded"""
+        with self._prune_lock:
+            if self._files is None:
+                self.prune()
+                return
+            try:
+                self._bytes += target.stat().st_size
+            except OSError:
+                return
+            self._files += 1
+            if self._over(self._files, self._bytes):
+                self.prune()
+
+    def prune(self) -> int:
+        """
+        Delete the least recently used sheets until under 90% of the caps (blocking).
+
+        Other workers share the directory, so the scan is what counts; the
+        running totals are only an estimate between scans.
+
+        Returns:
+            Number of sheets deleted
+        """
+        sheets = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".tmp") or not entry.is_file():
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    sheets.append((st.st_mtime_ns, st.st_size, entry.path))
+        except OSError:
+            self._files, self._bytes = 0, 0
+            return 0
+
+        files, size = len(sheets), sum(sheet[1] for sheet in sheets)
+        removed = 0
+        if self._over(files, size):
+            sheets.sort()
+            for _, sheet_size, path in sheets:
+                if not self._over(files, size, PRUNE_TARGET):
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # Pruned by another worker
+                except OSError as e:
+                    logger.warning(f"Could not remove sprite sheet {path}: {e}")
+                    continue
+                files -= 1
+                size -= sheet_size
+                removed += 1
+            self.evictions += removed
+            logger.info(f"Pruned {removed} sprite sheets from {self.cache_dir} ({files} left, {size} bytes)")
+        self._files, self._bytes = files, size
+        return removed
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "cache_dir": str(self.cache_dir),
+            "tile_px": self.tile_px,
+            "files": self._files,
+            "bytes": self._bytes,
+            "max_files": self.max_files,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "composed": self.composed,
+            "evictions": self.evictions,
+        }
+
+
+# Process-wide sprite sheet cache
+sprite_cache = SpriteSheetCache()
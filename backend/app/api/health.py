@@ -104,6 +104,100 @@ async def detailed_health_check() -> dict:
     # Database status is added based on environment variable
     if os.environ.get("DATABASE_URL") or os.environ.get("DATABASE_PUBLIC_URL"):
         components["database"] = {"status": "configured"}
+    
+    # LLM provider transport metrics (latency histograms, retries, rate limiting)
+    try:
+        from app.api.openrouter.async_client import get_openrouter_client
+        llm_metrics = get_openrouter_client().metrics()
+        breaker = llm_metrics["circuit_breaker"]
+        if not llm_metrics["configured"]:
+            llm_status = "not_configured"
+        elif breaker["state"] != "closed":
+            llm_status = "degraded"  # Serving local fallbacks while the provider recovers
+        else:
+            llm_status = "ok"
+        components["llm"] = {
+            "status": llm_status,
+            "circuit_breaker": breaker,
+            "metrics": llm_metrics
+        }
+    except Exception as e:
+        components["llm"] = {"status": "error", "error": str(e)}
+
+    # YouTube Data API quota ledger
+    try:
+        from app.api.youtube.clients.pool import get_youtube_pool
+        youtube = get_youtube_pool().snapshot()
+        if not youtube["configured"]:
+            youtube_status = "not_configured"
+        elif youtube["quota"]["remaining"] <= youtube["quota"]["reserve"]:
+            youtube_status = "degraded"  # Only first pages are fetched until the quota resets
+        else:
+            youtube_status = "ok"
+        components["youtube"] = {"status": youtube_status, **youtube}
+    except Exception as e:
+        components["youtube"] = {"status": "error", "error": str(e)}
+
+    # Memory match catalogue: playable memes and image/database mismatches
+    try:
+        from app.api.games.memory_match import board_pool, image_manifest, meme_index
+        manifest = image_manifest.stats()
+        index = meme_index.stats()
+        if not index["ready"]:
+            memes_status = "loading"
+        elif manifest["missing_images"] or not manifest["directory_exists"]:
+            memes_status = "degraded"
+        else:
+            memes_status = "ok"
+        from app.api.utils.byte_cache import image_cache
+        from app.api.games.sprites import sprite_cache
+        components["memory_match"] = {
+            "status": memes_status,
+            "index": index,
+            "manifest": manifest,
+            "board_pool": board_pool.stats(),
+            "image_cache": image_cache.stats(),
+            "sprite_cache": sprite_cache.stats()
+        }
+    except Exception as e:
+        components["memory_match"] = {"status": "error", "error": str(e)}
+
+    # Rating write-behind buffer: ratings waiting in the local log
+    try:
+        from app.api.rating_cache import rating_stats_cache
+        from app.api.rating_ingest import rating_buffer
+        ratings = rating_buffer.stats()
+        if not ratings["running"]:
+            ratings_status = "direct"  # Each rating is written in its own transaction
+        elif ratings["failures"] and ratings["queued"]:
+            ratings_status = "degraded"
+        else:
+            ratings_status = "ok"
+        components["ratings"] = {"status": ratings_status, **ratings, "stats_cache": rating_stats_cache.stats()}
+    except Exception as e:
+        components["ratings"] = {"status": "error", "error": str(e)}
+
+    # Notes store
+    try:
+        from app.api.notes.store import notes_store
+        components["notes"] = {"status": "ok", **notes_store.stats()}
+    except Exception as e:
+        components["notes"] = {"status": "error", "error": str(e)}
+
+    # Static JSON content (breathing exercises, affirmations)
+    try:
+        from app.api.utils.static_content import static_content
+        components["static_content"] = {"status": "ok", "files": static_content.stats()}
+    except Exception as e:
+        components["static_content"] = {"status": "error", "error": str(e)}
+
+    # Journal and note search index
+    try:
+        from app.api.search_index import search_index
+        search = search_index.stats()
+        components["search"] = {"status": "degraded" if search["errors"] else "ok", **search}
+    except Exception as e:
+        components["search"] = {"status": "error", "error": str(e)}
         
     # Report on environment variables (masking sensitive data)
     env_vars = {}
@@ -0,0 +1,330 @@
+"""
+Journal entry storage on the application database.
+
+Journal entries used to live in ``data/journals/entries.json``, loaded and
+rewritten whole on every change, so writes were O(total entries) and two
+concurrent requests could lose each other's changes. Entries are now rows of
+``journal_entries``: each change is one transaction on one row and lookups
+use the primary key.
+
+Listing pages with a keyset cursor over (created_at, id), with mood, tag
+and date-range filters that each map onto an index, and ``iter_entries``
+streams the same selection in batches for exports. Every change is passed
+on to the full-text ``search_index`` after it commits. Timestamps are naive
+UTC, as for notes; date-range bounds are converted with ``naive_utc``.
+
+Existing JSON files are imported on startup (entries already in the table
+are skipped, their local times are converted to UTC, and the file is
+renamed to ``entries.json.migrated``), or by hand with::
+
+    python -m app.api.journal_store migrate [path/to/entries.json]
+"""
+import os
+import sys
+import json
+import uuid
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, inspect, or_
+from sqlalchemy.orm import Query, Session
+
+from app.models.journal import JournalEntry, JournalEntryTag
+from app.api.search_index import SearchDocument, search_index
+from app.api.utils.timestamps import local_to_naive_utc, naive_utc
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+LEGACY_JOURNALS_FILE = os.path.join("data", "journals", "entries.json")
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by ``page_entries``"""
+
+
+def encode_cursor(entry: JournalEntry) -> str:
+    """Opaque cursor pointing just past ``entry``"""
+    raw = f"{entry.created_at.isoformat()}|{entry.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, entry_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), entry_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def query_entries(
+    db: Session,
+    mood: Optional[str] = None,
+    tag: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    descending: bool = False,
+) -> Query:
+    """
+    Entries matching the filters, ordered by (created_at, id).
+
+    Args:
+        mood: Only entries with this mood
+        tag: Only entries carrying this tag
+        start: Only entries created at or after this time (naive times are UTC)
+        end: Only entries created before this time (naive times are UTC)
+        descending: Newest first instead of oldest first
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    query = db.query(JournalEntry)
+    if tag is not None:
+        query = query.join(JournalEntryTag, JournalEntryTag.entry_id == JournalEntry.id).filter(JournalEntryTag.tag == tag)
+    if mood is not None:
+        query = query.filter(JournalEntry.mood == mood)
+    if start is not None:
+        query = query.filter(JournalEntry.created_at >= start)
+    if end is not None:
+        query = query.filter(JournalEntry.created_at < end)
+    if descending:
+        return query.order_by(JournalEntry.created_at.desc(), JournalEntry.id.desc())
+    return query.order_by(JournalEntry.created_at, JournalEntry.id)
+
+
+def page_entries(
+    db: Session,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+    **filters,
+) -> Tuple[List[JournalEntry], Optional[str]]:
+    """
+    One page of entries after ``cursor``.
+
+    Returns:
+        (entries, cursor for the next page or None on the last page)
+    """
+    query = query_entries(db, descending=descending, **filters)
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                JournalEntry.created_at < created_at,
+                and_(JournalEntry.created_at == created_at, JournalEntry.id < entry_id),
+            ))
+        else:
+            query = query.filter(or_(
+                JournalEntry.created_at > created_at,
+                and_(JournalEntry.created_at == created_at, JournalEntry.id > entry_id),
+            ))
+    entries = query.limit(limit + 1).all()
+    if len(entries) > limit:
+        entries = entries[:limit]
+        return entries, encode_cursor(entries[-1])
+    return entries, None
+
+
+def iter_entries(db: Session, batch_size: int = 500, **filters) -> Iterator[JournalEntry]:
+    """Stream every matching entry, fetching ``batch_size`` rows at a time"""
+    cursor = None
+    while True:
+        entries, cursor = page_entries(db, batch_size, cursor, **filters)
+        yield from entries
+        if cursor is None:
+            return
+        db.expunge_all()  # Keep memory flat over long exports
+
+
+def list_entries(db: Session) -> List[JournalEntry]:
+    """Return every entry, oldest first (the order of the JSON store)"""
+    return query_entries(db).all()
+
+
+def _set_tags(db: Session, entry: JournalEntry) -> None:
+    """Rewrite the tag index rows of ``entry``"""
+    db.execute(delete(JournalEntryTag).where(JournalEntryTag.entry_id == entry.id))
+    tags = sorted(set(entry.tags or []))
+    if tags:
+        db.execute(insert(JournalEntryTag), [
+            {"tag": tag, "entry_id": entry.id, "created_at": entry.created_at} for tag in tags
+        ])
+
+
+def journal_document(entry: JournalEntry) -> SearchDocument:
+    """What the search index keeps for an entry"""
+    return SearchDocument("journal", entry.id, "", entry.content, tuple(entry.tags or []), entry.created_at.isoformat())
+
+
+def sync_search_index(db: Session) -> bool:
+    """Re-index every entry if the search index is missing some; returns whether it did"""
+    count = db.query(func.count(JournalEntry.id)).scalar()
+    return search_index.sync("journal", count, lambda: (journal_document(entry) for entry in iter_entries(db)))
+
+
+def get_entry(db: Session, entry_id: str) -> Optional[JournalEntry]:
+    return db.get(JournalEntry, entry_id)
+
+
+def create_entry(db: Session, content: str, mood: Optional[str] = None, tags: Optional[List[str]] = None) -> JournalEntry:
+    """Insert and commit a new entry"""
+    now = datetime.utcnow()
+    entry = JournalEntry(
+        id=str(uuid.uuid4()),
+        content=content,
+        mood=mood or "neutral",
+        tags=tags or [],
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(entry)
+    db.flush()
+    _set_tags(db, entry)
+    db.commit()
+    search_index.add(journal_document(entry))
+    return entry
+
+
+def update_entry(
+    db: Session,
+    entry_id: str,
+    content: Optional[str] = None,
+    mood: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+) -> Optional[JournalEntry]:
+    """
+    Update the given fields of an entry and commit.
+
+    Returns:
+        The updated entry, or None if it does not exist
+    """
+    # Lock the row (PostgreSQL) so concurrent updates apply one after the other
+    entry = db.query(JournalEntry).filter(JournalEntry.id == entry_id).with_for_update().first()
+    if entry is None:
+        return None
+    if content is not None:
+        entry.content = content
+    if mood is not None:
+        entry.mood = mood
+    if tags is not None:
+        entry.tags = list(tags)
+        _set_tags(db, entry)
+    entry.updated_at = datetime.utcnow()
+    db.commit()
+    search_index.add(journal_document(entry))
+    return entry
+
+
+def delete_entry(db: Session, entry_id: str) -> bool:
+    """Delete an entry and commit; returns False if it did not exist"""
+    db.execute(delete(JournalEntryTag).where(JournalEntryTag.entry_id == entry_id))
+    deleted = db.query(JournalEntry).filter(JournalEntry.id == entry_id).delete(synchronize_session=False)
+    db.commit()
+    if deleted:
+        search_index.remove("journal", entry_id)
+    return deleted > 0
+
+
+def _parse_time(value: Any) -> datetime:
+    """Parse a JSON store timestamp (local time) as naive UTC"""
+    try:
+        return local_to_naive_utc(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def migrate_json(db: Session, path: str = LEGACY_JOURNALS_FILE, rename: bool = True) -> int:
+    """
+    Import entries from a JSON journal file.
+
+    Args:
+        db: Database session
+        path: The ``{"entries": [...]}`` file written by the old store
+        rename: Rename the file to ``<path>.migrated`` afterwards so it is not imported again
+
+    Returns:
+        Number of entries imported
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as f:
+        entries = json.load(f).get("entries", [])
+
+    existing = {row[0] for row in db.query(JournalEntry.id).all()}
+    imported = []
+    for item in entries:
+        entry_id = str(item.get("id") or uuid.uuid4())
+        if entry_id in existing:
+            continue
+        created_at = _parse_time(item.get("created_at"))
+        entry = JournalEntry(
+            id=entry_id,
+            content=item.get("content", ""),
+            mood=item.get("mood") or "neutral",
+            tags=list(item.get("tags") or []),
+            created_at=created_at,
+            updated_at=_parse_time(item.get("updated_at")) if item.get("updated_at") else created_at,
+        )
+        db.add(entry)
+        existing.add(entry_id)
+        imported.append(entry)
+    db.flush()
+    for entry in imported:
+        _set_tags(db, entry)
+    db.commit()
+
+    if rename:
+        os.replace(path, f"{path}.migrated")
+    logger.info(f"Imported {len(imported)} of {len(entries)} journal entries from {path}")
+    return len(imported)
+
+
+def _create_schema(db: Session) -> bool:
+    """
+    Create the journal tables and any index added since they were created.
+
+    Returns:
+        Whether the tag table was created just now
+    """
+    bind = db.get_bind()
+    new_tag_table = not inspect(bind).has_table(JournalEntryTag.__tablename__)
+    for table in (JournalEntry.__table__, JournalEntryTag.__table__):
+        table.create(bind=bind, checkfirst=True)
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    return new_tag_table
+
+
+def rebuild_tag_index(db: Session) -> int:
+    """Recreate every tag index row from the entries' tags (commits)"""
+    db.execute(delete(JournalEntryTag))
+    rows = 0
+    for entry in db.query(JournalEntry).yield_per(1000):
+        for tag in sorted(set(entry.tags or [])):
+            db.add(JournalEntryTag(tag=tag, entry_id=entry.id, created_at=entry.created_at))
+            rows += 1
+    db.commit()
+    return rows
+
+
+def ensure_journal_store(db: Session) -> None:
+    """Create the journal tables and import the legacy JSON file if one is left"""
+    # Entries stored before the tag index existed
+    if _create_schema(db) and db.query(JournalEntry.id).first() is not None:
+        logger.info(f"Built journal tag index ({rebuild_tag_index(db)} rows)")
+    migrate_json(db)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not sys.argv[1:] or sys.argv[1] != "migrate":
+        print("Usage: python -m app.api.journal_store migrate [path/to/entries.json]")
+        sys.exit(1)
+
+    from app.database import SessionLocal
+    source = sys.argv[2] if len(sys.argv) > 2 else LEGACY_JOURNALS_FILE
+    with SessionLocal() as session:
+        _create_schema(session)
+        count = migrate_json(session, source)
+    print(f"Imported {count} journal entries from {source}")
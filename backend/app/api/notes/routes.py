@@ -1,13 +1,11 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import Dict, List, Any, Optional
 from pydantic import BaseModel
-import uuid
-from datetime import datetime
 
-router = APIRouter()
+from app.api.notes.store import notes_store
 
-# In-memory database for notes (will be lost on restart)
-notes_db = {}
+router = APIRouter()
 
 class NoteCreate(BaseModel):
     title: str
@@ -35,7 +33,7 @@ async def get_notes():
     Returns:
         List[Note]: List of all stored notes
     """
-    return list(notes_db.values())
+    return await run_in_threadpool(notes_store.list)
 
 @router.post("/", response_model=Note)
 async def create_note(note: NoteCreate):
@@ -48,20 +46,7 @@ async def create_note(note: NoteCreate):
     Returns:
         Note: The created note
     """
-    note_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat()
-    
-    new_note = Note(
-        id=note_id,
-        title=note.title,
-        content=note.content,
-        tags=note.tags or [],
-        created_at=timestamp,
-        updated_at=timestamp
-    )
-    
-    notes_db[note_id] = new_note.dict()
-    return new_note
+    return await run_in_threadpool(notes_store.create, note.title, note.content, note.tags or [])
 
 @router.get("/{note_id}", response_model=Note)
 async def get_note(note_id: str):
@@ -77,10 +62,11 @@ async def get_note(note_id: str):
     Raises:
         HTTPException: If the note is not found
     """
-    if note_id not in notes_db:
+    note = await run_in_threadpool(notes_store.get, note_id)
+    if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    return notes_db[note_id]
+    return note
 
 @router.put("/{note_id}", response_model=Note)
 async def update_note(note_id: str, note_update: NoteUpdate):
@@ -97,23 +83,11 @@ async def update_note(note_id: str, note_update: NoteUpdate):
     Raises:
         HTTPException: If the note is not found
     """
-    if note_id not in notes_db:
+    changes = note_update.dict(exclude_none=True)
+    note = await run_in_threadpool(notes_store.update, note_id, changes)
+    if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    note = notes_db[note_id]
-    
-    if note_update.title is not None:
-        note["title"] = note_update.title
-    
-    if note_update.content is not None:
-        note["content"] = note_update.content
-    
-    if note_update.tags is not None:
-        note["tags"] = note_update.tags
-    
-    note["updated_at"] = datetime.utcnow().isoformat()
-    notes_db[note_id] = note
-    
     return note
 
 @router.delete("/{note_id}")
@@ -130,9 +104,7 @@ async def delete_note(note_id: str):
     Raises:
         HTTPException: If the note is not found
     """
-    if note_id not in notes_db:
+    if not await run_in_threadpool(notes_store.delete, note_id):
         raise HTTPException(status_code=404, detail="Note not found")
     
-    del notes_db[note_id]
-    
     return {"status": "ok", "message": "Note deleted successfully"} 
\ No newline at end of file
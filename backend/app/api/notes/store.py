@@ -0,0 +1,239 @@
+"""
+Notes storage backends.
+
+Notes used to live in a module-level dict: they were lost on restart, each
+uvicorn worker had its own copy, and the dict grew without bound. The
+routes now go through a backend chosen by ``NOTES_BACKEND``:
+
+- ``sql`` (default): the ``notes`` table on the application database
+  (SQLite or PostgreSQL), shared by every worker. Notes read by id are kept
+  in a bounded LRU (``NOTES_CACHE_SIZE`` entries). The cache is written
+  through on every change in this worker, and entries expire after
+  ``NOTES_CACHE_TTL`` seconds, so a change made by another worker shows up
+  here within that time.
+- ``memory``: the previous dict, for tests and local experiments.
+
+Every backend returns notes as plain dicts in the shape of the ``Note``
+schema, and hands each change to the search index.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.models.note import Note
+from app.api.search_index import SearchDocument, search_index
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+NOTES_BACKEND = os.getenv("NOTES_BACKEND", "sql").lower()
+NOTES_CACHE_SIZE = int(os.getenv("NOTES_CACHE_SIZE", "1000"))
+NOTES_CACHE_TTL = float(os.getenv("NOTES_CACHE_TTL", "10"))
+
+
+def note_document(note: Dict[str, Any]) -> SearchDocument:
+    """What the search index keeps for a note"""
+    return SearchDocument("note", note["id"], note["title"], note["content"], tuple(note["tags"]), note["created_at"])
+
+
+class MemoryNotesBackend:
+    """Notes in a dict (per process, lost on restart)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.notes: Dict[str, Dict[str, Any]] = {}
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [dict(note) for note in self.notes.values()]
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.list())
+
+    def count(self) -> int:
+        return len(self.notes)
+
+    def get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        note = self.notes.get(note_id)
+        return dict(note) if note is not None else None
+
+    def create(self, title: str, content: str, tags: List[str]) -> Dict[str, Any]:
+        timestamp = datetime.utcnow().isoformat()
+        note = {
+            "id": str(uuid.uuid4()),
+            "title": title,
+            "content": content,
+            "tags": list(tags),
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        self.notes[note["id"]] = note
+        search_index.add(note_document(note))
+        return dict(note)
+
+    def update(self, note_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        note = self.notes.get(note_id)
+        if note is None:
+            return None
+        note.update(changes)
+        note["updated_at"] = datetime.utcnow().isoformat()
+        search_index.add(note_document(note))
+        return dict(note)
+
+    def delete(self, note_id: str) -> bool:
+        if self.notes.pop(note_id, None) is None:
+            return False
+        search_index.remove("note", note_id)
+        return True
+
+    def ensure(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "notes": len(self.notes)}
+
+
+class SqlNotesBackend:
+    """Notes in the database, with a bounded write-through cache of notes read by id"""
+
+    name = "sql"
+
+    def __init__(self, session_factory=SessionLocal, cache_size: int = NOTES_CACHE_SIZE, cache_ttl: float = NOTES_CACHE_TTL):
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- Cache ---
+
+    def _cached(self, note_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(note_id)
+            if entry is None or time.monotonic() - entry[0] > self.cache_ttl:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(note_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def _store(self, note: Dict[str, Any]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[note["id"]] = (time.monotonic(), dict(note))
+            self._cache.move_to_end(note["id"])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _evict(self, note_id: str) -> None:
+        with self._lock:
+            self._cache.pop(note_id, None)
+
+    # --- Reads ---
+
+    def list(self) -> List[Dict[str, Any]]:
+        return list(self.iter_all())
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Every note, oldest first, fetched ``batch_size`` rows at a time"""
+        with self.session_factory() as db:
+            query = db.query(Note).order_by(Note.created_at, Note.id)
+            for note in query.yield_per(batch_size):
+                yield note.to_dict()
+
+    def count(self) -> int:
+        with self.session_factory() as db:
+            return db.query(Note).count()
+
+    def get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        note = self._cached(note_id)
+        if note is not None:
+            return note
+        with self.session_factory() as db:
+            row = db.get(Note, note_id)
+            if row is None:
+                return None
+            note = row.to_dict()
+        self._store(note)
+        return note
+
+    # --- Writes (commit, then update the cache and the search index) ---
+
+    def create(self, title: str, content: str, tags: List[str]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        with self.session_factory() as db:
+            row = Note(id=str(uuid.uuid4()), title=title, content=content, tags=list(tags), created_at=now, updated_at=now)
+            db.add(row)
+            db.commit()
+            note = row.to_dict()
+        self._store(note)
+        search_index.add(note_document(note))
+        return note
+
+    def update(self, note_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.session_factory() as db:
+            # Lock the row (PostgreSQL) so concurrent updates apply one after the other
+            row = db.query(Note).filter(Note.id == note_id).with_for_update().first()
+            if row is None:
+                self._evict(note_id)
+                return None
+            for field, value in changes.items():
+                setattr(row, field, list(value) if field == "tags" else value)
+            row.updated_at = datetime.utcnow()
+            db.commit()
+            note = row.to_dict()
+        self._store(note)
+        search_index.add(note_document(note))
+        return note
+
+    def delete(self, note_id: str) -> bool:
+        with self.session_factory() as db:
+            deleted = db.query(Note).filter(Note.id == note_id).delete(synchronize_session=False)
+            db.commit()
+        self._evict(note_id)
+        if deleted:
+            search_index.remove("note", note_id)
+        return deleted > 0
+
+    def ensure(self) -> None:
+        """Create the notes table if it does not exist"""
+        with self.session_factory() as db:
+            Note.__table__.create(bind=db.get_bind(), checkfirst=True)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def create_notes_backend(name: str = NOTES_BACKEND):
+    """Build the backend named by ``NOTES_BACKEND``"""
+    if name == "memory":
+        return MemoryNotesBackend()
+    if name != "sql":
+        logger.warning(f"Unknown NOTES_BACKEND {name!r}, using sql")
+    return SqlNotesBackend()
+
+
+# Process-wide store used by the notes routes
+notes_store = create_notes_backend()
+
+
+def sync_search_index() -> bool:
+    """Re-index the stored notes if the search index does not match them"""
+    return search_index.sync("note", notes_store.count(), lambda: (note_document(note) for note in notes_store.iter_all()))
@@ -0,0 +1,595 @@
+"""
+Async, pooled transport for the OpenRouter chat completions API.
+
+A single AsyncOpenRouterClient is shared by the YouTube LLM handler and the
+OpenRouterClient wrapper. It keeps one HTTP connection pool per event loop,
+limits the number of in-flight requests per host, retries rate-limited and
+transient failures with exponential backoff (honouring Retry-After), guards
+the provider with a circuit breaker, and records latency histograms for the
+health endpoints.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import email.utils
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from urllib.parse import urlparse
+
+import httpx
+
+from app.api.utils.logger import setup_logger
+from app.api.openrouter.circuit_breaker import CircuitBreaker, HALF_OPEN
+from app.api.openrouter.streaming import SSE_DONE, chunk_delta, parse_sse_line
+
+# Setup logger
+logger = setup_logger('openrouter_async_client')
+
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "deepseek/deepseek-prover-v2:free"
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class OpenRouterError(Exception):
+    """Raised when a chat completion cannot be obtained from OpenRouter."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(OpenRouterError):
+    """Raised without contacting OpenRouter while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"OpenRouter circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram (seconds)."""
+
+    DEFAULT_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Record a single latency observation"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            self._max = max(self._max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            maximum = self._max
+        if not total:
+            return None
+        target = q * total
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            if running >= target:
+                return self.buckets[i] if i < len(self.buckets) else maximum
+        return maximum
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the histogram as a JSON-serialisable dictionary"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            total_sum = self._sum
+            maximum = self._max
+        buckets = {f"le_{bound:g}": counts[i] for i, bound in enumerate(self.buckets)}
+        buckets["le_inf"] = counts[-1]
+        return {
+            "count": total,
+            "sum_seconds": round(total_sum, 4),
+            "avg_seconds": round(total_sum / total, 4) if total else None,
+            "max_seconds": round(maximum, 4),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "buckets": buckets,
+        }
+
+
+class _LoopState:
+    """HTTP pool and per-host limiters bound to a single event loop."""
+
+    def __init__(self, http: httpx.AsyncClient):
+        self.http = http
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class AsyncOpenRouterClient:
+    """Shared async client for the OpenRouter chat completions API"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        base_url: str = API_URL,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        max_retry_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """Initialise the client, reading unset options from environment variables"""
+        self.api_key = api_key if api_key is not None else os.getenv("OPENROUTER_API_KEY")
+        self.model = model or os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL)
+        self.base_url = base_url
+        self.timeout = timeout or float(os.getenv("OPENROUTER_TIMEOUT", "120"))
+        self.connect_timeout = connect_timeout or float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "10"))
+        self.max_connections = max_connections or int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+        self.max_concurrency = max_concurrency or int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OPENROUTER_MAX_RETRIES", "3"))
+        self.backoff_base = backoff_base or float(os.getenv("OPENROUTER_BACKOFF_BASE", "0.5"))
+        self.backoff_max = backoff_max or float(os.getenv("OPENROUTER_BACKOFF_MAX", "20"))
+        self.max_retry_after = max_retry_after or float(os.getenv("OPENROUTER_MAX_RETRY_AFTER", "30"))
+        self.breaker = breaker or CircuitBreaker("openrouter")
+
+        # One pool per event loop: httpx clients and asyncio primitives are loop-bound
+        self._loops: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+        self._loops_lock = threading.Lock()
+
+        # Metrics
+        self.request_latency = LatencyHistogram()  # Single HTTP attempt
+        self.call_latency = LatencyHistogram()     # Whole call including retries
+        self._counters = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+        }
+        self._counters_lock = threading.Lock()
+
+        if not self.api_key:
+            logger.warning("OPENROUTER_API_KEY environment variable not set")
+
+    @property
+    def configured(self) -> bool:
+        """Whether an API key is available"""
+        return bool(self.api_key)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def _state(self) -> _LoopState:
+        """Return the pool for the running loop, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            state = self._loops.get(loop)
+            if state is None:
+                # Drop pools belonging to loops that have since been closed
+                for stale in [l for l in self._loops if l.is_closed()]:
+                    del self._loops[stale]
+                headers = {"Content-Type": "application/json"}
+                if self.api_key:
+                    headers["Authorization"] = f"Bearer {self.api_key}"
+                http = httpx.AsyncClient(
+                    headers=headers,
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                )
+                state = _LoopState(http)
+                self._loops[loop] = state
+                logger.info(f"Created OpenRouter connection pool (max_connections={self.max_connections})")
+            return state
+
+    def _host_limiter(self, state: _LoopState, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        semaphore = state.semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            state.semaphores[host] = semaphore
+        return semaphore
+
+    def _remaining_timeout(self, deadline: float) -> Optional[httpx.Timeout]:
+        """httpx timeout for an attempt that must finish by ``deadline``, or None if it has passed"""
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        return httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining))
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Compute the wait before the next attempt, preferring the server's Retry-After"""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter keeps concurrent retries from synchronising
+        return random.uniform(0, delay)
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        Send a chat completion request and return the decoded JSON body.
+
+        Args:
+            messages: Chat messages in OpenAI format
+            model: Model override (defaults to OPENROUTER_MODEL)
+            timeout: Per-attempt timeout override in seconds
+            **params: Extra payload fields (max_tokens, response_format, ...)
+
+        Returns:
+            Decoded response dictionary
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is rejecting calls
+            OpenRouterError: If no successful response could be obtained
+        """
+        if not self.api_key:
+            raise OpenRouterError("OpenRouter API key not set")
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        payload = {"model": model or self.model, "messages": messages}
+        payload.update(params)
+
+        attempt_timeout = timeout or self.timeout
+        max_retries = self.max_retries
+        if self.breaker.state == HALF_OPEN:
+            # Recovery probes fail fast instead of holding a request for the full timeout
+            attempt_timeout = min(attempt_timeout, self.breaker.probe_timeout)
+            max_retries = 0
+
+        call_start = time.perf_counter()
+        try:
+            data = await self._post_with_retries(payload, attempt_timeout, max_retries)
+        except OpenRouterError as e:
+            if e.status_code is None or e.status_code in RETRY_STATUS_CODES:
+                self.breaker.record_failure(time.perf_counter() - call_start, e)
+            else:
+                # Client errors (bad request, auth) say nothing about provider health
+                self.breaker.record_ignored()
+            raise
+        except BaseException:
+            self.breaker.record_ignored()
+            raise
+        self.breaker.record_success(time.perf_counter() - call_start)
+        return data
+
+    async def _post_with_retries(self, payload: Dict[str, Any], timeout: float, max_retries: int) -> Dict[str, Any]:
+        """
+        POST the payload, retrying rate-limited and transient failures.
+
+        ``timeout`` bounds the whole call, retries and backoff included: each
+        attempt only gets the time left before that deadline.
+        """
+        state = self._state()
+        limiter = self._host_limiter(state, self.base_url)
+
+        self._count("calls")
+        call_start = time.perf_counter()
+        deadline = call_start + timeout
+        last_error: Optional[OpenRouterError] = None
+        try:
+            for attempt in range(max_retries + 1):
+                request_timeout = self._remaining_timeout(deadline)
+                if request_timeout is None:
+                    last_error = last_error or OpenRouterError(f"OpenRouter request timed out after {timeout:g}s")
+                    break
+                response = None
+                self._count("attempts")
+                attempt_start = time.perf_counter()
+                try:
+                    async with limiter:
+                        # httpx's read timeout is per chunk; the deadline caps the whole response
+                        response = await asyncio.wait_for(
+                            state.http.post(self.base_url, json=payload, timeout=request_timeout),
+                            deadline - time.perf_counter(),
+                        )
+                except asyncio.TimeoutError:
+                    last_error = OpenRouterError(f"OpenRouter request timed out after {timeout:g}s")
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = OpenRouterError(f"OpenRouter transport error: {type(e).__name__}: {e}")
+                finally:
+                    self.request_latency.observe(time.perf_counter() - attempt_start)
+
+                if response is not None:
+                    if response.status_code == 200:
+                        try:
+                            return response.json()
+                        except ValueError as e:
+                            raise OpenRouterError(f"OpenRouter returned invalid JSON: {e}")
+                    if response.status_code == 429:
+                        self._count("rate_limited")
+                    last_error = OpenRouterError(
+                        f"OpenRouter API error: Status {response.status_code}, {response.text[:300]}",
+                        response.status_code,
+                    )
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        raise last_error
+
+                if attempt >= max_retries:
+                    break
+
+                delay = self._retry_delay(attempt, response)
+                if delay > self.max_retry_after:
+                    logger.warning(f"OpenRouter asked to retry after {delay:.1f}s, exceeding limit of {self.max_retry_after:.1f}s")
+                    break
+                if time.perf_counter() + delay >= deadline:
+                    logger.warning(f"{last_error}; not retrying, the {timeout:g}s deadline would pass")
+                    break
+                self._count("retries")
+                logger.warning(f"{last_error}; retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(delay)
+
+            raise last_error or OpenRouterError("OpenRouter request failed")
+        except OpenRouterError:
+            self._count("failures")
+            raise
+        finally:
+            self.call_latency.observe(time.perf_counter() - call_start)
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        """
+        Send a chat completion request and return the first choice's content.
+
+        Raises:
+            OpenRouterError: If the request fails or the response has no content
+        """
+        data = await self.chat(messages, **kwargs)
+        content = extract_content(data)
+        if not content:
+            raise OpenRouterError("OpenRouter API returned empty choices")
+        return content
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion (SSE), yielding content deltas as they arrive.
+
+        Rate-limited and transient failures are retried only until the first
+        delta has been received, and only within ``timeout``; a stream
+        interrupted after that raises.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is rejecting calls
+            OpenRouterError: If the stream cannot be started or is interrupted
+        """
+        if not self.api_key:
+            raise OpenRouterError("OpenRouter API key not set")
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        payload = {"model": model or self.model, "messages": messages, "stream": True}
+        payload.update(params)
+
+        attempt_timeout = timeout or self.timeout
+        max_retries = self.max_retries
+        if self.breaker.state == HALF_OPEN:
+            attempt_timeout = min(attempt_timeout, self.breaker.probe_timeout)
+            max_retries = 0
+
+        state = self._state()
+        limiter = self._host_limiter(state, self.base_url)
+
+        self._count("calls")
+        call_start = time.perf_counter()
+        # Retries (and waiting for the first delta) must fit in the caller's timeout
+        deadline = call_start + attempt_timeout
+        received = False
+        finished = False
+        try:
+            last_error: Optional[OpenRouterError] = None
+            for attempt in range(max_retries + 1):
+                request_timeout = self._remaining_timeout(deadline)
+                if request_timeout is None:
+                    last_error = last_error or OpenRouterError(f"OpenRouter stream timed out after {attempt_timeout:g}s")
+                    break
+                response = None
+                self._count("attempts")
+                attempt_start = time.perf_counter()
+                try:
+                    async with limiter:
+                        async with state.http.stream("POST", self.base_url, json=payload, timeout=request_timeout) as response:
+                            if response.status_code == 200:
+                                # Time to first byte stands in for request latency when streaming
+                                self.request_latency.observe(time.perf_counter() - attempt_start)
+                                async for line in response.aiter_lines():
+                                    chunk = parse_sse_line(line)
+                                    if chunk is SSE_DONE:
+                                        break
+                                    if not isinstance(chunk, dict):
+                                        continue
+                                    if chunk.get("error"):
+                                        raise OpenRouterError(f"OpenRouter stream error: {chunk['error']}")
+                                    delta = chunk_delta(chunk)
+                                    if delta:
+                                        received = True
+                                        yield delta
+                                finished = True
+                            else:
+                                await response.aread()
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = OpenRouterError(f"OpenRouter transport error: {type(e).__name__}: {e}")
+                    if received:
+                        raise last_error
+
+                if finished:
+                    break
+
+                if response is not None and response.status_code != 200:
+                    self.request_latency.observe(time.perf_counter() - attempt_start)
+                    if response.status_code == 429:
+                        self._count("rate_limited")
+                    last_error = OpenRouterError(
+                        f"OpenRouter API error: Status {response.status_code}, {response.text[:300]}",
+                        response.status_code,
+                    )
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        raise last_error
+
+                if attempt >= max_retries:
+                    break
+
+                delay = self._retry_delay(attempt, response)
+                if delay > self.max_retry_after or time.perf_counter() + delay >= deadline:
+                    break
+                self._count("retries")
+                logger.warning(f"{last_error}; retrying stream in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(delay)
+
+            if not finished:
+                raise last_error or OpenRouterError("OpenRouter stream failed")
+        except OpenRouterError as e:
+            self._count("failures")
+            if e.status_code is None or e.status_code in RETRY_STATUS_CODES:
+                self.breaker.record_failure(time.perf_counter() - call_start, e)
+            else:
+                self.breaker.record_ignored()
+            raise
+        except BaseException:
+            # Includes the consumer closing the generator early
+            self.breaker.record_ignored()
+            raise
+        finally:
+            self.call_latency.observe(time.perf_counter() - call_start)
+        self.breaker.record_success(time.perf_counter() - call_start)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return counters and latency histograms for health reporting"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            "configured": self.configured,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "max_connections": self.max_connections,
+            "counters": counters,
+            "circuit_breaker": self.breaker.snapshot(),
+            "request_latency": self.request_latency.snapshot(),
+            "call_latency": self.call_latency.snapshot(),
+        }
+
+    async def aclose(self) -> None:
+        """Close the connection pool bound to the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            state = self._loops.pop(loop, None)
+        if state is not None:
+            await state.http.aclose()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def extract_content(data: Optional[Dict[str, Any]]) -> str:
+    """Return the message content of the first choice, or an empty string"""
+    if not isinstance(data, dict):
+        return ""
+    choices = data.get("choices") or []
+    if not choices or not isinstance(choices[0], dict):
+        return ""
+    message = choices[0].get("message") or {}
+    if not isinstance(message, dict):
+        return ""
+    return message.get("content") or ""
+
+
+# Process-wide shared client
+_client: Optional[AsyncOpenRouterClient] = None
+_client_lock = threading.Lock()
+
+# Background loop used to serve synchronous callers from a persistent pool
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def get_openrouter_client() -> AsyncOpenRouterClient:
+    """Return the process-wide OpenRouter client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AsyncOpenRouterClient()
+    return _client
+
+
+async def close_openrouter_client() -> None:
+    """Close the shared client's pool for the running loop (call on shutdown)"""
+    if _client is not None:
+        await _client.aclose()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="openrouter-sync-loop", daemon=True)
+            thread.start()
+            _sync_loop = loop
+        return _sync_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    The coroutine is executed on a dedicated background loop so synchronous
+    callers share a persistent connection pool instead of opening a new
+    connection per call.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_sync_loop())
+    return future.result()
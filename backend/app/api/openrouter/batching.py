@@ -0,0 +1,223 @@
+"""
+Batching helpers for per-comment LLM requests.
+
+Many comments are packed into a single JSON-mode chat completion with stable
+ids, the array response is parsed and validated, and malformed or incomplete
+output is retried by splitting the batch until single comments fall back to
+an individual request. CommentCoalescer groups concurrent single-comment
+calls made within a short window into one batch.
+"""
+import os
+import json
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from app.api.utils.logger import setup_logger
+
+# Setup logger
+logger = setup_logger('openrouter_batching')
+
+MAX_BATCH_SIZE = int(os.getenv("OPENROUTER_BATCH_SIZE", "20"))
+COALESCE_WINDOW_MS = float(os.getenv("OPENROUTER_COALESCE_WINDOW_MS", "25"))
+
+# (id, comment) pairs sent in one request
+BatchItems = List[Tuple[int, str]]
+BatchSender = Callable[[BatchItems], Awaitable[Optional[str]]]
+SingleSender = Callable[[str], Awaitable[Optional[str]]]
+
+
+def pack_comments(items: BatchItems) -> str:
+    """Serialise (id, comment) pairs as the JSON array embedded in batch prompts"""
+    return json.dumps([{"id": item_id, "comment": text} for item_id, text in items], ensure_ascii=False, indent=2)
+
+
+def _strip_code_fence(content: str) -> str:
+    if "```json" in content:
+        return content.split("```json", 1)[1].split("```", 1)[0].strip()
+    if "```" in content:
+        return content.split("```", 1)[1].split("```", 1)[0].strip()
+    return content.strip()
+
+
+def parse_batch_response(content: Optional[str], expected_ids: List[int], field: str = "response") -> Dict[int, str]:
+    """
+    Parse a batch completion into a mapping of id to response text.
+
+    Accepts either ``{"responses": [...]}`` or a bare array. Entries with
+    unknown ids, duplicate ids or empty responses are discarded, so the
+    caller can retry whatever is missing.
+
+    Args:
+        content: Raw completion text
+        expected_ids: Ids that were sent in the request
+        field: Name of the response field in each entry
+
+    Returns:
+        Dictionary of valid responses keyed by id (may be partial or empty)
+    """
+    if not content:
+        return {}
+    try:
+        data = json.loads(_strip_code_fence(content))
+    except (json.JSONDecodeError, TypeError):
+        logger.warning("Batch response is not valid JSON")
+        return {}
+
+    if isinstance(data, dict):
+        entries = data.get("responses")
+        if entries is None:
+            # Tolerate a single other list-valued key, e.g. {"results": [...]}
+            lists = [v for v in data.values() if isinstance(v, list)]
+            entries = lists[0] if len(lists) == 1 else None
+    else:
+        entries = data
+    if not isinstance(entries, list):
+        logger.warning("Batch response does not contain a response array")
+        return {}
+
+    expected = set(expected_ids)
+    results: Dict[int, str] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            entry_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        text = entry.get(field)
+        if entry_id not in expected or entry_id in results:
+            continue
+        if not isinstance(text, str) or not text.strip():
+            continue
+        results[entry_id] = text.strip()
+    return results
+
+
+async def complete_in_batches(
+    comments: List[str],
+    send_batch: BatchSender,
+    send_single: SingleSender,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    field: str = "response",
+) -> List[Optional[str]]:
+    """
+    Obtain one response per comment using as few requests as possible.
+
+    Args:
+        comments: Comments to respond to
+        send_batch: Coroutine sending a batch prompt and returning the raw content
+        send_single: Coroutine handling a single comment (fallback path)
+        max_batch_size: Maximum number of comments per request
+        field: Name of the response field in each batch entry
+
+    Returns:
+        Responses aligned with ``comments`` (None where every attempt failed)
+    """
+    results: List[Optional[str]] = [None] * len(comments)
+    items: BatchItems = [(i + 1, comment) for i, comment in enumerate(comments)]
+
+    async def run(chunk: BatchItems) -> None:
+        if len(chunk) == 1:
+            item_id, text = chunk[0]
+            results[item_id - 1] = await send_single(text)
+            return
+        try:
+            content = await send_batch(chunk)
+        except Exception as e:
+            logger.warning(f"Batch request for {len(chunk)} comments failed: {e}")
+            content = None
+        parsed = parse_batch_response(content, [item_id for item_id, _ in chunk], field)
+        for item_id, text in parsed.items():
+            results[item_id - 1] = text
+        missing = [item for item in chunk if item[0] not in parsed]
+        if not missing:
+            return
+        if len(missing) == len(chunk):
+            # Nothing usable came back: split in half rather than resend the same batch
+            logger.warning(f"Malformed batch response for {len(chunk)} comments, splitting")
+            middle = len(chunk) // 2
+            await asyncio.gather(run(chunk[:middle]), run(chunk[middle:]))
+        else:
+            logger.info(f"Batch response missing {len(missing)}/{len(chunk)} comments, retrying those")
+            await run(missing)
+
+    chunks = [items[i:i + max_batch_size] for i in range(0, len(items), max(1, max_batch_size))]
+    await asyncio.gather(*(run(chunk) for chunk in chunks))
+    return results
+
+
+class CommentCoalescer:
+    """
+    Coalesce concurrent single-comment requests into batch calls.
+
+    Calls to ``submit`` made within ``window_ms`` of the first pending call
+    (or until ``max_batch_size`` comments are queued) are answered by one
+    invocation of ``handler``.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[str]], Awaitable[List[Optional[str]]]],
+        window_ms: float = COALESCE_WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        # Pending requests per event loop: futures are loop-bound
+        self._pending: Dict[asyncio.AbstractEventLoop, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[asyncio.AbstractEventLoop, asyncio.TimerHandle] = {}
+        self._lock = threading.Lock()
+        self.batches_sent = 0
+        self.comments_coalesced = 0
+
+    async def submit(self, comment: str) -> Optional[str]:
+        """Queue a comment and wait for its response"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            pending = self._pending.setdefault(loop, [])
+            pending.append((comment, future))
+            if len(pending) >= self.max_batch_size:
+                self._take_and_flush(loop)
+            elif loop not in self._timers:
+                self._timers[loop] = loop.call_later(self.window, self._on_timer, loop)
+        return await future
+
+    def _on_timer(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            self._timers.pop(loop, None)
+            self._take_and_flush(loop)
+
+    def _take_and_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Caller holds self._lock
+        timer = self._timers.pop(loop, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(loop, [])
+        if batch:
+            loop.create_task(self._flush(batch))
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches_sent += 1
+        self.comments_coalesced += len(batch)
+        try:
+            responses = await self.handler([comment for comment, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return coalescing counters"""
+        return {
+            "batches_sent": self.batches_sent,
+            "comments_coalesced": self.comments_coalesced,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+        }
@@ -0,0 +1,170 @@
+"""
+Circuit breaker for the LLM provider.
+
+Tracks the outcome and latency of recent OpenRouter calls. When too many of
+them fail or are slow the circuit opens and calls are rejected immediately,
+so callers serve their local fallbacks instead of waiting on timeouts. After
+a cool-down the circuit half-opens and lets a limited number of probe calls
+through; a successful probe closes it again.
+"""
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+from app.api.utils.logger import setup_logger
+
+# Setup logger
+logger = setup_logger('llm_circuit_breaker')
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker (thread-safe)"""
+
+    def __init__(
+        self,
+        name: str = "llm",
+        window_size: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        failure_rate_threshold: Optional[float] = None,
+        consecutive_failure_threshold: Optional[int] = None,
+        slow_call_seconds: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_max_calls: Optional[int] = None,
+        probe_timeout: Optional[float] = None,
+    ):
+        """Initialise the breaker, reading unset options from environment variables"""
+        self.name = name
+        self.window_size = window_size or int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+        self.min_calls = min_calls or int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+        self.failure_rate_threshold = failure_rate_threshold or float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+        self.consecutive_failure_threshold = consecutive_failure_threshold or int(os.getenv("LLM_BREAKER_CONSECUTIVE_FAILURES", "3"))
+        self.slow_call_seconds = slow_call_seconds or float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "45"))
+        self.open_seconds = open_seconds or float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+        self.half_open_max_calls = half_open_max_calls or int(os.getenv("LLM_BREAKER_HALF_OPEN_CALLS", "1"))
+        self.probe_timeout = probe_timeout or float(os.getenv("LLM_BREAKER_PROBE_TIMEOUT", "30"))
+
+        self._state = CLOSED
+        self._outcomes = deque(maxlen=self.window_size)  # True = bad (failed or slow)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+
+        # Counters for health reporting
+        self._rejected = 0
+        self._times_opened = 0
+        self._last_failure: Optional[str] = None
+        self._last_state_change = time.time()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down has elapsed"""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        # Caller holds self._lock
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+            self._half_open_in_flight = 0
+
+    def _transition(self, new_state: str) -> None:
+        # Caller holds self._lock
+        if new_state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {new_state}")
+        self._state = new_state
+        self._last_state_change = time.time()
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+            self._times_opened += 1
+        elif new_state == CLOSED:
+            self._outcomes.clear()
+            self._consecutive_failures = 0
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed; rejected calls should use their fallback"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        """Record a completed call; slow successes count against the provider"""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(OPEN if slow else CLOSED)
+                return
+            self._consecutive_failures = 0
+            self._outcomes.append(slow)
+            self._evaluate()
+
+    def record_failure(self, latency: float, error: Optional[BaseException] = None) -> None:
+        """Record a failed call (transport error, timeout, 429 or 5xx)"""
+        with self._lock:
+            self._last_failure = f"{type(error).__name__}: {error}" if error else "failure"
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(OPEN)
+                return
+            self._consecutive_failures += 1
+            self._outcomes.append(True)
+            self._evaluate()
+
+    def record_ignored(self) -> None:
+        """Release a half-open slot for a call whose outcome says nothing about provider health"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _evaluate(self) -> None:
+        # Caller holds self._lock
+        if self._state != CLOSED:
+            return
+        if self._consecutive_failures >= self.consecutive_failure_threshold:
+            self._transition(OPEN)
+            return
+        if len(self._outcomes) >= self.min_calls:
+            bad_rate = sum(self._outcomes) / len(self._outcomes)
+            if bad_rate >= self.failure_rate_threshold:
+                self._transition(OPEN)
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit will admit a probe (0 if not open)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the breaker state as a JSON-serialisable dictionary"""
+        state = self.state
+        with self._lock:
+            outcomes = list(self._outcomes)
+            return {
+                "name": self.name,
+                "state": state,
+                "window_calls": len(outcomes),
+                "window_bad_rate": round(sum(outcomes) / len(outcomes), 3) if outcomes else 0.0,
+                "consecutive_failures": self._consecutive_failures,
+                "rejected_calls": self._rejected,
+                "times_opened": self._times_opened,
+                "last_failure": self._last_failure,
+                "last_state_change": self._last_state_change,
+                "open_seconds": self.open_seconds,
+                "slow_call_seconds": self.slow_call_seconds,
+            }
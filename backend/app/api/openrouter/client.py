@@ -1,27 +1,53 @@
 import os
 import json
 import logging
-import requests
 from typing import List, Dict, Any, Optional
 
 from app.api.utils.logger import setup_logger
+from app.api.openrouter.async_client import (
+    API_URL,
+    DEFAULT_MODEL,
+    OpenRouterError,
+    get_openrouter_client,
+    run_sync,
+)
+from app.api.openrouter.batching import (
+    BatchItems,
+    CommentCoalescer,
+    complete_in_batches,
+    pack_comments,
+)
 
 # Setup logger
 logger = setup_logger('openrouter_client')
 
 class OpenRouterClient:
-    """Client for interacting with the OpenRouter API"""
+    """
+    Client for interacting with the OpenRouter API.
+
+    Requests go through the shared AsyncOpenRouterClient, so every instance
+    reuses the same connection pool, concurrency limits and retry policy.
+    The ``*_async`` methods should be preferred from async code; the
+    synchronous methods are kept for existing callers.
+    """
     
     def __init__(self):
         """Initialize the OpenRouter client with API key from environment variables"""
         self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
-        self.model = os.getenv("OPENROUTER_MODEL", "deepseek/deepseek-prover-v2:free")
+        self.base_url = API_URL
+        self.model = os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL)
+        self.transport = get_openrouter_client()
+        # Coalesces concurrent single_comment_analysis calls on this client
+        self.coalescer = CommentCoalescer(self._batch_responses)
         
         if not self.api_key:
             logger.warning("OPENROUTER_API_KEY environment variable not set")
     
     def analyze_comments(self, comments: List[Dict[str, Any]], video_url: str) -> Optional[Dict[str, Any]]:
+        """Synchronous wrapper around analyze_comments_async"""
+        return run_sync(self.analyze_comments_async(comments, video_url))
+    
+    async def analyze_comments_async(self, comments: List[Dict[str, Any]], video_url: str) -> Optional[Dict[str, Any]]:
         """
         Analyze a list of YouTube comments using the OpenRouter API.
         
@@ -44,7 +70,7 @@ class OpenRouterClient:
             prompt = self._prepare_analysis_prompt(comment_texts, video_url)
             
             # Send request to OpenRouter
-            response = self._send_request(prompt)
+            response = await self._send_request_async(prompt)
             
             if not response:
                 logger.warning("OpenRouter analysis returned empty response")
@@ -58,9 +84,16 @@ class OpenRouterClient:
             return None
     
     def single_comment_analysis(self, comment: str) -> str:
+        """Synchronous wrapper around single_comment_analysis_async"""
+        return run_sync(self.single_comment_analysis_async(comment))
+    
+    async def single_comment_analysis_async(self, comment: str) -> str:
         """
         Analyze a single comment and generate a response suggestion.
         
+        Concurrent calls made within a short window are coalesced into a
+        single batch request.
+        
         Args:
             comment: The comment text to analyze
             
@@ -72,23 +105,7 @@ class OpenRouterClient:
             return "Error: OpenRouter API key not configured"
             
         try:
-            # Prepare the prompt for responding to a single comment
-            prompt = f"""
-                As a content creator responding to this YouTube comment, how would you respond professionally and positively?
-                
-                Comment: {comment}
-                
-                Please write a response that is:
-                - Professional and courteous
-                - Appreciative of feedback
-                - Authentic and personal
-                - Engaging but concise
-                
-                Response:
-            """
-            
-            # Send request to OpenRouter
-            response = self._send_request(prompt)
+            response = await self.coalescer.submit(comment)
             
             if not response:
                 return "Unable to generate a response at this time."
@@ -100,6 +117,77 @@ class OpenRouterClient:
             logger.error(f"Error in single comment analysis: {str(e)}")
             return f"Error generating response: {str(e)}"
     
+    def batch_comment_analysis(self, comments: List[str]) -> List[str]:
+        """Synchronous wrapper around batch_comment_analysis_async"""
+        return run_sync(self.batch_comment_analysis_async(comments))
+    
+    async def batch_comment_analysis_async(self, comments: List[str]) -> List[str]:
+        """
+        Generate response suggestions for many comments in as few requests as possible.
+        
+        Args:
+            comments: The comment texts to analyze
+            
+        Returns:
+            List of suggested responses, aligned with ``comments``
+        """
+        if not self.api_key:
+            logger.error("Cannot analyze comments: OpenRouter API key not set")
+            return ["Error: OpenRouter API key not configured"] * len(comments)
+        
+        responses = await self._batch_responses(comments)
+        return [response or "Unable to generate a response at this time." for response in responses]
+    
+    async def _batch_responses(self, comments: List[str]) -> List[Optional[str]]:
+        """Return one response per comment (None on failure), batching requests"""
+        if not comments:
+            return []
+        logger.info(f"Generating responses for {len(comments)} comments in batches")
+        return await complete_in_batches(comments, self._send_batch_request, self._single_comment_response)
+    
+    async def _send_batch_request(self, items: BatchItems) -> Optional[str]:
+        """Send one JSON-mode request covering several comments"""
+        prompt = f"""
+            As a content creator responding to YouTube comments, write a professional and positive response to each comment below.
+            
+            Each response should be:
+            - Professional and courteous
+            - Appreciative of feedback
+            - Authentic and personal
+            - Engaging but concise
+            
+            Comments (JSON array with ids):
+            {pack_comments(items)}
+            
+            Return ONLY a JSON object of this form, with exactly one entry per comment id:
+            {{"responses": [{{"id": <comment id>, "response": "<your response>"}}]}}
+        """
+        return await self.transport.complete(
+            [{"role": "user", "content": prompt}],
+            model=self.model,
+            response_format={"type": "json_object"}
+        )
+    
+    async def _single_comment_response(self, comment: str) -> Optional[str]:
+        """Request a response for one comment (fallback for failed batches)"""
+        # Prepare the prompt for responding to a single comment
+        prompt = f"""
+            As a content creator responding to this YouTube comment, how would you respond professionally and positively?
+            
+            Comment: {comment}
+            
+            Please write a response that is:
+            - Professional and courteous
+            - Appreciative of feedback
+            - Authentic and personal
+            - Engaging but concise
+            
+            Response:
+        """
+        
+        # Send request to OpenRouter
+        return await self._send_request_async(prompt)
+    
     def _prepare_analysis_prompt(self, comments: List[str], video_url: str) -> str:
         """Prepare the prompt for YouTube comment analysis"""
         comments_text = "\n\n".join([f"Comment {i+1}: {comment}" for i, comment in enumerate(comments)])
@@ -142,43 +230,28 @@ class OpenRouterClient:
         return prompt
     
     def _send_request(self, prompt: str) -> Optional[str]:
+        """Synchronous wrapper around _send_request_async"""
+        return run_sync(self._send_request_async(prompt))
+    
+    async def _send_request_async(self, prompt: str) -> Optional[str]:
         """Send a request to the OpenRouter API and return the response text"""
         if not self.api_key:
             logger.error("Cannot send request: OpenRouter API key not set")
             return None
             
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ]
-            }
-            
             logger.info(f"Sending request to OpenRouter API using model: {self.model}")
-            response = requests.post(self.base_url, headers=headers, json=data)
-            
-            if response.status_code != 200:
-                logger.error(f"OpenRouter API error: Status {response.status_code}, {response.text}")
-                return None
-                
-            response_data = response.json()
-            
-            if not response_data or "choices" not in response_data or not response_data["choices"]:
-                logger.warning("OpenRouter API returned empty choices")
-                return None
-                
-            # Extract the response content
-            response_text = response_data["choices"][0]["message"]["content"]
+            response_text = await self.transport.complete(
+                [{"role": "user", "content": prompt}],
+                model=self.model
+            )
             logger.info("Received response from OpenRouter API")
             
             return response_text
             
+        except OpenRouterError as e:
+            logger.error(str(e))
+            return None
         except Exception as e:
             logger.error(f"Error in OpenRouter API request: {str(e)}")
             return None
@@ -0,0 +1,116 @@
+"""
+Incremental parsing of streamed (SSE) chat completions.
+
+OpenRouter streams completions as server-sent events whose ``data:`` lines
+carry JSON chunks with content deltas. The parsers below consume those
+deltas as they arrive and emit complete units early: whole lines for the
+plain-text strategies, and whole JSON objects for array-shaped responses.
+"""
+import json
+from typing import List, Dict, Any, Optional
+
+# Sentinel returned by parse_sse_line for the end-of-stream marker
+SSE_DONE = object()
+
+
+def parse_sse_line(line: str):
+    """
+    Parse one line of an OpenRouter SSE stream.
+
+    Returns:
+        The decoded JSON chunk, SSE_DONE for ``data: [DONE]``, or None for
+        blank lines, comments (``: OPENROUTER PROCESSING``) and other fields
+    """
+    if not line or line.startswith(":") or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return SSE_DONE
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        return None
+
+
+def chunk_delta(chunk: Dict[str, Any]) -> str:
+    """Extract the content delta from a streamed completion chunk"""
+    choices = chunk.get("choices") or []
+    if not choices or not isinstance(choices[0], dict):
+        return ""
+    delta = choices[0].get("delta") or {}
+    if not isinstance(delta, dict):
+        return ""
+    return delta.get("content") or ""
+
+
+class LineStreamParser:
+    """Emit complete, non-empty lines from streamed text"""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any lines it completed"""
+        self._buffer += text
+        if "\n" not in self._buffer:
+            return []
+        *complete, self._buffer = self._buffer.split("\n")
+        return [line.strip() for line in complete if line.strip()]
+
+    def close(self) -> List[str]:
+        """Return the trailing line once the stream has ended"""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class JsonObjectStreamParser:
+    """
+    Emit JSON objects that are elements of an array as soon as they close.
+
+    Works for both a bare array (``[{...}, {...}]``) and an array nested in
+    an object (``{"responses": [{...}, {...}]}``); text outside JSON, such as
+    a markdown code fence, is ignored.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []      # Open containers: "{" or "["
+        self._in_string = False
+        self._escaped = False
+        self._capture: Optional[List[str]] = None
+        self._capture_depth = 0
+
+    def feed(self, text: str) -> List[Any]:
+        """Add streamed text and return any array elements it completed"""
+        completed: List[Any] = []
+        for char in text:
+            if self._capture is not None:
+                self._capture.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._capture is None and self._stack and self._stack[-1] == "[":
+                    # An object directly inside an array: start capturing it
+                    self._capture = [char]
+                    self._capture_depth = len(self._stack)
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._capture is not None and char == "}" and len(self._stack) == self._capture_depth:
+                    raw = "".join(self._capture)
+                    self._capture = None
+                    try:
+                        completed.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        pass
+        return completed
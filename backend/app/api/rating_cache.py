@@ -0,0 +1,204 @@
+"""
+Rating stats cache shared by all workers.
+
+Each worker keeps the stats it served in memory, so polling activity cards
+no longer costs one query per request. A rating written by any worker
+invalidates every worker's copy through a channel:
+
+- ``postgres``: ``NOTIFY rating_stats`` after the commit, received by a
+  listener thread holding a ``LISTEN`` connection in each worker
+- ``file``: the writer touches a stamp file and readers compare its mtime,
+  one ``stat`` per read instead of a query
+
+``RATING_CACHE_CHANNEL=auto`` picks ``postgres`` on PostgreSQL and ``file``
+otherwise; ``none`` disables the cache. Entries also expire after
+``RATING_CACHE_TTL`` seconds as a safety net. A generation counter stops a
+read that started before an invalidation from storing its stale result.
+"""
+import os
+import time
+import select
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+RATING_CACHE_CHANNEL = os.getenv("RATING_CACHE_CHANNEL", "auto").lower()
+RATING_CACHE_TTL = float(os.getenv("RATING_CACHE_TTL", "60"))
+RATING_CACHE_STAMP = os.getenv("RATING_CACHE_STAMP", os.path.join("data", "ratings", "stats.stamp"))
+
+NOTIFY_CHANNEL = "rating_stats"
+# Listener reconnect delay after a dropped connection (doubles up to the maximum)
+RECONNECT_SECONDS = 1.0
+MAX_RECONNECT_SECONDS = 30.0
+
+
+class RatingStatsCache:
+    """Per-worker stats cache kept coherent through an invalidation channel"""
+
+    def __init__(self, channel: str = RATING_CACHE_CHANNEL, ttl: float = RATING_CACHE_TTL, stamp_path: str = RATING_CACHE_STAMP):
+        if channel == "auto":
+            channel = "postgres" if engine.dialect.name == "postgresql" else "file"
+        self.channel = channel
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._generation = 0
+        self._stamp: Optional[int] = None
+        self._lock = threading.Lock()
+        # With the postgres channel the cache is only trusted while LISTEN is connected
+        self._listening = False
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        if self.channel == "postgres":
+            return self._listening
+        return self.channel == "file"
+
+    # --- Reads ---
+
+    def _sync_stamp(self) -> None:
+        """Drop everything if another worker touched the stamp file"""
+        try:
+            stamp = os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._stamp = stamp
+                    self._clear()
+
+    @property
+    def generation(self) -> int:
+        """Token to take before loading a value, and to pass to ``put``"""
+        if self.channel == "file":
+            self._sync_stamp()
+        return self._generation
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        if self.channel == "file":
+            self._sync_stamp()
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any, generation: int) -> None:
+        """Store ``value`` unless the cache was invalidated since ``generation`` was taken"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), value)
+
+    # --- Invalidation ---
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def publish(self, activity_types: Iterable[str] = ()) -> None:
+        """
+        Invalidate every worker's cache after ratings were committed.
+
+        Args:
+            activity_types: Activities that changed (sent as the NOTIFY payload)
+        """
+        with self._lock:
+            self._clear()
+        try:
+            if self.channel == "postgres":
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {"channel": NOTIFY_CHANNEL, "payload": ",".join(sorted(set(activity_types)))[:7000]})
+                    conn.commit()
+            elif self.channel == "file":
+                os.makedirs(os.path.dirname(self.stamp_path) or ".", exist_ok=True)
+                with open(self.stamp_path, "a"):
+                    pass
+                os.utime(self.stamp_path, None)
+                self._stamp = os.stat(self.stamp_path).st_mtime_ns
+        except Exception as e:
+            # Other workers fall back to the TTL for this change
+            logger.warning(f"Could not publish rating stats invalidation over {self.channel}: {e}")
+
+    # --- PostgreSQL listener ---
+
+    def _listen(self) -> None:
+        delay = RECONNECT_SECONDS
+        while not self._stopping.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                dbapi_conn = raw.driver_connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Anything cached while disconnected may have missed a notification
+                with self._lock:
+                    self._clear()
+                    self._listening = True
+                delay = RECONNECT_SECONDS
+                while not self._stopping.is_set():
+                    if select.select([dbapi_conn], [], [], 5)[0]:
+                        dbapi_conn.poll()
+                        if dbapi_conn.notifies:
+                            dbapi_conn.notifies.clear()
+                            with self._lock:
+                                self._clear()
+            except Exception as e:
+                if not self._stopping.is_set():
+                    logger.warning(f"Rating stats listener disconnected, retrying in {delay:.0f}s: {e}")
+            finally:
+                self._listening = False
+                if raw is not None:
+                    try:
+                        raw.invalidate()  # Do not return a LISTENing connection to the pool
+                    except Exception:
+                        pass
+            self._stopping.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+
+    def start(self) -> None:
+        """Start the LISTEN thread (postgres channel only)"""
+        if self.channel != "postgres" or (self._listener is not None and self._listener.is_alive()):
+            return
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="rating-stats-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "channel": self.channel,
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache used by the ratings router
+rating_stats_cache = RatingStatsCache()
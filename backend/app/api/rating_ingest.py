@@ -0,0 +1,371 @@
+"""
+Write-behind rating ingestion.
+
+Bursts of ratings (a class rating the same exercise at once) would otherwise
+cost one transaction each. ``RatingIngestBuffer.submit`` queues the rating
+and waits for the next flush. A flush first appends every newly queued
+rating to a local append-only log with one write and one fsync (group
+commit, in a worker thread so the event loop never waits on the disk), then
+writes the batch with one multi-row insert plus one aggregate update per
+activity in a single transaction. Submitters are answered after both. A
+flush runs every ``RATING_FLUSH_MS`` milliseconds or as soon as
+``RATING_FLUSH_ROWS`` ratings are waiting.
+
+Each worker process keeps its own log under ``RATING_INGEST_DIR``, locked
+with ``flock`` while the process lives. After a flush commits, the log is
+cut back to the ratings still queued (truncated when none are left). On start, a process adopts the
+logs of processes that are gone, so an acknowledged rating is never lost; a
+crash between a commit and the log rewrite can replay that batch once
+(at-least-once delivery).
+"""
+import os
+import glob
+import json
+import fcntl
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.database import SessionLocal
+from app.api.rating_stats import record_ratings, get_aggregate
+from app.api.rating_cache import rating_stats_cache
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+RATING_INGEST_DIR = os.getenv("RATING_INGEST_DIR", os.path.join("data", "ratings"))
+RATING_FLUSH_MS = int(os.getenv("RATING_FLUSH_MS", "50"))
+RATING_FLUSH_ROWS = int(os.getenv("RATING_FLUSH_ROWS", "200"))
+RATING_LOG_FSYNC = os.getenv("RATING_LOG_FSYNC", "true").lower() == "true"
+RATING_WRITE_BEHIND = os.getenv("RATING_WRITE_BEHIND", "true").lower() == "true"
+
+# Delay before retrying a flush that failed (doubles up to the maximum)
+RETRY_SECONDS = 0.5
+MAX_RETRY_SECONDS = 30.0
+
+
+class PendingRating(NamedTuple):
+    """A logged rating waiting to be written"""
+    activity_type: str
+    rating_value: int
+    created_at: datetime  # When the rating was submitted, not when it was flushed
+    future: Optional[asyncio.Future]  # None for ratings replayed from the log
+
+
+class FlushResult(NamedTuple):
+    """What a submitter learns once its rating is committed"""
+    rating_id: int
+    count: Optional[int]  # None when the stats could not be read after the commit
+    average_rating: Optional[float]
+
+
+class RatingIngestBuffer:
+    """Queues ratings behind an append-only log and writes them in batches"""
+
+    def __init__(
+        self,
+        log_dir: str = RATING_INGEST_DIR,
+        flush_ms: int = RATING_FLUSH_MS,
+        max_rows: int = RATING_FLUSH_ROWS,
+        fsync: bool = RATING_LOG_FSYNC,
+        session_factory=SessionLocal,
+    ):
+        self.log_dir = log_dir
+        self.log_path: Optional[str] = None  # Set on start: workers may be forked after import
+        self.flush_seconds = flush_ms / 1000
+        self.max_rows = max_rows
+        self.fsync = fsync
+        self.session_factory = session_factory
+        self._pending: List[PendingRating] = []
+        # Log lines of the newest queued ratings, not yet written to the log (a suffix of _pending)
+        self._unsynced: List[str] = []
+        self._log_lock: Optional[asyncio.Lock] = None
+        # The log still holds committed ratings because a rewrite failed
+        self._log_stale = False
+        self._stopping: Optional[asyncio.Event] = None
+        self._log_fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.replayed = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # --- Log ---
+
+    @staticmethod
+    def _entry(activity_type: str, rating_value: int, created_at: datetime) -> str:
+        entry = {"activity": activity_type, "rating": rating_value, "at": created_at.isoformat()}
+        return json.dumps(entry, separators=(",", ":")) + "\n"
+
+    def _append(self, lines: List[str]) -> None:
+        os.write(self._log_fd, "".join(lines).encode("utf-8"))
+        if self.fsync:
+            os.fsync(self._log_fd)
+
+    def _open_log(self) -> None:
+        self._log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _rewrite_log(self, remaining: List[PendingRating]) -> None:
+        """Replace the log with ``remaining`` (runs in a worker thread)"""
+        if not remaining:
+            # A lost truncate only replays committed ratings (at-least-once), so no fsync
+            os.ftruncate(self._log_fd, 0)
+            return
+        tmp = f"{self.log_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(self._entry(item.activity_type, item.rating_value, item.created_at) for item in remaining)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.log_path)
+        # Open the new log before closing the old one so _log_fd is never left closed
+        old_fd = self._log_fd
+        self._open_log()
+        os.close(old_fd)
+
+    async def _trim_log(self) -> None:
+        """
+        Drop committed ratings from the log.
+
+        Never raises: the ratings are already in the database, so a failure
+        must not send them back through the retry loop. It is logged and the
+        rewrite is tried again on the next flush.
+        """
+        async with self._log_lock:
+            try:
+                await asyncio.to_thread(self._rewrite_log, self._pending[:self._synced])
+                self._log_stale = False
+            except Exception as e:
+                self._log_stale = True
+                self.failures += 1
+                logger.error(f"Could not drop committed ratings from {self.log_path}; retrying on the next flush: {e}")
+
+    @property
+    def _synced(self) -> int:
+        """How many ratings at the head of the queue are in the log"""
+        return len(self._pending) - len(self._unsynced)
+
+    async def _sync_log(self) -> None:
+        """Append every unlogged rating with one write and one fsync, off the event loop"""
+        async with self._log_lock:
+            if not self._unsynced:
+                return
+            lines, self._unsynced = self._unsynced, []
+            try:
+                await asyncio.to_thread(self._append, lines)
+            except BaseException:
+                self._unsynced = lines + self._unsynced
+                raise
+
+    @staticmethod
+    def _read_log(path: str) -> List[PendingRating]:
+        entries = []
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from a crash mid-write: it was never acknowledged
+                    created_at = datetime.fromisoformat(entry["at"]) if "at" in entry else datetime.now(timezone.utc)
+                    entries.append(PendingRating(entry["activity"], int(entry["rating"]), created_at, None))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _lock(self, lock_path: str) -> Optional[int]:
+        """Take the lock on ``lock_path`` without waiting; None if a live process holds it"""
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _recover(self) -> int:
+        """Lock this process's log and adopt the logs left by processes that are gone"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.log_path = os.path.join(self.log_dir, f"ingest-{os.getpid()}.log")
+        self._lock_fd = self._lock(self.log_path[:-len(".log")] + ".lock")
+
+        # A previous process may have had the same pid (common in containers)
+        self._pending.extend(self._read_log(self.log_path))
+        self._open_log()
+
+        adopted = 0
+        for lock_path in glob.glob(os.path.join(self.log_dir, "ingest-*.lock")):
+            log_path = lock_path[:-len(".lock")] + ".log"
+            if log_path == self.log_path:
+                continue
+            fd = self._lock(lock_path)
+            if fd is None:
+                continue  # Still running
+            try:
+                entries = self._read_log(log_path)
+                if entries:
+                    self._append([self._entry(item.activity_type, item.rating_value, item.created_at) for item in entries])
+                    self._pending.extend(entries)
+                    adopted += len(entries)
+                for path in (log_path, f"{log_path}.tmp", lock_path):
+                    if os.path.exists(path):
+                        os.unlink(path)
+            finally:
+                os.close(fd)
+
+        replayed = len(self._pending)
+        if replayed:
+            logger.info(f"Replaying {replayed} logged ratings ({adopted} adopted from stopped workers)")
+        self.replayed += replayed
+        return replayed
+
+    # --- Ingestion ---
+
+    async def submit(self, activity_type: str, rating_value: int, timeout: Optional[float] = None) -> Optional[FlushResult]:
+        """
+        Queue a rating, then wait for the flush that logs and writes it.
+
+        Returns:
+            The committed rating id and updated stats, or None if the flush
+            did not complete within ``timeout`` (the rating is then logged
+            before returning, and will be written on a later flush)
+        """
+        future = asyncio.get_running_loop().create_future()
+        created_at = datetime.now(timezone.utc)
+        self._unsynced.append(self._entry(activity_type, rating_value, created_at))
+        self._pending.append(PendingRating(activity_type, rating_value, created_at, future))
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            # The flush may be stuck on the database: make sure the rating is durable anyway
+            await self._sync_log()
+            return None
+
+    def _write_batch(self, batch: List[PendingRating]) -> List[int]:
+        """Write a batch in one transaction and return the new ids (runs in a worker thread)"""
+        with self.session_factory() as db:
+            ids = record_ratings(db, [(item.activity_type, item.rating_value, item.created_at) for item in batch])
+            db.commit()
+        return ids
+
+    def _read_stats(self, activity_types: Set[str]) -> Dict[str, Tuple[int, float]]:
+        """Announce the new ratings and read the updated aggregates (runs in a worker thread)"""
+        rating_stats_cache.publish(activity_types)
+        stats = {}
+        with self.session_factory() as db:
+            for activity_type in activity_types:
+                aggregate = get_aggregate(db, activity_type)
+                stats[activity_type] = (aggregate.count, float(aggregate.average_rating)) if aggregate else (0, 0.0)
+        return stats
+
+    async def flush(self) -> int:
+        """Log newly queued ratings, then write up to ``max_rows`` of them; returns the number written"""
+        await self._sync_log()
+        # Only ratings already in the log (more may have been queued during the fsync)
+        batch = self._pending[:min(self.max_rows, self._synced)]
+        if not batch:
+            if self._log_stale:
+                await self._trim_log()
+            return 0
+        ids = await asyncio.to_thread(self._write_batch, batch)
+
+        # Committed: from here on nothing may raise, or the retry loop would insert the batch again
+        del self._pending[:len(batch)]
+        await self._trim_log()
+        self.flushes += 1
+        self.flushed_rows += len(batch)
+        try:
+            stats = await asyncio.to_thread(self._read_stats, {item.activity_type for item in batch})
+        except Exception as e:
+            # Submitters get their ids with null stats
+            stats = {}
+            self.failures += 1
+            logger.error(f"Ratings committed but their stats could not be read: {e}")
+        for item, rating_id in zip(batch, ids):
+            if item.future is not None and not item.future.done():
+                count, average = stats.get(item.activity_type, (None, None))
+                item.future.set_result(FlushResult(rating_id, count, average))
+        return len(batch)
+
+    async def _flush_loop(self) -> None:
+        retry = RETRY_SECONDS
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return  # stop() runs the final flush
+            try:
+                while self._pending or self._log_stale:
+                    await self.flush()
+                    if len(self._pending) < self.max_rows:
+                        break
+                retry = RETRY_SECONDS
+            except Exception as e:
+                # Ratings stay logged and queued; try again after a pause
+                self.failures += 1
+                logger.error(f"Rating flush failed, retrying in {retry:.1f}s: {e}", exc_info=True)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=retry)
+                except asyncio.TimeoutError:
+                    pass
+                retry = min(retry * 2, MAX_RETRY_SECONDS)
+
+    def start(self) -> None:
+        """Open the log, replay leftovers and start flushing on the running loop"""
+        if self.running:
+            return
+        self._recover()
+        self._wakeup = asyncio.Event()
+        self._log_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop (anything unwritten stays in the log)"""
+        if self._task is None:
+            return
+        # Let an in-flight flush finish: cancelling it mid-write could log or insert a batch twice
+        self._stopping.set()
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        try:
+            while self._pending:
+                await self.flush()
+            if self._log_stale:
+                await self._trim_log()
+        except Exception as e:
+            logger.error(f"Final rating flush failed; {len(self._pending)} ratings kept in {self.log_path}: {e}")
+        for fd in (self._log_fd, self._lock_fd):
+            if fd is not None:
+                os.close(fd)
+        self._log_fd = self._lock_fd = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": len(self._pending),
+            "unlogged": len(self._unsynced),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "replayed": self.replayed,
+            "failures": self.failures,
+        }
+
+
+# Process-wide buffer, started by the application when RATING_WRITE_BEHIND is enabled
+rating_buffer = RatingIngestBuffer()
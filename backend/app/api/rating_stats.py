@@ -0,0 +1,250 @@
+"""
+Running rating aggregates.
+
+Rating stats used to be computed with ``COUNT``/``AVG ... GROUP BY`` over every
+rating row on each read and after each insert. ``record_rating`` instead adds
+the rating and bumps the activity's row in ``activity_rating_stats`` in the
+same transaction (``INSERT ... ON CONFLICT DO UPDATE`` on PostgreSQL and
+SQLite), so reads are a primary-key lookup however many ratings accumulate.
+Hourly and daily buckets in ``activity_rating_rollups`` are updated the same
+way and back the trend queries in ``get_trend``.
+
+The table can be recomputed from the rating rows, e.g. after ratings were
+inserted by other means::
+
+    python -m app.api.rating_stats rebuild
+"""
+import sys
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, select, update, delete, insert
+from sqlalchemy.orm import Session
+
+from app.models.rating import Rating, RatingAggregate, RatingRollup
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+RATING_VALUES = range(1, 6)
+
+# Bucket sizes for rollups
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour or day containing ``moment``"""
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _increments(rating_values: Sequence[int]) -> Dict[str, int]:
+    """Column increments for adding ``rating_values`` to an aggregate row"""
+    increments = {"count": len(rating_values), "total": sum(rating_values)}
+    for value, count in Counter(rating_values).items():
+        if value in RATING_VALUES:
+            increments[f"rating_{value}"] = count
+    return increments
+
+
+def _upsert_counts(db: Session, table, keys: Dict[str, Any], increments: Dict[str, int], zeroed: Sequence[str]) -> None:
+    """Add ``increments`` to the row identified by ``keys``, creating it from zeros"""
+    set_ = {column: table.c[column] + amount for column, amount in increments.items()}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        values = {column: 0 for column in zeroed}
+        values.update(increments)
+        stmt = dialect_insert(table).values(**keys, **values)
+        if "updated_at" in table.c:
+            set_["updated_at"] = func.now()
+        db.execute(stmt.on_conflict_do_update(index_elements=[table.c[key] for key in keys], set_=set_))
+        return
+
+    # Other databases: update in place, inserting the row on first rating
+    result = db.execute(
+        update(table).where(*(table.c[key] == value for key, value in keys.items())).values(**set_)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(table).values(**keys, **{column: 0 for column in zeroed}, **increments))
+
+
+def _upsert(db: Session, activity_type: str, ratings: Sequence[Tuple[int, datetime]]) -> None:
+    """Add (rating value, created at) pairs to the activity's aggregate and rollup rows"""
+    values = [value for value, _ in ratings]
+    _upsert_counts(
+        db, RatingAggregate.__table__, {"activity_type": activity_type}, _increments(values),
+        ("count", "total", *(f"rating_{v}" for v in RATING_VALUES)),
+    )
+    for granularity in GRANULARITIES:
+        buckets: Dict[datetime, List[int]] = defaultdict(list)
+        for value, created_at in ratings:
+            buckets[bucket_start(created_at, granularity)].append(value)
+        for start, bucket_values in buckets.items():
+            _upsert_counts(
+                db, RatingRollup.__table__,
+                {"activity_type": activity_type, "granularity": granularity, "bucket_start": start},
+                {"count": len(bucket_values), "total": sum(bucket_values)},
+                ("count", "total"),
+            )
+
+
+def record_rating(db: Session, activity_type: str, rating_value: int, user_id: Optional[int] = None) -> Rating:
+    """
+    Insert a rating and update its activity's aggregate in the same transaction.
+
+    The caller commits (or rolls back) the session.
+
+    Returns:
+        The new Rating, flushed so its id is set
+    """
+    created_at = datetime.now(timezone.utc)
+    db_rating = Rating(activity_type=activity_type, rating_value=rating_value, user_id=user_id, created_at=created_at)
+    db.add(db_rating)
+    db.flush()
+    _upsert(db, activity_type, [(rating_value, created_at)])
+    return db_rating
+
+
+def record_ratings(db: Session, ratings: Sequence[Tuple[str, int, datetime]]) -> List[int]:
+    """
+    Insert a batch of (activity_type, rating_value, created_at) tuples with
+    one multi-row insert and one aggregate update per activity, plus one
+    rollup update per touched bucket (the caller commits).
+
+    Returns:
+        The new rating ids, in the order of ``ratings``
+    """
+    if not ratings:
+        return []
+    ids = db.execute(
+        insert(Rating).returning(Rating.id, sort_by_parameter_order=True),
+        [
+            {"activity_type": activity_type, "rating_value": value, "created_at": created_at}
+            for activity_type, value, created_at in ratings
+        ],
+    ).scalars().all()
+    by_activity: Dict[str, List[Tuple[int, datetime]]] = defaultdict(list)
+    for activity_type, value, created_at in ratings:
+        by_activity[activity_type].append((value, created_at))
+    for activity_type, values in by_activity.items():
+        _upsert(db, activity_type, values)
+    return list(ids)
+
+
+def get_aggregate(db: Session, activity_type: str) -> Optional[RatingAggregate]:
+    """Return the aggregate for one activity, or None if it has no ratings"""
+    return db.get(RatingAggregate, activity_type)
+
+
+def get_aggregates(db: Session) -> List[RatingAggregate]:
+    """Return the aggregates of every rated activity"""
+    return db.query(RatingAggregate).order_by(RatingAggregate.activity_type).all()
+
+
+def get_trend(db: Session, activity_type: str, granularity: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    Rating counts and averages per bucket in [start, end).
+
+    Buckets without ratings are included with a count of 0.
+
+    Returns:
+        One {"start", "count", "average_rating"} dict per bucket, oldest first
+    """
+    step = GRANULARITIES[granularity]
+    first = bucket_start(start, granularity)
+    last = end.astimezone(timezone.utc) if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    rows = db.query(RatingRollup).filter(
+        RatingRollup.activity_type == activity_type,
+        RatingRollup.granularity == granularity,
+        RatingRollup.bucket_start >= first,
+        RatingRollup.bucket_start < last,
+    ).order_by(RatingRollup.bucket_start).all()
+    by_start = {bucket_start(row.bucket_start, granularity): row for row in rows}
+
+    series = []
+    moment = first
+    while moment < last:
+        row = by_start.get(moment)
+        series.append({
+            "start": moment.isoformat(),
+            "count": row.count if row else 0,
+            "average_rating": float(row.average_rating) if row else 0.0,
+        })
+        moment += step
+    return series
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute every aggregate and rollup from the rating rows (the caller commits).
+
+    Returns:
+        Number of activities aggregated
+    """
+    table = RatingAggregate.__table__
+    columns = [
+        Rating.activity_type,
+        func.count(Rating.id),
+        func.coalesce(func.sum(Rating.rating_value), 0),
+        *(func.sum(case((Rating.rating_value == v, 1), else_=0)) for v in RATING_VALUES),
+    ]
+    db.execute(delete(table))
+    db.execute(
+        insert(table).from_select(
+            ["activity_type", "count", "total", *(f"rating_{v}" for v in RATING_VALUES)],
+            select(*columns).group_by(Rating.activity_type),
+        )
+    )
+
+    # Rollups: bucketed in Python so the same code works on every database
+    buckets: Dict[Tuple[str, str, datetime], List[int]] = defaultdict(lambda: [0, 0])
+    query = db.query(Rating.activity_type, Rating.rating_value, Rating.created_at).filter(Rating.created_at.isnot(None))
+    for activity_type, value, created_at in query.yield_per(5000):
+        for granularity in GRANULARITIES:
+            bucket = buckets[(activity_type, granularity, bucket_start(created_at, granularity))]
+            bucket[0] += 1
+            bucket[1] += value
+    db.execute(delete(RatingRollup.__table__))
+    if buckets:
+        db.execute(insert(RatingRollup.__table__), [
+            {"activity_type": activity_type, "granularity": granularity, "bucket_start": start, "count": count, "total": total}
+            for (activity_type, granularity, start), (count, total) in buckets.items()
+        ])
+
+    rebuilt = db.query(func.count(RatingAggregate.activity_type)).scalar()
+    logger.info(f"Rebuilt rating aggregates for {rebuilt} activities ({len(buckets)} rollup buckets)")
+    return rebuilt
+
+
+def ensure_aggregates(db: Session) -> None:
+    """Create the aggregate tables and fill them if ratings exist but were never aggregated"""
+    RatingAggregate.__table__.create(bind=db.get_bind(), checkfirst=True)
+    RatingRollup.__table__.create(bind=db.get_bind(), checkfirst=True)
+    if db.query(Rating.id).first() is None:
+        return
+    if db.query(RatingAggregate.activity_type).first() is None or db.query(RatingRollup.activity_type).first() is None:
+        rebuild(db)
+        db.commit()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.api.rating_stats rebuild")
+        sys.exit(1)
+
+    from app.database import SessionLocal
+    with SessionLocal() as session:
+        RatingAggregate.__table__.create(bind=session.get_bind(), checkfirst=True)
+        RatingRollup.__table__.create(bind=session.get_bind(), checkfirst=True)
+        count = rebuild(session)
+        session.commit()
+    print(f"Rebuilt rating aggregates for {count} activities")
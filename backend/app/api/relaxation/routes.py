@@ -1,9 +1,12 @@
 from fastapi import APIRouter
 from typing import Dict, List, Any
 
+from app.api.utils.response_cache import cached_response
+
 router = APIRouter()
 
 @router.get("/")
+@cached_response()
 async def relaxation_root():
     """
     Root endpoint for relaxation API.
@@ -22,6 +25,7 @@ async def relaxation_root():
     }
 
 @router.get("/breathing")
+@cached_response()
 async def breathing_exercises():
     """
     Get breathing exercise recommendations.
@@ -46,6 +50,7 @@ async def breathing_exercises():
     }
 
 @router.get("/meditation")
+@cached_response()
 async def meditation_exercises():
     """
     Get meditation exercise recommendations.
@@ -70,6 +75,7 @@ async def meditation_exercises():
     }
 
 @router.get("/stretching")
+@cached_response()
 async def stretching_exercises():
     """
     Get stretching exercise recommendations.
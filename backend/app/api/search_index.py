@@ -0,0 +1,522 @@
+"""
+Full-text search over journal entries and notes.
+
+Both stores hand each change to ``search_index`` (``add`` after a create or
+update, ``remove`` after a delete), so the index stays current without
+rescanning. Queries return hits ranked by BM25, optionally limited to one
+kind of document, a tag and a created_at range.
+
+Two backends share the same interface:
+
+- ``fts5``: an SQLite FTS5 table in ``SEARCH_INDEX_PATH``. It is a separate
+  file so it works whichever database holds the documents, and every worker
+  process shares it.
+- ``python``: an in-process inverted index, used when the ``sqlite3`` module
+  was built without FTS5. Each worker keeps its own copy, filled by the
+  startup sync and then only by changes made through that worker, so other
+  workers would miss them. It therefore refuses to run when
+  ``WEB_CONCURRENCY`` asks for more than one worker: searches raise
+  ``SearchUnavailable`` (503) until FTS5 is available.
+
+``SEARCH_INDEX_BACKEND=auto`` picks ``fts5`` when it is available. On
+startup, ``sync`` re-indexes a kind whose document count no longer matches
+its store, e.g. after the index file was deleted.
+"""
+import os
+import re
+import math
+import bisect
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.api.utils.timestamps import naive_utc
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_BACKEND = os.getenv("SEARCH_INDEX_BACKEND", "auto").lower()
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join("data", "search", "index.db"))
+# Worker processes serving the app (the variable uvicorn and gunicorn read)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Words around the first match in a snippet
+SNIPPET_TOKENS = 12
+
+# BM25 parameters (the FTS5 defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_QUERY_TERM = re.compile(r"(\w+)(\*?)")
+
+
+class SearchUnavailable(RuntimeError):
+    """Raised when no search backend can serve this deployment"""
+
+
+class SearchDocument(NamedTuple):
+    """What the index keeps for one journal entry or note"""
+    kind: str  # "journal" or "note"
+    doc_id: str
+    title: str
+    body: str
+    tags: Tuple[str, ...]
+    created_at: str  # Naive UTC ISO timestamp, as the store serialises it
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents (as FTS5's unicode61 tokenizer does)"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(_fold(text))
+
+
+def parse_query(query: str) -> List[Tuple[str, bool]]:
+    """
+    Split a query into (term, is_prefix) pairs.
+
+    Every term must match; a trailing ``*`` matches any word starting with the term.
+    """
+    return [(match.group(1), bool(match.group(2))) for match in _QUERY_TERM.finditer(_fold(query))]
+
+
+def _time_bound(value: Optional[datetime]) -> Optional[str]:
+    """A created_at bound in the stored form: naive UTC, ISO formatted"""
+    return naive_utc(value).isoformat() if value is not None else None
+
+
+class Fts5Backend:
+    """Documents in an SQLite FTS5 table"""
+
+    name = "fts5"
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                # Derived data: skip the fsync per update (a power loss can drop the last few)
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    rowid INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    UNIQUE (kind, doc_id)
+                );
+                CREATE INDEX IF NOT EXISTS ix_documents_kind_created ON documents (kind, created_at);
+                CREATE TABLE IF NOT EXISTS document_tags (
+                    tag TEXT NOT NULL,
+                    doc_rowid INTEGER NOT NULL,
+                    PRIMARY KEY (tag, doc_rowid)
+                ) WITHOUT ROWID;
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+                    USING fts5(title, body, tokenize='unicode61 remove_diacritics 2');
+            """)
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            conn = sqlite3.connect(":memory:")
+            conn.execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+            conn.close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _remove(self, kind: str, doc_id: str) -> None:
+        row = self._conn.execute("SELECT rowid FROM documents WHERE kind = ? AND doc_id = ?", (kind, doc_id)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+        self._conn.execute("DELETE FROM document_tags WHERE doc_rowid = ?", row)
+        self._conn.execute("DELETE FROM documents WHERE rowid = ?", row)
+
+    def _add(self, doc: SearchDocument, replace: bool = True) -> None:
+        if replace:
+            self._remove(doc.kind, doc.doc_id)
+        rowid = self._conn.execute(
+            "INSERT INTO documents (kind, doc_id, created_at, tags) VALUES (?, ?, ?, ?)",
+            (doc.kind, doc.doc_id, doc.created_at, "\x1f".join(doc.tags)),
+        ).lastrowid
+        self._conn.execute("INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)", (rowid, doc.title, doc.body))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (tag, doc_rowid) VALUES (?, ?)",
+            [(tag, rowid) for tag in set(doc.tags)],
+        )
+
+    def _transaction(self, work) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                work()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def add(self, doc: SearchDocument) -> None:
+        self._transaction(lambda: self._add(doc))
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        self._transaction(lambda: self._remove(kind, doc_id))
+
+    def replace_kind(self, kind: str, docs: Iterable[SearchDocument]) -> int:
+        count = 0
+
+        def work():
+            nonlocal count
+            rowids = "SELECT rowid FROM documents WHERE kind = ?"
+            self._conn.execute(f"DELETE FROM documents_fts WHERE rowid IN ({rowids})", (kind,))
+            self._conn.execute(f"DELETE FROM document_tags WHERE doc_rowid IN ({rowids})", (kind,))
+            self._conn.execute("DELETE FROM documents WHERE kind = ?", (kind,))
+            for doc in docs:
+                self._add(doc, replace=False)
+                count += 1
+
+        self._transaction(work)
+        return count
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def search(
+        self,
+        terms: List[Tuple[str, bool]],
+        limit: int,
+        kind: Optional[str],
+        tag: Optional[str],
+        start: Optional[str],
+        end: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        # Quote every term so query text cannot use FTS5 operators
+        match = " ".join(f'"{term}"' + ("*" if prefix else "") for term, prefix in terms)
+        sql = [
+            "SELECT d.kind, d.doc_id, d.created_at, d.tags, bm25(documents_fts) AS rank,",
+            f"snippet(documents_fts, -1, '', '', '...', {SNIPPET_TOKENS})",
+            "FROM documents_fts JOIN documents d ON d.rowid = documents_fts.rowid",
+            "WHERE documents_fts MATCH ?",
+        ]
+        params: List[Any] = [match]
+        if kind is not None:
+            sql.append("AND d.kind = ?")
+            params.append(kind)
+        if tag is not None:
+            sql.append("AND d.rowid IN (SELECT doc_rowid FROM document_tags WHERE tag = ?)")
+            params.append(tag)
+        if start is not None:
+            sql.append("AND d.created_at >= ?")
+            params.append(start)
+        if end is not None:
+            sql.append("AND d.created_at < ?")
+            params.append(end)
+        sql.append("ORDER BY rank LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        return [
+            {
+                "kind": kind, "id": doc_id, "created_at": created_at,
+                "tags": tags.split("\x1f") if tags else [],
+                "score": round(-rank, 4), "snippet": snippet,
+            }
+            for kind, doc_id, created_at, tags, rank, snippet in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PythonBackend:
+    """In-process inverted index with BM25 ranking"""
+
+    name = "python"
+
+    def __init__(self):
+        self._docs: Dict[Tuple[str, str], SearchDocument] = {}
+        self._lengths: Dict[Tuple[str, str], int] = {}
+        self._postings: Dict[str, Dict[Tuple[str, str], int]] = defaultdict(dict)
+        self._by_tag: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self._total_length = 0
+        self._vocabulary: Optional[List[str]] = None  # Sorted terms for prefix lookups, rebuilt lazily
+        self._lock = threading.RLock()
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for term in set(tokenize(f"{doc.title} {doc.body}")):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary = None
+        for tag in set(doc.tags):
+            self._by_tag[tag].discard(key)
+            if not self._by_tag[tag]:
+                del self._by_tag[tag]
+        self._total_length -= self._lengths.pop(key)
+
+    def _add(self, doc: SearchDocument) -> None:
+        key = (doc.kind, doc.doc_id)
+        self._remove(key)
+        tokens = tokenize(f"{doc.title} {doc.body}")
+        for term, frequency in Counter(tokens).items():
+            if term not in self._postings:
+                self._vocabulary = None
+            self._postings[term][key] = frequency
+        for tag in set(doc.tags):
+            self._by_tag[tag].add(key)
+        self._docs[key] = doc
+        self._lengths[key] = len(tokens)
+        self._total_length += len(tokens)
+
+    def add(self, doc: SearchDocument) -> None:
+        with self._lock:
+            self._add(doc)
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        with self._lock:
+            self._remove((kind, doc_id))
+
+    def replace_kind(self, kind: str, docs: Iterable[SearchDocument]) -> int:
+        with self._lock:
+            for key in [key for key in self._docs if key[0] == kind]:
+                self._remove(key)
+            count = 0
+            for doc in docs:
+                self._add(doc)
+                count += 1
+            return count
+
+    def count(self, kind: str) -> int:
+        return sum(1 for key in self._docs if key[0] == kind)
+
+    def _expand(self, term: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [term] if term in self._postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        matches = []
+        for i in range(bisect.bisect_left(vocabulary, term), len(vocabulary)):
+            if not vocabulary[i].startswith(term):
+                break
+            matches.append(vocabulary[i])
+        return matches
+
+    def _snippet(self, doc: SearchDocument, terms: List[Tuple[str, bool]]) -> str:
+        words = _TOKEN.findall(f"{doc.title} {doc.body}")
+        folded = [_fold(word) for word in words]
+        first = next(
+            (i for i, word in enumerate(folded)
+             if any(word.startswith(term) if prefix else word == term for term, prefix in terms)),
+            0,
+        )
+        begin = max(0, first - SNIPPET_TOKENS // 2)
+        window = words[begin:begin + SNIPPET_TOKENS]
+        return ("..." if begin else "") + " ".join(window) + ("..." if begin + SNIPPET_TOKENS < len(words) else "")
+
+    def search(
+        self,
+        terms: List[Tuple[str, bool]],
+        limit: int,
+        kind: Optional[str],
+        tag: Optional[str],
+        start: Optional[str],
+        end: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            total_docs = len(self._docs)
+            if not total_docs:
+                return []
+            average_length = self._total_length / total_docs or 1.0
+
+            # Each query term contributes the postings of every word it matches
+            per_term = []
+            for term, prefix in terms:
+                postings: Dict[Tuple[str, str], float] = defaultdict(float)
+                for word in self._expand(term, prefix):
+                    word_postings = self._postings[word]
+                    idf = math.log(1 + (total_docs - len(word_postings) + 0.5) / (len(word_postings) + 0.5))
+                    for key, frequency in word_postings.items():
+                        length_norm = 1 - BM25_B + BM25_B * self._lengths[key] / average_length
+                        postings[key] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                if not postings:
+                    return []
+                per_term.append(postings)
+
+            # Intersect starting from the rarest term
+            per_term.sort(key=len)
+            candidates = set(per_term[0])
+            if tag is not None:
+                candidates &= self._by_tag.get(tag, set())
+            for postings in per_term[1:]:
+                candidates.intersection_update(postings)
+
+            scored = []
+            for key in candidates:
+                doc = self._docs[key]
+                if kind is not None and doc.kind != kind:
+                    continue
+                if start is not None and doc.created_at < start:
+                    continue
+                if end is not None and doc.created_at >= end:
+                    continue
+                scored.append((sum(postings[key] for postings in per_term), key))
+            scored.sort(key=lambda item: (-item[0], item[1]))
+
+            hits = []
+            for score, key in scored[:limit]:
+                doc = self._docs[key]
+                hits.append({
+                    "kind": doc.kind, "id": doc.doc_id, "created_at": doc.created_at,
+                    "tags": list(doc.tags), "score": round(score, 4), "snippet": self._snippet(doc, terms),
+                })
+            return hits
+
+    def close(self) -> None:
+        pass
+
+
+class SearchIndex:
+    """Journal and note search, kept current by the stores"""
+
+    def __init__(self, backend: str = SEARCH_INDEX_BACKEND, path: str = SEARCH_INDEX_PATH, workers: int = WEB_CONCURRENCY):
+        self.requested = backend
+        self.path = path
+        self.workers = workers
+        self._backend = None
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.updates = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        """
+        The backend, opened on first use.
+
+        Raises:
+            SearchUnavailable: If only the python backend is available and several workers run
+        """
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    use_fts = self.requested == "fts5" or (self.requested == "auto" and Fts5Backend.available())
+                    if use_fts:
+                        self._backend = Fts5Backend(self.path)
+                    elif self.workers > 1:
+                        raise SearchUnavailable(
+                            f"The python search backend keeps one index per process and cannot serve "
+                            f"{self.workers} workers; use an sqlite3 build with FTS5 or a single worker"
+                        )
+                    else:
+                        self._backend = PythonBackend()
+                    logger.info(f"Search index using the {self._backend.name} backend")
+        return self._backend
+
+    def add(self, doc: SearchDocument) -> None:
+        """Index a new or changed document. Failures are logged, never raised."""
+        try:
+            self.backend.add(doc)
+            self.updates += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Could not index {doc.kind} {doc.doc_id}: {e}")
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        """Drop a deleted document. Failures are logged, never raised."""
+        try:
+            self.backend.remove(kind, doc_id)
+            self.updates += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Could not remove {kind} {doc_id} from the search index: {e}")
+
+    def reindex(self, kind: str, docs: Iterable[SearchDocument]) -> int:
+        """Replace every document of ``kind``; returns the number indexed"""
+        count = self.backend.replace_kind(kind, docs)
+        logger.info(f"Indexed {count} {kind} documents for search")
+        return count
+
+    def sync(self, kind: str, expected: int, docs) -> bool:
+        """
+        Re-index ``kind`` if the index does not hold ``expected`` documents.
+
+        Args:
+            kind: Document kind
+            expected: How many documents the store holds
+            docs: Callable returning the store's documents, only called when re-indexing
+
+        Returns:
+            Whether the kind was re-indexed
+        """
+        if self.backend.count(kind) == expected:
+            return False
+        self.reindex(kind, docs())
+        return True
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        kind: Optional[str] = None,
+        tag: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ranked search.
+
+        Args:
+            query: Words that must all appear; ``word*`` matches a prefix
+            limit: Maximum number of hits
+            kind: Only "journal" or only "note" documents
+            tag: Only documents carrying this tag
+            start: Only documents created at or after this time
+            end: Only documents created before this time
+
+        Returns:
+            Hits, best first: {"kind", "id", "created_at", "tags", "score", "snippet"}
+        """
+        terms = parse_query(query)
+        if not terms:
+            return []
+        self.queries += 1
+        return self.backend.search(terms, limit, kind, tag, _time_bound(start), _time_bound(end))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self._backend.name if self._backend is not None else None,
+            "workers": self.workers,
+            "queries": self.queries,
+            "updates": self.updates,
+            "errors": self.errors,
+        }
+
+    def close(self) -> None:
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+
+# Process-wide index used by the journal and note stores
+search_index = SearchIndex()
@@ -0,0 +1,102 @@
+"""
+Byte-budgeted LRU cache for small static files.
+
+Keeps the encoded bytes of the most requested files in memory, bounded by a
+total size budget rather than an entry count, so hot images are served
+without a stat/open/read per request. Entries are immutable ``bytes``;
+callers hand out ``memoryview`` slices of them instead of copies.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class CachedFile(NamedTuple):
+    """A cached file body with the validators needed to answer requests"""
+    body: bytes
+    etag: str
+    last_modified: str
+    media_type: str
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values"""
+
+    def __init__(self, max_bytes: int, max_item_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: Total budget for cached bodies (0 disables the cache)
+            max_item_bytes: Largest single body admitted (default: an eighth of the budget)
+        """
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_bytes // 8
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def admits(self, size: int) -> bool:
+        """Whether a body of ``size`` bytes may be cached"""
+        return self.enabled and size <= self.max_item_bytes
+
+    def get(self, key: str) -> Optional[CachedFile]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CachedFile) -> None:
+        size = len(entry.body)
+        if not self.admits(size):
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.body)
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one entry, or everything when ``key`` is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry.body)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "max_item_bytes": self.max_item_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Shared cache for meme images, variants and sprite sheets
+image_cache = ByteLRUCache(int(float(os.getenv("IMAGE_CACHE_MB", "64")) * 1024 * 1024))
@@ -0,0 +1,257 @@
+"""
+HTTP caching helpers for static assets.
+
+``static_file_response`` serves a file with a strong ETag, Last-Modified and
+Cache-Control headers, answers conditional requests (If-None-Match /
+If-Modified-Since) with ``304 Not Modified`` and single byte ranges with
+``206 Partial Content``. Starlette's FileResponse in the pinned version does
+neither, so browsers and CDNs would otherwise refetch every image. Given a
+ByteLRUCache, hot files are answered from memory through memoryview
+slices instead of a stat/open/read per request. Routes that can key a file
+by its URL alone check the cache first and answer hits with
+``cached_file_response``, before any filesystem call.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from app.api.utils.byte_cache import ByteLRUCache, CachedFile
+
+# Content never changes for a given URL + ETag: cache for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_ETAG_CACHE_SIZE = 4096
+_etag_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a byte range that lies outside the file"""
+
+
+def content_etag(path: str) -> str:
+    """Return a strong ETag for a file's content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()}"'
+
+
+def file_etag(path: str, st: Optional[os.stat_result] = None) -> str:
+    """
+    Strong ETag for a file, hashed once per (path, size, mtime).
+
+    Used for files outside the image manifest, such as rendered variants.
+    """
+    st = st or os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+    etag = content_etag(path)
+    with _etag_lock:
+        _etag_cache[key] = etag
+        if len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+class MemoryViewResponse(Response):
+    """Response whose body is a memoryview over cached bytes, sent without copying"""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    return any(tag == etag or tag == f"W/{etag}" for tag in candidates)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[str] = None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range.
+
+    Returns:
+        Inclusive (start, end) offsets, or None to serve the whole file
+        (absent, multi-range or malformed header)
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the file
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, sep, end_text = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def static_file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: Optional[str] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    headers: Optional[Dict[str, str]] = None,
+    cache: Optional[ByteLRUCache] = None,
+    cache_key: Optional[str] = None,
+) -> Response:
+    """
+    Serve a file with validators, conditional GET and byte-range support.
+
+    Args:
+        request: Incoming request (conditional and Range headers are read from it)
+        path: File to serve
+        media_type: Content-Type of the file
+        etag: Precomputed strong ETag; hashed (and cached) when omitted
+        cache_control: Cache-Control header value
+        headers: Extra headers (e.g. Vary) added to every response
+        cache: Byte cache to serve hot files from memory
+        cache_key: Key of the file in ``cache`` (default: ``path``)
+
+    Returns:
+        200 full response, 206 partial content, 304 or 416 response
+    """
+    key = cache_key or path
+    cached = cache.get(key) if cache is not None and cache.enabled else None
+    if cached is not None and etag is not None and cached.etag != etag:
+        # The file changed since it was cached
+        cache.invalidate(key)
+        cached = None
+    if cached is not None:
+        return cached_file_response(request, cached, cache_control, headers)
+    return file_response(request, path, media_type, etag, cache_control, headers, cache, key)
+
+
+def cached_file_response(
+    request: Request,
+    cached: CachedFile,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serve a body from the byte cache without touching the filesystem.
+
+    Routes that can name a file without resolving it on disk look it up in
+    the cache themselves and answer hits with this.
+    """
+    return _respond(request, cached.body, len(cached.body), None, cached.media_type, cached.etag,
+                    cached.last_modified, cache_control, headers)
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: Optional[str] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+    headers: Optional[Dict[str, str]] = None,
+    cache: Optional[ByteLRUCache] = None,
+    cache_key: Optional[str] = None,
+) -> Response:
+    """
+    Serve a file from disk, adding it to ``cache`` under ``cache_key`` (default: ``path``).
+
+    For callers that already missed the cache; arguments as for ``static_file_response``.
+    """
+    st = os.stat(path)
+    etag = etag or file_etag(path, st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    if cache is not None and cache.admits(st.st_size):
+        with open(path, "rb") as f:
+            cached = CachedFile(f.read(), etag, last_modified, media_type)
+        cache.put(cache_key or path, cached)
+        return cached_file_response(request, cached, cache_control, headers)
+    return _respond(request, None, st.st_size, (path, st), media_type, etag, last_modified, cache_control, headers)
+
+
+def _respond(
+    request: Request,
+    body: Optional[bytes],
+    size: int,
+    source: Optional[Tuple[str, os.stat_result]],
+    media_type: str,
+    etag: str,
+    last_modified: str,
+    cache_control: str,
+    headers: Optional[Dict[str, str]],
+) -> Response:
+    """Answer from cached ``body`` or, when it is None, from the file in ``source``"""
+    common = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(headers or {}),
+    }
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=common)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**common, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            if body is not None:
+                content = memoryview(body)[start:end + 1]
+            else:
+                with open(source[0], "rb") as f:
+                    f.seek(start)
+                    content = f.read(end - start + 1)
+            return MemoryViewResponse(
+                content=content,
+                status_code=206,
+                media_type=media_type,
+                headers={**common, "Content-Range": f"bytes {start}-{end}/{size}"},
+            )
+
+    if body is not None:
+        return MemoryViewResponse(content=memoryview(body), media_type=media_type, headers=common)
+    return FileResponse(source[0], media_type=media_type, headers=common, stat_result=source[1])
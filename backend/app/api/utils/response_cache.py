@@ -0,0 +1,73 @@
+"""
+Pre-serialised responses for endpoints whose output never changes.
+
+Returning a dict from a route makes FastAPI rebuild it, walk it with
+``jsonable_encoder`` and ``json.dumps`` it on every request. For endpoints
+that always return the same data, ``cached_response`` calls the route once,
+serialises the result (with orjson when it is installed), and keeps the
+bytes and their ETag. Later requests get a raw ``Response`` with those
+bytes, or ``304 Not Modified`` when the client sends a matching
+If-None-Match.
+"""
+import inspect
+import functools
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+
+from app.api.utils.static_content import RenderedBody, dumps_json, json_response, render
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Fixed content, but it may change with a deploy: short max-age plus revalidation by ETag
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+
+def dumps(payload: Any) -> bytes:
+    """Serialise JSON to compact UTF-8 bytes, with orjson if available"""
+    if HAS_ORJSON:
+        return orjson.dumps(payload)
+    return dumps_json(payload)
+
+
+def cached_response(cache_control: str = STATIC_CACHE_CONTROL) -> Callable:
+    """
+    Decorator for a parameterless route whose result never changes.
+
+    Args:
+        cache_control: Cache-Control header sent with the response
+
+    Example::
+
+        @router.get("/breathing")
+        @cached_response()
+        async def breathing_exercises():
+            return {...}
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        if inspect.signature(endpoint).parameters:
+            raise TypeError(f"cached_response needs a parameterless endpoint, {endpoint.__name__} takes arguments")
+        rendered: Optional[RenderedBody] = None
+
+        @functools.wraps(endpoint)
+        async def wrapper(request: Request) -> Response:
+            nonlocal rendered
+            if rendered is None:
+                payload = endpoint()
+                if inspect.isawaitable(payload):
+                    payload = await payload
+                rendered = render(payload, dumps)
+            return json_response(request, rendered, cache_control)
+
+        # FastAPI reads the signature to inject the request
+        wrapper.__signature__ = inspect.Signature(
+            [inspect.Parameter("request", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Request)],
+            return_annotation=Response,
+        )
+        return wrapper
+
+    return decorator
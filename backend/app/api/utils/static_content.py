@@ -0,0 +1,216 @@
+"""
+Small JSON data files served from memory.
+
+The breathing exercise and affirmation routes used to open and parse their
+JSON file on every request, ``/random`` included. A ``StaticContent`` loads
+its file once and renders every response body up front: the whole list,
+each item on its own (for ``/random`` and lookups by id), and a strong ETag
+for each body. Requests are then answered with the prepared bytes, or with
+``304 Not Modified`` when the client already has them. The file mtime is
+re-checked at most every ``STATIC_CONTENT_CHECK_SECONDS``, and the content
+is rebuilt only when the file changed.
+
+``static_content`` is the registry of every file loaded this way; its stats
+are reported by the health check.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.api.utils.http_cache import is_not_modified
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+CHECK_SECONDS = float(os.getenv("STATIC_CONTENT_CHECK_SECONDS", "5"))
+
+# Lists may change when the file is edited: let clients keep them but revalidate
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# A random pick must not be reused by caches
+NO_STORE_CACHE_CONTROL = "no-store"
+
+
+class RenderedBody(NamedTuple):
+    """A response body serialised once, with its ETag"""
+    body: bytes
+    etag: str
+
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialise ``payload`` as FastAPI's JSONResponse does"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def render(payload: Any, dumps: Callable[[Any], bytes] = dumps_json) -> RenderedBody:
+    """
+    Serialise ``payload`` and compute its ETag.
+
+    Args:
+        payload: JSON-serialisable response content
+        dumps: Serialiser returning UTF-8 bytes
+    """
+    body = dumps(payload)
+    return RenderedBody(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+def json_response(request: Request, rendered: RenderedBody, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    """Answer with prepared JSON bytes, or 304 if the client's copy is current"""
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control}
+    if is_not_modified(request, rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
+
+
+class _Snapshot(NamedTuple):
+    """Everything rendered from one version of the file"""
+    items: Tuple[Any, ...]
+    all: RenderedBody
+    each: Tuple[RenderedBody, ...]
+    by_id: Dict[Any, RenderedBody]
+
+
+class StaticContent:
+    """A list read from a JSON file, with every response rendered in advance"""
+
+    def __init__(
+        self,
+        path: str,
+        key: str,
+        default: List[Any],
+        item_payload: Callable[[Any], Any] = lambda item: item,
+        id_field: Optional[str] = None,
+        check_seconds: float = CHECK_SECONDS,
+    ):
+        """
+        Args:
+            path: JSON file holding ``{key: [...]}``
+            key: Name of the list in the file, and in the list response
+            default: Items served while the file is missing or unreadable
+            item_payload: Builds the single-item response from an item
+            id_field: Item field to look items up by, if any
+            check_seconds: Minimum interval between mtime checks
+        """
+        self.path = path
+        self.key = key
+        self.default = default
+        self.item_payload = item_payload
+        self.id_field = id_field
+        self.check_seconds = check_seconds
+        self._mtime_ns: Optional[int] = None
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _load(self) -> List[Any]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get(self.key, self.default)
+        except FileNotFoundError:
+            return self.default
+        except Exception as e:
+            logger.error(f"Error loading {self.key} from {self.path}: {e}")
+            return self.default
+
+    def _build(self, items: List[Any]) -> _Snapshot:
+        each = tuple(render(self.item_payload(item)) for item in items)
+        by_id = {}
+        if self.id_field is not None:
+            skipped = 0
+            for item, rendered in zip(items, each):
+                try:
+                    by_id[item[self.id_field]] = rendered
+                except (KeyError, IndexError, TypeError):
+                    # Not an object, no id, or an unhashable id: still listed, just not addressable
+                    skipped += 1
+            if skipped:
+                logger.warning(f"{skipped} {self.key} in {self.path} have no usable {self.id_field!r}; they cannot be looked up by id")
+        return _Snapshot(tuple(items), render({self.key: items}), each, by_id)
+
+    def refresh(self, force: bool = False) -> _Snapshot:
+        """Rebuild if the file changed (checked at most every ``check_seconds``)"""
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and not force and now - self._checked_at < self.check_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and not force and now - self._checked_at < self.check_seconds:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if self._snapshot is None or mtime_ns != self._mtime_ns:
+                try:
+                    self._snapshot = self._build(self._load())
+                except Exception as e:
+                    # Keep serving the previous content (or the defaults) rather than failing every request
+                    logger.error(f"Error rendering {self.key} from {self.path}: {e}")
+                    if self._snapshot is None:
+                        self._snapshot = self._build(self.default)
+                else:
+                    logger.info(f"Loaded {len(self._snapshot.items)} {self.key} from {self.path if mtime_ns else 'defaults'}")
+                self._mtime_ns = mtime_ns
+                self.loads += 1
+            return self._snapshot
+
+    @property
+    def items(self) -> Tuple[Any, ...]:
+        return self.refresh().items
+
+    def all(self) -> RenderedBody:
+        """The ``{key: [...]}`` list response"""
+        return self.refresh().all
+
+    def random(self) -> Optional[RenderedBody]:
+        """A random single-item response, or None if there are no items"""
+        each = self.refresh().each
+        return random.choice(each) if each else None
+
+    def get(self, item_id: Any) -> Optional[RenderedBody]:
+        """The single-item response for ``item_id``, or None"""
+        return self.refresh().by_id.get(item_id)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "items": len(snapshot.items) if snapshot else 0,
+            "loads": self.loads,
+            "from_file": self._mtime_ns is not None,
+        }
+
+
+class StaticContentRegistry:
+    """Named StaticContent instances"""
+
+    def __init__(self):
+        self._contents: Dict[str, StaticContent] = {}
+
+    def register(self, name: str, *args, **kwargs) -> StaticContent:
+        content = StaticContent(*args, **kwargs)
+        self._contents[name] = content
+        return content
+
+    def get(self, name: str) -> StaticContent:
+        return self._contents[name]
+
+    def preload(self) -> None:
+        """Load every registered file now instead of on first request"""
+        for content in self._contents.values():
+            content.refresh(force=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: content.stats() for name, content in self._contents.items()}
+
+
+# Process-wide registry, filled by the routers that serve static content
+static_content = StaticContentRegistry()
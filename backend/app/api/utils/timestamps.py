@@ -0,0 +1,32 @@
+"""
+Timestamp convention for stored documents.
+
+Journal entries and notes store ``created_at`` / ``updated_at`` as naive
+UTC datetimes (``datetime.utcnow()``). Bounds received from clients may
+carry an offset; ``naive_utc`` turns them into the stored convention once,
+before they reach a query.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convert a datetime to naive UTC.
+
+    Args:
+        value: An aware datetime, or a naive one already in UTC
+
+    Returns:
+        The naive UTC datetime, or None
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_to_naive_utc(value: datetime) -> datetime:
+    """Convert a naive local-time datetime (as the JSON journal wrote) to naive UTC"""
+    if value.tzinfo is None:
+        value = value.astimezone()  # Interpreted as local time
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
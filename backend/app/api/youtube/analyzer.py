@@ -2,13 +2,37 @@ import os
 import time
 import logging
 import traceback
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import asyncio
 import json
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+def _map_nlp_result(nlp_result: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Convert local NLP results to the API's sentiment and toxicity format"""
+    sentiment = {
+        "positive": nlp_result["analysis"]["sentiment"]["positive_count"],
+        "neutral": nlp_result["analysis"]["sentiment"]["neutral_count"],
+        "negative": nlp_result["analysis"]["sentiment"]["negative_count"]
+    }
+    
+    # Fair dinkum! Make sure we properly map the toxicity data
+    toxic_types = nlp_result["analysis"]["toxicity"]["toxic_types"]
+    toxicity = {
+        "total": nlp_result["analysis"]["toxicity"]["toxic_count"],
+        "percentage": nlp_result["analysis"]["toxicity"]["toxic_percentage"],
+        "types": {
+            "Toxic": toxic_types["toxic"],
+            "Severe Toxic": toxic_types["severe_toxic"],
+            "Obscene": toxic_types["obscene"],
+            "Threat": toxic_types["threat"],
+            "Insult": toxic_types["insult"],
+            "Identity Hate": toxic_types["identity_hate"]
+        }
+    }
+    return sentiment, toxicity
+
 async def analyse_video_comments(video_id: str, limit: int = 100) -> Dict[str, Any]:
     """
     Analyse comments from a YouTube video and return insights.
@@ -70,25 +94,7 @@ async def analyse_video_comments(video_id: str, limit: int = 100) -> Dict[str, A
             if nlp_result:
                 # Map sentiment data using proper structure
                 # Good on ya, mate! Converting local NLP results to API format
-                response["sentiment"] = {
-                    "positive": nlp_result["analysis"]["sentiment"]["positive_count"],
-                    "neutral": nlp_result["analysis"]["sentiment"]["neutral_count"],
-                    "negative": nlp_result["analysis"]["sentiment"]["negative_count"]
-                }
-                
-                # Fair dinkum! Make sure we properly map the toxicity data
-                response["toxicity"] = {
-                    "total": nlp_result["analysis"]["toxicity"]["toxic_count"],
-                    "percentage": nlp_result["analysis"]["toxicity"]["toxic_percentage"],  # Crikey! We forgot this one before
-                    "types": {
-                        "Toxic": nlp_result["analysis"]["toxicity"]["toxic_types"]["toxic"],
-                        "Severe Toxic": nlp_result["analysis"]["toxicity"]["toxic_types"]["severe_toxic"],
-                        "Obscene": nlp_result["analysis"]["toxicity"]["toxic_types"]["obscene"],
-                        "Threat": nlp_result["analysis"]["toxicity"]["toxic_types"]["threat"],
-                        "Insult": nlp_result["analysis"]["toxicity"]["toxic_types"]["insult"],
-                        "Identity Hate": nlp_result["analysis"]["toxicity"]["toxic_types"]["identity_hate"]
-                    }
-                }
+                response["sentiment"], response["toxicity"] = _map_nlp_result(nlp_result)
                 logger.info("NLP analysis completed successfully")
                 
                 # Add debug info to help spot any dramas with the data structure
@@ -139,4 +145,75 @@ async def analyse_video_comments(video_id: str, limit: int = 100) -> Dict[str, A
         logger.error(f"Error in analyse_video_comments: {str(e)}")
         logger.error(traceback.format_exc())
         response["success"] = False
-        return response 
\ No newline at end of file
+        return response
+
+async def stream_video_comments_analysis(video_id: str, limit: int = 100) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analyse comments from a YouTube video, yielding results as they become available.
+    
+    Events are dictionaries with "event" and "data" keys, emitted in order:
+    "comments" (total count), "analysis" (sentiment and toxicity from the local
+    NLP model), then "strategy" and "example" events as the LLM streams them,
+    and finally "done" with the total duration.
+    
+    Args:
+        video_id: YouTube video ID to analyse
+        limit: Maximum number of comments to analyse
+    """
+    start_time = time.time()
+    
+    from .clients.youtube import YouTubeClient
+    comments = await YouTubeClient().get_video_comments(video_id, limit)
+    if not comments:
+        logger.warning("No comments fetched, using dummy comments for testing")
+        comments = [
+            "This video was so helpful, I learned a lot!",
+            "I don't agree with what you said about this topic.",
+            "You're completely wrong about this. You should do more research before making videos."
+        ]
+    yield {"event": "comments", "data": {"totalComments": len(comments)}}
+    
+    # Local NLP and the LLM stream are independent, so start the LLM first
+    from .llm_handler import stream_youtube_comments_analysis
+    from .nlp_handler import analyze_comments
+    nlp_task = asyncio.create_task(asyncio.to_thread(analyze_comments, comments))
+    llm_events = stream_youtube_comments_analysis(comments, limit).__aiter__()
+    next_llm = asyncio.ensure_future(llm_events.__anext__())
+    
+    # Emit whichever finishes first: the NLP analysis or the next LLM event
+    analysis_sent = False
+    try:
+        while next_llm is not None:
+            waiting = {next_llm} if analysis_sent else {next_llm, nlp_task}
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if not analysis_sent and nlp_task in done:
+                yield _nlp_event(nlp_task)
+                analysis_sent = True
+            if next_llm in done:
+                try:
+                    kind, item = next_llm.result()
+                except StopAsyncIteration:
+                    next_llm = None
+                    break
+                yield {"event": kind, "data": item}
+                next_llm = asyncio.ensure_future(llm_events.__anext__())
+        if not analysis_sent:
+            await asyncio.wait([nlp_task])
+            yield _nlp_event(nlp_task)
+    finally:
+        if next_llm is not None:
+            next_llm.cancel()
+        nlp_task.cancel()
+    
+    yield {"event": "done", "data": {"duration": time.time() - start_time}}
+
+def _nlp_event(nlp_task: "asyncio.Task") -> Dict[str, Any]:
+    """Build the "analysis" stream event from a finished NLP task"""
+    try:
+        nlp_result = nlp_task.result()
+        if nlp_result:
+            sentiment, toxicity = _map_nlp_result(nlp_result)
+            return {"event": "analysis", "data": {"sentiment": sentiment, "toxicity": toxicity}}
+    except Exception as e:
+        logger.error(f"NLP analysis failed: {str(e)}")
+    return {"event": "analysis", "data": None}
@@ -1,11 +1,11 @@
-import os
 import re
 import logging
-import googleapiclient.discovery
 from urllib.parse import urlparse, parse_qs
 from typing import List, Dict, Any, Optional
 
 from app.api.utils.logger import setup_logger
+from app.api.youtube.clients.pool import get_youtube_pool
+from app.api.youtube.clients.quota import QuotaExceededError
 
 # Setup logger
 logger = setup_logger('youtube_client')
@@ -15,16 +15,15 @@ class YouTubeClient:
     
     def __init__(self):
         """Initialize the YouTube client with API key from environment variables"""
-        self.api_key = os.getenv("YOUTUBE_API_KEY")
+        self.pool = get_youtube_pool()
+        self.api_key = self.pool.api_key
         self.youtube = None
         
         if not self.api_key:
             logger.warning("YOUTUBE_API_KEY environment variable not set")
         else:
-            # Initialize the YouTube API client
-            self.youtube = googleapiclient.discovery.build(
-                "youtube", "v3", developerKey=self.api_key
-            )
+            # Shared service built once per process (see clients/pool.py)
+            self.youtube = self.pool.service
     
     def extract_video_id(self, url: str) -> Optional[str]:
         """
@@ -82,13 +81,13 @@ class YouTubeClient:
             logger.info(f"Fetching up to {limit} comments for video ID: {video_id}")
             
             # Get first page of comments
-            response = self.youtube.commentThreads().list(
+            response = self.pool.execute(self.youtube.commentThreads().list(
                 part="snippet",
                 videoId=video_id,
                 maxResults=min(limit, 100),  # API limit is 100 per request
                 textFormat="plainText",
                 order="relevance"  # Get most relevant comments
-            ).execute()
+            ))
             
             # Extract comment data
             comments = []
@@ -109,13 +108,18 @@ class YouTubeClient:
                   "nextPageToken" in response and 
                   response["nextPageToken"]):
                 next_page_token = response["nextPageToken"]
-                response = self.youtube.commentThreads().list(
-                    part="snippet",
-                    videoId=video_id,
-                    maxResults=min(limit - len(comments), 100),
-                    pageToken=next_page_token,
-                    textFormat="plainText"
-                ).execute()
+                # Further pages are optional and deferred when quota runs low
+                try:
+                    response = self.pool.execute(self.youtube.commentThreads().list(
+                        part="snippet",
+                        videoId=video_id,
+                        maxResults=min(limit - len(comments), 100),
+                        pageToken=next_page_token,
+                        textFormat="plainText"
+                    ), optional=True)
+                except QuotaExceededError as e:
+                    logger.warning(f"Deferring remaining comment pages: {e}")
+                    break
                 
                 for item in response.get("items", []):
                     snippet = item["snippet"]["topLevelComment"]["snippet"]
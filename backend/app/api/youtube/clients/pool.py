@@ -0,0 +1,121 @@
+"""
+Process-wide YouTube Data API client.
+
+``googleapiclient.discovery.build`` parses the discovery document every
+time it is called, so the service object is built once per process from
+the static document bundled with the library. Resource objects are safe to
+share, but the underlying ``httplib2.Http`` is not, so every request is
+executed with a per-thread connection. All calls are charged against the
+shared QuotaAccountant before they are sent.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httplib2
+import googleapiclient.discovery
+from googleapiclient.errors import HttpError
+
+from app.api.utils.logger import setup_logger
+from .quota import QuotaAccountant
+
+# Setup logger
+logger = setup_logger('youtube_pool')
+
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "30"))
+
+
+class YouTubeServicePool:
+    """Shared YouTube service with per-thread HTTP connections and quota accounting"""
+
+    def __init__(self, api_key: Optional[str] = None, quota: Optional[QuotaAccountant] = None):
+        self.api_key = api_key if api_key is not None else os.getenv("YOUTUBE_API_KEY")
+        self.quota = quota or QuotaAccountant()
+        self._service = None
+        self._build_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def service(self):
+        """The shared service object, built on first use (None without an API key)"""
+        if self._service is None and self.api_key:
+            with self._build_lock:
+                if self._service is None:
+                    self._service = googleapiclient.discovery.build(
+                        "youtube",
+                        "v3",
+                        developerKey=self.api_key,
+                        static_discovery=True,
+                        cache_discovery=False,
+                    )
+                    logger.info("YouTube service built from static discovery document")
+        return self._service
+
+    def warm(self) -> bool:
+        """Build the service ahead of the first request; returns False without an API key"""
+        if not self.api_key:
+            logger.warning("YOUTUBE_API_KEY environment variable not set")
+            return False
+        return self.service is not None
+
+    def _http(self) -> httplib2.Http:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(timeout=YOUTUBE_TIMEOUT)
+            self._local.http = http
+        return http
+
+    def execute(self, request, optional: bool = False) -> Dict[str, Any]:
+        """
+        Execute an API request on this thread's connection.
+
+        Args:
+            request: HttpRequest built from ``service``
+            optional: True for calls that may be deferred to protect the reserve
+
+        Returns:
+            The decoded API response
+
+        Raises:
+            QuotaExceededError: If the call cannot be afforded today
+        """
+        method = getattr(request, "methodId", "") or ""
+        self.quota.spend(method, optional=optional)
+        try:
+            return request.execute(http=self._http())
+        except HttpError as e:
+            if e.resp.status == 403 and b"quotaExceeded" in (e.content or b""):
+                logger.error("YouTube API reported quotaExceeded; deferring calls until reset")
+                self.quota.exhaust()
+            raise
+        except (httplib2.HttpLib2Error, OSError):
+            # The request never completed; drop this thread's connection
+            self._local.http = None
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return pool and quota state for health reporting"""
+        return {
+            "configured": self.configured,
+            "service_built": self._service is not None,
+            "quota": self.quota.snapshot(),
+        }
+
+
+_pool: Optional[YouTubeServicePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_youtube_pool() -> YouTubeServicePool:
+    """Return the process-wide YouTube service pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = YouTubeServicePool()
+    return _pool
+
@@ -0,0 +1,151 @@
+"""
+YouTube Data API quota accounting.
+
+The Data API grants a fixed number of units per day (10,000 by default),
+reset at midnight Pacific time. Every call costs a known number of units,
+so the accountant tracks what has been spent and decides before a call is
+made whether it can be afforded. Follow-up pages are optional work: they are
+deferred once the remaining budget drops into a reserve kept for the first
+page of new analyses.
+"""
+import os
+import datetime
+import threading
+from typing import Dict, Any
+
+import pytz
+
+from app.api.utils.logger import setup_logger
+
+# Setup logger
+logger = setup_logger('youtube_quota')
+
+QUOTA_TIMEZONE = pytz.timezone("America/Los_Angeles")
+
+# Unit cost per API method (https://developers.google.com/youtube/v3/determine_quota_cost)
+METHOD_COSTS: Dict[str, int] = {
+    "youtube.commentThreads.list": 1,
+    "youtube.comments.list": 1,
+    "youtube.videos.list": 1,
+    "youtube.channels.list": 1,
+    "youtube.search.list": 100,
+}
+DEFAULT_METHOD_COST = 1
+
+
+class QuotaExceededError(Exception):
+    """Raised when a call cannot be afforded from today's remaining quota"""
+
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(f"YouTube quota exhausted for {method}; resets in {int(retry_after)}s")
+        self.method = method
+        self.retry_after = retry_after
+
+
+class QuotaAccountant:
+    """Thread-safe daily quota ledger for the YouTube Data API"""
+
+    def __init__(self, daily_limit: int = None, reserve: int = None):
+        """
+        Args:
+            daily_limit: Units available per day (YOUTUBE_DAILY_QUOTA, default 10000)
+            reserve: Units kept back for required calls (YOUTUBE_QUOTA_RESERVE, default 5% of the limit)
+        """
+        self.daily_limit = daily_limit or int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+        self.reserve = reserve if reserve is not None else int(
+            os.getenv("YOUTUBE_QUOTA_RESERVE", str(self.daily_limit // 20))
+        )
+        self._lock = threading.Lock()
+        self._day = self._today()
+        self._spent = 0
+        self._calls: Dict[str, int] = {}
+        self._deferred = 0
+        self._rejected = 0
+
+    @staticmethod
+    def _today() -> datetime.date:
+        return datetime.datetime.now(QUOTA_TIMEZONE).date()
+
+    def _roll_day(self) -> None:
+        # Caller holds self._lock
+        today = self._today()
+        if today != self._day:
+            logger.info(f"YouTube quota reset: spent {self._spent} units on {self._day}")
+            self._day = today
+            self._spent = 0
+            self._calls = {}
+            self._deferred = 0
+            self._rejected = 0
+
+    @staticmethod
+    def cost(method: str) -> int:
+        """Return the unit cost of an API method id such as ``youtube.commentThreads.list``"""
+        return METHOD_COSTS.get(method, DEFAULT_METHOD_COST)
+
+    def try_spend(self, method: str, optional: bool = False) -> bool:
+        """
+        Charge a call against today's quota if it can be afforded.
+
+        Args:
+            method: API method id
+            optional: True for work that can be skipped (e.g. further pages);
+                optional calls may not dip into the reserve
+
+        Returns:
+            True if the units were charged and the call may proceed
+        """
+        units = self.cost(method)
+        with self._lock:
+            self._roll_day()
+            limit = self.daily_limit - (self.reserve if optional else 0)
+            if self._spent + units > limit:
+                if optional:
+                    self._deferred += 1
+                else:
+                    self._rejected += 1
+                return False
+            self._spent += units
+            self._calls[method] = self._calls.get(method, 0) + 1
+            return True
+
+    def spend(self, method: str, optional: bool = False) -> None:
+        """Charge a call or raise QuotaExceededError"""
+        if not self.try_spend(method, optional=optional):
+            raise QuotaExceededError(method, self.seconds_until_reset())
+
+    def exhaust(self) -> None:
+        """Mark today's quota as used up (the API reported quotaExceeded)"""
+        with self._lock:
+            self._roll_day()
+            self._spent = self.daily_limit
+
+    @property
+    def remaining(self) -> int:
+        """Units left today"""
+        with self._lock:
+            self._roll_day()
+            return max(0, self.daily_limit - self._spent)
+
+    def seconds_until_reset(self) -> float:
+        """Seconds until the quota resets at midnight Pacific time"""
+        now = datetime.datetime.now(QUOTA_TIMEZONE)
+        tomorrow = QUOTA_TIMEZONE.localize(
+            datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+        )
+        return max(0.0, (tomorrow - now).total_seconds())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the ledger as a JSON-serialisable dictionary"""
+        with self._lock:
+            self._roll_day()
+            return {
+                "day": self._day.isoformat(),
+                "daily_limit": self.daily_limit,
+                "reserve": self.reserve,
+                "spent": self._spent,
+                "remaining": max(0, self.daily_limit - self._spent),
+                "calls": dict(self._calls),
+                "deferred_calls": self._deferred,
+                "rejected_calls": self._rejected,
+                "resets_in_seconds": int(self.seconds_until_reset()),
+            }
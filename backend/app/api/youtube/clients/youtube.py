@@ -1,29 +1,28 @@
 """Client for interacting with the YouTube API to fetch video comments."""
-import os
 import logging
 import asyncio
 from typing import List, Optional
-import googleapiclient.discovery
 from googleapiclient.errors import HttpError
 
+from .pool import get_youtube_pool
+from .quota import QuotaExceededError
+
 # Configure logger
 logger = logging.getLogger(__name__)
 
 class YouTubeClient:
     """Initialize the YouTube client with API key from environment variables"""
     def __init__(self):
-        self.api_key = os.getenv("YOUTUBE_API_KEY")
+        self.pool = get_youtube_pool()
+        self.api_key = self.pool.api_key
         self.youtube = None
         
         if not self.api_key:
             logger.warning("YOUTUBE_API_KEY environment variable not set")
             return
             
-        # Initialize the YouTube API client
-        self.youtube = googleapiclient.discovery.build(
-            "youtube", "v3", developerKey=self.api_key
-        )
-        logger.info("YouTube client initialized successfully")
+        # Shared service built once per process (see clients/pool.py)
+        self.youtube = self.pool.service
     
     async def get_video_comments(self, video_id: str, max_comments: int = 100) -> List[str]:
         """
@@ -46,17 +45,21 @@ class YouTubeClient:
             
             while len(comments) < max_comments:
                 # Request comments from YouTube API using asyncio.to_thread
-                resp = await asyncio.to_thread(
-                    lambda: self.youtube.commentThreads()
-                    .list(
-                        part="snippet",
-                        videoId=video_id,
-                        textFormat="plainText",
-                        maxResults=min(100, max_comments - len(comments)),
-                        pageToken=next_page,
-                    )
-                    .execute()
+                request = self.youtube.commentThreads().list(
+                    part="snippet",
+                    videoId=video_id,
+                    textFormat="plainText",
+                    maxResults=min(100, max_comments - len(comments)),
+                    pageToken=next_page,
                 )
+                # Further pages are optional and deferred when quota runs low
+                try:
+                    resp = await asyncio.to_thread(self.pool.execute, request, next_page is not None)
+                except QuotaExceededError as e:
+                    if not comments:
+                        raise
+                    logger.warning(f"Deferring remaining comment pages: {e}")
+                    break
                 
                 # Extract comment text
                 for item in resp.get("items", []):
@@ -71,6 +74,9 @@ class YouTubeClient:
             logger.info(f"Successfully fetched {len(comments)} comments for video {video_id}")
             return comments
             
+        except QuotaExceededError as e:
+            logger.error(str(e))
+            return []
         except HttpError as e:
             logger.error(f"YouTube API error: {e}")
             return []
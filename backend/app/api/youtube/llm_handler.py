@@ -2,7 +2,8 @@
 import os
 import sys
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+import asyncio
 import time
 import json
 import re
@@ -12,36 +13,34 @@ proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.p
 if proj_root not in sys.path:
     sys.path.insert(0, proj_root)
 
-import requests
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv(os.path.join(proj_root, '.env'))
 
+from app.api.openrouter.async_client import get_openrouter_client, extract_content
+from app.api.openrouter.circuit_breaker import OPEN
+from app.api.openrouter.batching import BatchItems, complete_in_batches, pack_comments, parse_batch_response
+from app.api.openrouter.streaming import JsonObjectStreamParser, LineStreamParser
+
 # Setup logging
 LOGLEVEL = os.getenv('LOGLEVEL', 'INFO').upper()
 logging.basicConfig(level=LOGLEVEL)
 logger = logging.getLogger(__name__)
 
 # API Configuration
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
 API_KEY = os.getenv('OPENROUTER_API_KEY')
 MODEL_NAME = os.getenv('OPENROUTER_MODEL', 'deepseek/deepseek-prover-v2:free')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '300'))
 
 # Log API configuration
 logger.info(f"OpenRouter API key configured: {bool(API_KEY)}")
 logger.info(f"Using model: {MODEL_NAME}")
 
-# Create a session for better performance
-_session = requests.Session()
+# Shared async client (pooled connections, concurrency limits and retries)
+_client = get_openrouter_client()
 if API_KEY:
-    _session.headers.update({
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-        # "HTTP-Referer": "https://mindful-creator.vercel.app/",  # Required by OpenRouter
-        # "X-Title": "Mindful Creator"  # Optional for OpenRouter analytics
-    })
-    logger.info("OpenRouter session configured successfully")
+    logger.info("OpenRouter client configured successfully")
 else:
     logger.error("OpenRouter API key not found in environment variables")
 
@@ -65,6 +64,16 @@ async def analyse_youtube_comments(comments: List[str], limit: int = 100) -> Dic
             "example_comments": generate_fallback_examples([])
         }
     
+    if _client.breaker.state == OPEN:
+        # Provider is failing: serve local fallbacks now rather than waiting on timeouts
+        logger.warning(f"LLM circuit open, serving fallback analysis for {len(comments)} comments")
+        return {
+            "sentiment": {"Positive": 0, "Neutral": len(comments), "Negative": 0},
+            "toxicity": {"toxic": 0, "severe_toxic": 0, "obscene": 0, "threat": 0, "insult": 0, "identity_hate": 0},
+            "strategies": generate_fallback_strategies(comments),
+            "example_comments": generate_fallback_examples(comments)
+        }
+    
     logger.info(f"Analyzing {len(comments)} YouTube comments with LLM")
     
     # 1. First analyze sentiment if we have an API key
@@ -154,19 +163,16 @@ DO NOT add any explanation, introductory text, or other formatting.
     """
     
     try:
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
+        data = await _client.chat(
+            [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ],
-            "response_format": {"type": "json_object"},
-            "max_tokens": 500
-        }
-        
-        resp = _session.post(url=API_URL, data=json.dumps(payload), timeout=300)
-        resp.raise_for_status()
-        data = resp.json()
+            model=MODEL_NAME,
+            response_format={"type": "json_object"},
+            max_tokens=500,
+            timeout=LLM_TIMEOUT
+        )
         
         # Check response structure
         if 'choices' not in data:
@@ -293,18 +299,15 @@ ONLY return the raw comment text, exactly as provided in the input.
     ONLY present the exact comment text, one comment per line, with no additional text or formatting."""
     
     try:
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
+        data = await _client.chat(
+            [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ],
-            "max_tokens": 1000
-        }
-        
-        resp = _session.post(url=API_URL, data=json.dumps(payload), timeout=300)
-        resp.raise_for_status()
-        data = resp.json()
+            model=MODEL_NAME,
+            max_tokens=1000,
+            timeout=LLM_TIMEOUT
+        )
         
         # Log the API original response for debugging
         logger.debug(f"OpenRouter API original response: {data}")
@@ -377,24 +380,22 @@ ONLY return the raw comment text, exactly as provided in the input.
         logger.error(f"Error identifying critical comments: {e}")
         return comments[:min(max_comments, len(comments))]
 
-async def generate_response_strategies(critical_comments: List[str]) -> str:
-    """
-    Generate response strategies for YouTube comments based on the most critical comments.
+STRATEGY_SYSTEM_MESSAGE = """You are an expert in online community management and content creation.
     
-    Args:
-        critical_comments: List of the most critical comments to address
-        
-    Returns:
-        String with response strategies in plain text
-    """
-    if not API_KEY:
-        logger.error("Cannot generate response strategies: API key missing")
-        return "API key is missing, cannot generate response strategies."
+    Your task is to help content creators respond effectively to comments.
     
-    if not critical_comments:
-        logger.warning("No critical comments provided to generate strategies")
-        return generate_fallback_strategies([])
+    Format your response as plain text strategies with no bullet points or special characters.
+    Each strategy should have a clear title followed by a brief explanation.
+    For example:
+    Acknowledge Positive Feedback: Thank viewers for their kind words and show appreciation for their support.
+    Address Specific Points: Respond to individual comments that mention specific aspects of your content.
     
+    DO NOT include any introduction, conclusion, bullet points, or special formatting.
+    DO NOT use asterisks, dashes, or any list markers.
+    ONLY provide the strategies as plain text, one per paragraph."""
+
+def _strategy_messages(critical_comments: List[str]) -> List[Dict[str, str]]:
+    """Build the chat messages asking for response strategies"""
     # Format comments for prompt
     comments_text = "\n".join([f"- {comment}" for comment in critical_comments])
     
@@ -409,51 +410,56 @@ Do NOT use bullet points, asterisks, dashes or any other list markers.
 Focus on professional, positive, and constructive ways to engage with the comments.
 Return ONLY the strategies with no introduction or conclusion.
 """
+    return [
+        {"role": "system", "content": STRATEGY_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+def _clean_strategies(content: str) -> str:
+    """Remove bullet points and list numbering from strategy text"""
+    # Remove any bullet points or list markers
+    cleaned_content = re.sub(r'^\s*[-•*]\s*', '', content, flags=re.MULTILINE)
     
-    system_message = """You are an expert in online community management and content creation.
+    # Remove numbers at the beginning of lines
+    cleaned_content = re.sub(r'^\s*\d+\.\s*', '', cleaned_content, flags=re.MULTILINE)
     
-    Your task is to help content creators respond effectively to comments.
+    return cleaned_content.strip()
+
+async def generate_response_strategies(critical_comments: List[str]) -> str:
+    """
+    Generate response strategies for YouTube comments based on the most critical comments.
     
-    Format your response as plain text strategies with no bullet points or special characters.
-    Each strategy should have a clear title followed by a brief explanation.
-    For example:
-    Acknowledge Positive Feedback: Thank viewers for their kind words and show appreciation for their support.
-    Address Specific Points: Respond to individual comments that mention specific aspects of your content.
+    Args:
+        critical_comments: List of the most critical comments to address
+        
+    Returns:
+        String with response strategies in plain text
+    """
+    if not API_KEY:
+        logger.error("Cannot generate response strategies: API key missing")
+        return "API key is missing, cannot generate response strategies."
     
-    DO NOT include any introduction, conclusion, bullet points, or special formatting.
-    DO NOT use asterisks, dashes, or any list markers.
-    ONLY provide the strategies as plain text, one per paragraph."""
+    if not critical_comments:
+        logger.warning("No critical comments provided to generate strategies")
+        return generate_fallback_strategies([])
     
     try:
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 800
-        }
-        
-        resp = _session.post(url=API_URL, data=json.dumps(payload), timeout=300)
-        resp.raise_for_status()
-        data = resp.json()
+        data = await _client.chat(
+            _strategy_messages(critical_comments),
+            model=MODEL_NAME,
+            max_tokens=800,
+            timeout=LLM_TIMEOUT
+        )
         
         # Check if we have a valid response
-        if 'choices' in data and data['choices'] and 'message' in data['choices'][0]:
-            content = data['choices'][0]['message'].get('content', '')
-            if content:
-                # Clean up the response to remove any bullet points or formatting
-                cleaned_content = content
-                
-                # Remove any bullet points or list markers
-                cleaned_content = re.sub(r'^\s*[-•*]\s*', '', cleaned_content, flags=re.MULTILINE)
-                
-                # Remove numbers at the beginning of lines
-                cleaned_content = re.sub(r'^\s*\d+\.\s*', '', cleaned_content, flags=re.MULTILINE)
-                
-                # If we have valid content after cleaning, return it
-                if cleaned_content.strip():
-                    return cleaned_content.strip()
+        content = extract_content(data)
+        if content:
+            # Clean up the response to remove any bullet points or formatting
+            cleaned_content = _clean_strategies(content)
+            
+            # If we have valid content after cleaning, return it
+            if cleaned_content:
+                return cleaned_content
         
         # If we couldn't parse a valid response, use fallback
         logger.warning("Failed to generate valid response strategies from LLM, using fallback")
@@ -463,10 +469,29 @@ Return ONLY the strategies with no introduction or conclusion.
         logger.error(f"Error generating response strategies: {e}")
         return generate_fallback_strategies(critical_comments)
 
+EXAMPLE_SYSTEM_MESSAGE = """You are an expert community manager for a professional content creator.
+            
+            Your task is to craft thoughtful, professional responses to YouTube comments that will:
+            - Acknowledge the viewer's feedback
+            - Address their concerns constructively
+            - Maintain a positive brand image
+            - Encourage continued engagement
+            
+            Return your response as a JSON object containing both the original comment and your proposed response."""
+
+EXAMPLE_GUIDELINES = """1. Be genuinely helpful and courteous
+2. Address the specific concerns raised
+3. Be conversational but professional
+4. Avoid being defensive
+5. Be 2-4 sentences maximum"""
+
 async def generate_example_responses(critical_comments: List[str]) -> List[Dict[str, str]]:
     """
     Generate example responses to critical YouTube comments.
     
+    All comments are answered by a single batched request; comments the
+    batch fails to cover are retried individually.
+    
     Args:
         critical_comments: List of critical comments to respond to
         
@@ -481,21 +506,70 @@ async def generate_example_responses(critical_comments: List[str]) -> List[Dict[
         logger.warning("No critical comments provided to generate responses")
         return generate_fallback_examples([])
     
-    # Create prompt for response examples
-    examples = []
-    for comment in critical_comments[:3]:  # Limit to 3 to avoid too large requests
-        try:
-            # Individual prompt for each comment to keep responses focused
-            prompt = f"""As a YouTube content creator, draft a thoughtful, professional response to this comment:
+    selected = critical_comments[:3]  # Limit to 3 to avoid too large requests
+    try:
+        responses = await complete_in_batches(selected, _request_example_batch, _generate_single_example)
+    except Exception as e:
+        logger.error(f"Error generating example responses: {e}")
+        responses = []
+    
+    examples = [
+        {"comment": comment, "response": response}
+        for comment, response in zip(selected, responses)
+        if response
+    ]
+    
+    # If we got at least one valid example, return them
+    if examples:
+        return examples
+    
+    # Otherwise, use fallback examples
+    logger.warning("Failed to generate any valid examples, using fallback")
+    return generate_fallback_examples(critical_comments)
+
+def _example_batch_messages(items: BatchItems) -> List[Dict[str, str]]:
+    """Build the chat messages asking for example responses to several comments"""
+    prompt = f"""As a YouTube content creator, draft a thoughtful, professional response to each of these comments:
+
+{pack_comments(items)}
+
+Each response should:
+{EXAMPLE_GUIDELINES}
+
+Format your answer as a JSON object with this structure, one entry per comment id:
+{{
+  "responses": [
+    {{"id": COMMENT_ID, "response": "YOUR SUGGESTED RESPONSE"}}
+  ]
+}}
+
+Return ONLY the JSON object with no other text."""
+    return [
+        {"role": "system", "content": EXAMPLE_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+async def _request_example_batch(items: BatchItems) -> Optional[str]:
+    """Request example responses for several comments in one JSON-mode call"""
+    data = await _client.chat(
+        _example_batch_messages(items),
+        model=MODEL_NAME,
+        response_format={"type": "json_object"},
+        max_tokens=500 * len(items),
+        timeout=LLM_TIMEOUT
+    )
+    return extract_content(data)
+
+async def _generate_single_example(comment: str) -> Optional[str]:
+    """Request an example response for one comment (fallback for failed batches)"""
+    try:
+        # Individual prompt to keep the response focused
+        prompt = f"""As a YouTube content creator, draft a thoughtful, professional response to this comment:
 
 "{comment}"
 
 Your response should:
-1. Be genuinely helpful and courteous
-2. Address the specific concerns raised
-3. Be conversational but professional
-4. Avoid being defensive
-5. Be 2-4 sentences maximum
+{EXAMPLE_GUIDELINES}
 
 Format your response as a JSON object with this structure:
 {{
@@ -504,69 +578,189 @@ Format your response as a JSON object with this structure:
 }}
 
 Return ONLY the JSON object with no other text."""
+        
+        data = await _client.chat(
+            [
+                {"role": "system", "content": EXAMPLE_SYSTEM_MESSAGE},
+                {"role": "user", "content": prompt}
+            ],
+            model=MODEL_NAME,
+            response_format={"type": "json_object"},
+            max_tokens=500,
+            timeout=LLM_TIMEOUT
+        )
+        
+        content = extract_content(data)
+        if not content:
+            return None
+        try:
+            # Parse JSON response
+            response_data = json.loads(content)
             
-            system_message = """You are an expert community manager for a professional content creator.
-            
-            Your task is to craft thoughtful, professional responses to YouTube comments that will:
-            - Acknowledge the viewer's feedback
-            - Address their concerns constructively
-            - Maintain a positive brand image
-            - Encourage continued engagement
-            
-            Return your response as a JSON object containing both the original comment and your proposed response."""
-            
-            payload = {
-                "model": MODEL_NAME,
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                "response_format": {"type": "json_object"},
-                "max_tokens": 500
-            }
-            
-            resp = _session.post(url=API_URL, data=json.dumps(payload), timeout=300)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            # Process response
-            if 'choices' in data and data['choices'] and 'message' in data['choices'][0]:
-                content = data['choices'][0]['message'].get('content', '')
-                if content:
-                    try:
-                        # Parse JSON response
-                        response_data = json.loads(content)
-                        
-                        # Validate the returned object has the correct structure
-                        if 'comment' in response_data and 'response' in response_data:
-                            # Ensure the original comment is preserved
-                            response_data['comment'] = comment
-                            examples.append(response_data)
-                        else:
-                            logger.warning(f"Invalid JSON structure in response: {response_data}")
-                    except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse JSON from response: {content}")
-                        # Attempt to extract response from non-JSON content
-                        if "Response:" in content:
-                            try:
-                                response_part = content.split("Response:", 1)[1].strip()
-                                examples.append({
-                                    "comment": comment,
-                                    "response": response_part
-                                })
-                            except:
-                                logger.warning("Failed to extract response from non-JSON content")
-            
+            # Validate the returned object has the correct structure
+            if isinstance(response_data, dict) and response_data.get('response'):
+                return response_data['response']
+            logger.warning(f"Invalid JSON structure in response: {response_data}")
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse JSON from response: {content}")
+            # Attempt to extract response from non-JSON content
+            if "Response:" in content:
+                return content.split("Response:", 1)[1].strip() or None
+    except Exception as e:
+        logger.error(f"Error generating response for comment '{comment[:30]}...': {e}")
+    return None
+
+async def stream_response_strategies(critical_comments: List[str]) -> AsyncIterator[str]:
+    """
+    Stream response strategies, yielding each one as soon as its line completes.
+    
+    Falls back to the predefined strategies if the stream fails before
+    producing anything.
+    
+    Args:
+        critical_comments: List of the most critical comments to address
+        
+    Yields:
+        Individual strategy strings ("Title: explanation")
+    """
+    emitted = 0
+    if API_KEY and critical_comments:
+        parser = LineStreamParser()
+        try:
+            async for delta in _client.stream_chat(
+                _strategy_messages(critical_comments),
+                model=MODEL_NAME,
+                max_tokens=800,
+                timeout=LLM_TIMEOUT
+            ):
+                for line in parser.feed(delta):
+                    strategy = _clean_strategies(line)
+                    if strategy:
+                        emitted += 1
+                        yield strategy
+            for line in parser.close():
+                strategy = _clean_strategies(line)
+                if strategy:
+                    emitted += 1
+                    yield strategy
         except Exception as e:
-            logger.error(f"Error generating response for comment '{comment[:30]}...': {e}")
+            logger.error(f"Error streaming response strategies: {e}")
     
-    # If we got at least one valid example, return them
-    if examples:
-        return examples
+    if not emitted:
+        logger.warning("No streamed strategies received, using fallback")
+        for strategy in generate_fallback_strategies(critical_comments).split("\n\n"):
+            yield strategy.strip()
+
+async def stream_example_responses(critical_comments: List[str]) -> AsyncIterator[Dict[str, str]]:
+    """
+    Stream example responses, yielding each one as soon as its JSON object completes.
     
-    # Otherwise, use fallback examples
-    logger.warning("Failed to generate any valid examples, using fallback")
-    return generate_fallback_examples(critical_comments)
+    Comments the stream does not cover are answered with non-streamed
+    requests afterwards; the predefined examples are used if nothing succeeds.
+    
+    Args:
+        critical_comments: List of critical comments to respond to
+        
+    Yields:
+        Dictionaries with 'comment' and 'response' keys
+    """
+    selected = critical_comments[:3]  # Limit to 3 to avoid too large requests
+    items = [(i + 1, comment) for i, comment in enumerate(selected)]
+    answered = set()
+    emitted = 0
+    
+    if API_KEY and items:
+        parser = JsonObjectStreamParser()
+        try:
+            async for delta in _client.stream_chat(
+                _example_batch_messages(items),
+                model=MODEL_NAME,
+                response_format={"type": "json_object"},
+                max_tokens=500 * len(items),
+                timeout=LLM_TIMEOUT
+            ):
+                for entry in parser.feed(delta):
+                    valid = parse_batch_response(json.dumps([entry]), [item_id for item_id, _ in items if item_id not in answered])
+                    for item_id, response in valid.items():
+                        answered.add(item_id)
+                        emitted += 1
+                        yield {"comment": selected[item_id - 1], "response": response}
+        except Exception as e:
+            logger.error(f"Error streaming example responses: {e}")
+        
+        missing = [comment for item_id, comment in items if item_id not in answered]
+        if missing:
+            logger.info(f"Stream covered {len(answered)}/{len(items)} comments, requesting the rest")
+            try:
+                responses = await complete_in_batches(missing, _request_example_batch, _generate_single_example)
+            except Exception as e:
+                logger.error(f"Error generating remaining example responses: {e}")
+                responses = []
+            for comment, response in zip(missing, responses):
+                if response:
+                    emitted += 1
+                    yield {"comment": comment, "response": response}
+    
+    if not emitted:
+        logger.warning("Failed to generate any valid examples, using fallback")
+        for example in generate_fallback_examples(critical_comments):
+            yield example
+
+async def stream_youtube_comments_analysis(comments: List[str], limit: int = 100) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream strategies and example responses for YouTube comments.
+    
+    The two LLM streams run concurrently and their results are interleaved
+    in the order they complete.
+    
+    Args:
+        comments: List of YouTube comment strings
+        limit: Maximum number of comments to analyze
+        
+    Yields:
+        ("strategy", str) and ("example", dict) tuples
+    """
+    if _client.breaker.state == OPEN or not comments:
+        logger.warning("LLM unavailable or no comments, streaming fallback analysis")
+        for strategy in generate_fallback_strategies(comments).split("\n\n"):
+            yield "strategy", strategy.strip()
+        for example in generate_fallback_examples(comments):
+            yield "example", example
+        return
+    
+    filtered_comments = comments
+    if len(comments) > limit:
+        try:
+            critical_comments = await identify_critical_comments(comments, max_comments=limit)
+            filtered_comments = critical_comments or comments[:limit]
+        except Exception as e:
+            logger.error(f"Error identifying critical comments: {e}")
+            filtered_comments = comments[:limit]
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def pump(kind: str, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                await queue.put((kind, item))
+        finally:
+            await queue.put(None)
+    
+    producers = [
+        asyncio.create_task(pump("strategy", stream_response_strategies(filtered_comments))),
+        asyncio.create_task(pump("example", stream_example_responses(filtered_comments)))
+    ]
+    try:
+        remaining = len(producers)
+        while remaining:
+            event = await queue.get()
+            if event is None:
+                remaining -= 1
+                continue
+            yield event
+    finally:
+        for task in producers:
+            task.cancel()
 
 # Fallback function returning plain text without formatting
 def generate_fallback_strategies(comments: List[str]) -> str:
@@ -1,11 +1,13 @@
 # app/api/youtube/routes.py
 from fastapi import APIRouter, HTTPException, Request
-from typing import List, Dict, Any, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, AsyncIterator
 from pydantic import BaseModel, Field, validator
 import logging
 import time
+import json
 
-from .analyzer import analyse_video_comments
+from .analyzer import analyse_video_comments, stream_video_comments_analysis
 from .utils import extract_video_id
 
 # Configure logger
@@ -90,6 +92,41 @@ async def analyse_full(request: Request, payload: YouTubeRequest) -> Dict[str, A
             "message": f"Error processing request: {str(e)}"
         }
 
+@router.post(
+    "/analyse_stream",
+    summary="Streams YouTube comment analysis as newline-delimited JSON"
+)
+async def analyse_stream(request: Request, payload: YouTubeRequest):
+    """
+    Streaming variant of /analyse_full.
+    
+    Returns application/x-ndjson where each line is an event object
+    ({"event": ..., "data": ...}): "comments", "analysis", then "strategy"
+    and "example" events as the LLM produces them, and finally "done".
+    Errors are reported as an "error" event.
+    """
+    url = payload.url or payload.youtube_url
+    video_id = extract_video_id(url) if url else ""
+    
+    async def events() -> AsyncIterator[bytes]:
+        if not video_id:
+            yield (json.dumps({"event": "error", "data": {"message": "Invalid YouTube URL"}}) + "\n").encode()
+            return
+        logger.info(f"Streaming analysis for video ID: {video_id}, limit: {payload.limit}")
+        try:
+            async for event in stream_video_comments_analysis(video_id, payload.limit):
+                yield (json.dumps(event) + "\n").encode()
+        except Exception as e:
+            logger.error(f"Error in analyse_stream endpoint: {e}")
+            yield (json.dumps({"event": "error", "data": {"message": f"Error processing request: {str(e)}"}}) + "\n").encode()
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/analyse")
 async def analyse_basic(request: Request, payload: YouTubeRequest):
     """
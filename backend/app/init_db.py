@@ -1,5 +1,6 @@
 from app.database import SessionLocal, create_tables, engine
 from app.models.rating import Rating
+from app.api.rating_stats import record_rating
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import inspect
 
@@ -41,7 +42,7 @@ def init_ratings():
         ]
         
         for rating in initial_ratings:
-            db.add(rating)
+            record_rating(db, rating.activity_key, rating.rating)
             db.commit()
             print(f"Added rating for {rating.activity_key}: {rating.rating}")
     except Exception as e:
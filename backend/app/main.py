@@ -298,6 +298,135 @@ async def load_nlp_model():
         logger.critical(f"❌ Failed to load NLP model: {exc}", exc_info=True)
         # Depending on ALLOW_DB_FAILURE or a new specific flag, you might raise here or allow continuation
 
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Release the pooled OpenRouter connections on shutdown."""
+    try:
+        from app.api.openrouter.async_client import close_openrouter_client
+        await close_openrouter_client()
+        logger.info("OpenRouter connection pool closed.")
+    except Exception as exc:
+        logger.warning(f"Failed to close OpenRouter connection pool: {exc}")
+
+@app.on_event("startup")
+async def warm_youtube_client():
+    """Build the shared YouTube service once, before the first analysis request."""
+    try:
+        from app.api.youtube.clients.pool import get_youtube_pool
+        if get_youtube_pool().warm():
+            logger.info("YouTube service pool ready.")
+    except Exception as exc:
+        logger.warning(f"Failed to build YouTube service: {exc}")
+
+@app.on_event("startup")
+async def ensure_rating_aggregates():
+    """Create the rating aggregate table, filling it from existing ratings on first run."""
+    try:
+        from app.database import SessionLocal
+        from app.api.rating_stats import ensure_aggregates
+        with SessionLocal() as db:
+            ensure_aggregates(db)
+    except Exception as exc:
+        logger.warning(f"Failed to prepare rating aggregates: {exc}")
+
+@app.on_event("startup")
+async def ensure_journal_store():
+    """Create the journal table and import a leftover entries.json."""
+    try:
+        from app.database import SessionLocal
+        from app.api.journal_store import ensure_journal_store as prepare_journals
+        with SessionLocal() as db:
+            prepare_journals(db)
+    except Exception as exc:
+        logger.warning(f"Failed to prepare journal store: {exc}")
+
+@app.on_event("startup")
+async def ensure_notes_store():
+    """Create the notes table when notes are stored in the database."""
+    try:
+        from app.api.notes.store import notes_store
+        notes_store.ensure()
+    except Exception as exc:
+        logger.warning(f"Failed to prepare notes store: {exc}")
+
+@app.on_event("startup")
+async def ensure_search_index():
+    """Re-index journals and notes if the search index is out of step with them."""
+    try:
+        from app.database import SessionLocal
+        from app.api.journal_store import sync_search_index as sync_journals
+        from app.api.notes.store import sync_search_index as sync_notes
+        with SessionLocal() as db:
+            sync_journals(db)
+        sync_notes()
+    except Exception as exc:
+        logger.warning(f"Failed to prepare search index: {exc}")
+
+@app.on_event("startup")
+async def preload_static_content():
+    """Load the breathing exercise and affirmation files before the first request."""
+    try:
+        from app.api.utils.static_content import static_content
+        static_content.preload()
+    except Exception as exc:
+        logger.warning(f"Failed to preload static content: {exc}")
+
+@app.on_event("startup")
+async def start_rating_buffer():
+    """Replay logged ratings, start batching rating writes and listen for stats invalidations."""
+    try:
+        from app.api.rating_cache import rating_stats_cache
+        from app.api.rating_ingest import RATING_WRITE_BEHIND, rating_buffer
+        rating_stats_cache.start()  # LISTEN for invalidations from other workers
+        if RATING_WRITE_BEHIND:
+            rating_buffer.start()
+            logger.info("Rating write-behind buffer started.")
+    except Exception as exc:
+        logger.warning(f"Failed to start rating buffer, ratings will be written directly: {exc}")
+
+@app.on_event("shutdown")
+async def stop_rating_buffer():
+    """Flush queued ratings before exiting."""
+    try:
+        from app.api.rating_cache import rating_stats_cache
+        from app.api.rating_ingest import rating_buffer
+        await rating_buffer.stop()
+        rating_stats_cache.stop()
+    except Exception as exc:
+        logger.warning(f"Failed to stop rating buffer: {exc}")
+
+@app.on_event("startup")
+async def start_meme_index():
+    """Scan meme images, load the memory match catalogue and keep both refreshed."""
+    try:
+        from app.api.games.memory_match import board_pool, image_manifest, meme_index
+        meme_index.start()  # The first load scans the image directory
+        image_manifest.start_watching()
+        board_pool.start()  # Fills once the index is ready
+        logger.info("Meme index loading in the background.")
+    except Exception as exc:
+        logger.warning(f"Failed to start meme index: {exc}")
+
+@app.on_event("shutdown")
+async def stop_meme_index():
+    """Stop the meme index refresh, board pool and image directory watcher tasks."""
+    try:
+        from app.api.games.memory_match import board_pool, image_manifest, meme_index
+        await board_pool.stop()
+        await image_manifest.stop()
+        await meme_index.stop()
+    except Exception as exc:
+        logger.warning(f"Failed to stop meme index: {exc}")
+
+@app.on_event("shutdown")
+async def stop_image_variant_workers():
+    """Stop the image variant worker processes."""
+    try:
+        from app.api.games.image_variants import variant_cache
+        variant_cache.shutdown()
+    except Exception as exc:
+        logger.warning(f"Failed to stop image variant workers: {exc}")
+
 logger.info("Including health_router...")
 try:
     app.include_router(health_router)  # No prefix, to allow root-level health checks
@@ -388,6 +517,7 @@ ADDITIONAL_ROUTES = [
     ("app.routers.breaths", "/api/breaths"),
     ("app.routers.journals", "/api/journals"),
     ("app.routers.memes", "/api/memes"),
+    ("app.routers.search", "/api"),
     # ("app.routers.ratings", "/api/ratings") # Already included below
 ]
 logger.info("ADDITIONAL_ROUTES list defined.")
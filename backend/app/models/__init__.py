@@ -5,8 +5,10 @@ This package contains all database model definitions using SQLAlchemy ORM.
 Models defined here are automatically mapped to database tables.
 """
 
-from app.models.rating import Rating
+from app.models.rating import Rating, RatingAggregate, RatingRollup
 from app.models.meme import MemeFetch
+from app.models.journal import JournalEntry, JournalEntryTag
+from app.models.note import Note
 from sqlalchemy import Column, Integer, String
 from app.database import Base
 
@@ -32,6 +34,11 @@ class TrainCleaned(Base):
 # Export all models for convenient importing
 __all__ = [
     "Rating",       # User ratings for activities
+    "RatingAggregate",  # Running rating totals per activity
+    "RatingRollup",     # Hourly/daily rating buckets per activity
     "MemeFetch",    # Meme data for memory match game
+    "JournalEntry", # Journal entries
+    "JournalEntryTag",  # Tag index for journal entries
+    "Note",         # Notes
     "TrainCleaned"  # Train dataset cleaned records
 ] 
\ No newline at end of file
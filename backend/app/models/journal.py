@@ -0,0 +1,60 @@
+from sqlalchemy import Column, String, Text, DateTime, JSON, ForeignKey, Index
+from app.database import Base
+
+class JournalEntry(Base):
+    """
+    Database model for journal entries.
+    
+    Replaces the data/journals/entries.json file: each entry is one row, so
+    creating, updating or deleting an entry writes only that row, inside a
+    transaction, and lookups by id use the primary key.
+    
+    The table includes:
+    - A UUID string ID (primary key)
+    - The entry text and mood
+    - The tags, stored as a JSON list
+    - Created and updated timestamps (naive UTC, like notes)
+    
+    Listing pages through (created_at, id), optionally within one mood, so
+    both orders have a matching index.
+    """
+    __tablename__ = "journal_entries"
+    __table_args__ = (
+        Index("ix_journal_entries_created_id", "created_at", "id"),
+        Index("ix_journal_entries_mood_created_id", "mood", "created_at", "id"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    content = Column(Text, nullable=False)
+    mood = Column(String, nullable=False, default="neutral")
+    tags = Column(JSON, nullable=False, default=list)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        """Serialise in the shape the JSON store returned"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "mood": self.mood,
+            "tags": list(self.tags or []),
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+
+
+class JournalEntryTag(Base):
+    """
+    One row per (tag, entry), kept in step with JournalEntry.tags.
+
+    The JSON tags column cannot be indexed portably; this table lets a tag
+    filter walk (tag, created_at, entry_id) in order.
+    """
+    __tablename__ = "journal_entry_tags"
+    __table_args__ = (
+        Index("ix_journal_entry_tags_tag_created", "tag", "created_at", "entry_id"),
+    )
+
+    tag = Column(String, primary_key=True)
+    entry_id = Column(String(36), ForeignKey("journal_entries.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime, nullable=False)  # Copied from the entry for ordered scans
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, String, Text, DateTime, JSON, Index
+from app.database import Base
+
+class Note(Base):
+    """
+    Database model for notes.
+    
+    Replaces the in-process notes dict, which lost every note on restart
+    and was not shared between workers.
+    
+    The table includes:
+    - A UUID string ID (primary key)
+    - The title and content
+    - The tags, stored as a JSON list
+    - Created and updated timestamps (naive UTC, as the API reports them)
+    """
+    __tablename__ = "notes"
+    __table_args__ = (
+        Index("ix_notes_created_id", "created_at", "id"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    title = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    tags = Column(JSON, nullable=False, default=list)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        """Serialise in the shape of the Note API schema"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "content": self.content,
+            "tags": list(self.tags or []),
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
@@ -43,4 +43,54 @@ class Rating(Base):
         self.rating_value = value
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+class RatingAggregate(Base):
+    """
+    Running totals of activity ratings, one row per activity type.
+
+    Maintained in the same transaction as each insert into
+    activity_rating_counts, so the count, sum and 1-5 histogram always match
+    the rating rows without scanning them. ``python -m app.api.rating_stats rebuild``
+    recomputes the table from the rating rows.
+    """
+    __tablename__ = "activity_rating_stats"
+
+    activity_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)  # Sum of rating values
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    @property
+    def average_rating(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def histogram(self):
+        return {str(value): getattr(self, f"rating_{value}") for value in range(1, 6)}
+
+
+class RatingRollup(Base):
+    """
+    Ratings per activity per hour or day, maintained alongside RatingAggregate.
+
+    The primary key (activity, granularity, bucket start) doubles as the
+    index for trend queries, so reading a window touches one row per bucket
+    regardless of how many ratings exist.
+    """
+    __tablename__ = "activity_rating_rollups"
+
+    activity_type = Column(String, primary_key=True)
+    granularity = Column(String(8), primary_key=True)  # "hour" or "day"
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)  # UTC
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)  # Sum of rating values
+
+    @property
+    def average_rating(self) -> float:
+        return self.total / self.count if self.count else 0.0
@@ -1,8 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
-import random
+from fastapi import APIRouter, HTTPException, Request, Response
 import os
-import json
+
+from app.api.utils.static_content import NO_STORE_CACHE_CONTROL, json_response, static_content
 
 router = APIRouter(
     prefix="/affirmations",
@@ -26,30 +25,21 @@ DEFAULT_AFFIRMATIONS = [
     "I am growing and evolving every day."
 ]
 
-def get_affirmations() -> List[str]:
-    """Load affirmations from the JSON file, or return defaults if file doesn't exist"""
-    try:
-        if os.path.exists(AFFIRMATIONS_FILE):
-            with open(AFFIRMATIONS_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("affirmations", DEFAULT_AFFIRMATIONS)
-        return DEFAULT_AFFIRMATIONS
-    except Exception as e:
-        print(f"Error loading affirmations: {e}")
-        return DEFAULT_AFFIRMATIONS
+# Loaded once; every response is rendered in advance
+affirmation_content = static_content.register(
+    "affirmations", AFFIRMATIONS_FILE, "affirmations", DEFAULT_AFFIRMATIONS,
+    item_payload=lambda affirmation: {"affirmation": affirmation},
+)
 
 @router.get("/")
-async def get_all_affirmations() -> Dict[str, List[str]]:
+async def get_all_affirmations(request: Request) -> Response:
     """Get all available affirmations"""
-    return {"affirmations": get_affirmations()}
+    return json_response(request, affirmation_content.all())
 
 @router.get("/random")
-async def get_random_affirmation() -> Dict[str, str]:
+async def get_random_affirmation(request: Request) -> Response:
     """Get a random affirmation"""
-    affirmations = get_affirmations()
-    
-    if not affirmations:
+    rendered = affirmation_content.random()
+    if rendered is None:
         raise HTTPException(status_code=404, detail="No affirmations available")
-    
-    random_affirmation = random.choice(affirmations)
-    return {"affirmation": random_affirmation} 
\ No newline at end of file
+    return json_response(request, rendered, NO_STORE_CACHE_CONTROL)
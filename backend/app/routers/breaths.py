@@ -1,8 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
-import random
+from fastapi import APIRouter, HTTPException, Request, Response
 import os
-import json
+
+from app.api.utils.static_content import NO_STORE_CACHE_CONTROL, json_response, static_content
 
 router = APIRouter(
     prefix="/breaths",
@@ -49,41 +48,26 @@ DEFAULT_BREATHING = [
     }
 ]
 
-def get_breathing_exercises() -> List[Dict[str, Any]]:
-    """Load breathing exercises from the JSON file, or return defaults if file doesn't exist"""
-    try:
-        if os.path.exists(BREATHING_FILE):
-            with open(BREATHING_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("exercises", DEFAULT_BREATHING)
-        return DEFAULT_BREATHING
-    except Exception as e:
-        print(f"Error loading breathing exercises: {e}")
-        return DEFAULT_BREATHING
+# Loaded once; every response is rendered in advance
+breathing_content = static_content.register("breaths", BREATHING_FILE, "exercises", DEFAULT_BREATHING, id_field="id")
 
 @router.get("/")
-async def get_all_exercises() -> Dict[str, List[Dict[str, Any]]]:
+async def get_all_exercises(request: Request) -> Response:
     """Get all available breathing exercises"""
-    return {"exercises": get_breathing_exercises()}
-
-@router.get("/{exercise_id}")
-async def get_exercise(exercise_id: int) -> Dict[str, Any]:
-    """Get a specific breathing exercise by ID"""
-    exercises = get_breathing_exercises()
-    
-    for exercise in exercises:
-        if exercise["id"] == exercise_id:
-            return exercise
-    
-    raise HTTPException(status_code=404, detail=f"Breathing exercise with ID {exercise_id} not found")
+    return json_response(request, breathing_content.all())
 
 @router.get("/random")
-async def get_random_exercise() -> Dict[str, Any]:
+async def get_random_exercise(request: Request) -> Response:
     """Get a random breathing exercise"""
-    exercises = get_breathing_exercises()
-    
-    if not exercises:
+    rendered = breathing_content.random()
+    if rendered is None:
         raise HTTPException(status_code=404, detail="No breathing exercises available")
-    
-    random_exercise = random.choice(exercises)
-    return random_exercise 
\ No newline at end of file
+    return json_response(request, rendered, NO_STORE_CACHE_CONTROL)
+
+@router.get("/{exercise_id}")
+async def get_exercise(exercise_id: int, request: Request) -> Response:
+    """Get a specific breathing exercise by ID"""
+    rendered = breathing_content.get(exercise_id)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail=f"Breathing exercise with ID {exercise_id} not found")
+    return json_response(request, rendered)
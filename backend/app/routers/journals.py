@@ -1,138 +1,114 @@
-from fastapi import APIRouter, HTTPException, Body
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-import os
 import json
-import uuid
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Body, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Iterator, Optional
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.api import journal_store
 
 router = APIRouter(
     prefix="/journals",
     tags=["journals"],
 )
 
-# Path to the journal entries data file
-JOURNALS_DIR = os.path.join("data", "journals")
-JOURNALS_FILE = os.path.join(JOURNALS_DIR, "entries.json")
+def get_journal_db():
+    """Database session for one request"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
-# Ensure the journals directory exists
-os.makedirs(JOURNALS_DIR, exist_ok=True)
+def entry_filters(
+    mood: Optional[str] = None,
+    tag: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Only entries created at or after this time (UTC unless an offset is given)"),
+    end: Optional[datetime] = Query(None, description="Only entries created before this time (UTC unless an offset is given)"),
+    order: str = Query("asc", regex="^(asc|desc)$"),
+) -> Dict[str, Any]:
+    """Filters shared by the listing and the export"""
+    return {"mood": mood, "tag": tag, "start": start, "end": end, "descending": order == "desc"}
 
-def get_journal_entries() -> List[Dict[str, Any]]:
-    """Load journal entries from the JSON file, or return an empty list if file doesn't exist"""
+@router.get("/")
+def get_all_entries(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    filters: Dict[str, Any] = Depends(entry_filters),
+    db: Session = Depends(get_journal_db)
+) -> Dict[str, Any]:
+    """Get one page of journal entries, oldest first unless order=desc"""
     try:
-        if os.path.exists(JOURNALS_FILE):
-            with open(JOURNALS_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("entries", [])
-        return []
-    except Exception as e:
-        print(f"Error loading journal entries: {e}")
-        return []
+        entries, next_cursor = journal_store.page_entries(db, limit, cursor, **filters)
+    except journal_store.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"entries": [entry.to_dict() for entry in entries], "next_cursor": next_cursor}
 
-def save_journal_entries(entries: List[Dict[str, Any]]) -> bool:
-    """Save journal entries to the JSON file"""
-    try:
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(JOURNALS_FILE), exist_ok=True)
-        
-        # Save the entries
-        with open(JOURNALS_FILE, 'w') as f:
-            json.dump({"entries": entries}, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving journal entries: {e}")
-        return False
+@router.get("/export")
+def export_entries(filters: Dict[str, Any] = Depends(entry_filters)) -> StreamingResponse:
+    """Stream every matching journal entry as newline-delimited JSON"""
+    def lines() -> Iterator[bytes]:
+        # Own session: the response body is sent after request dependencies are closed
+        with SessionLocal() as db:
+            for entry in journal_store.iter_entries(db, **filters):
+                yield (json.dumps(entry.to_dict()) + "\n").encode("utf-8")
 
-@router.get("/")
-async def get_all_entries() -> Dict[str, List[Dict[str, Any]]]:
-    """Get all journal entries"""
-    return {"entries": get_journal_entries()}
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="journal.ndjson"'},
+    )
 
 @router.get("/{entry_id}")
-async def get_entry(entry_id: str) -> Dict[str, Any]:
+def get_entry(entry_id: str, db: Session = Depends(get_journal_db)) -> Dict[str, Any]:
     """Get a specific journal entry by ID"""
-    entries = get_journal_entries()
-    
-    for entry in entries:
-        if entry["id"] == entry_id:
-            return entry
-    
-    raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found")
+    entry = journal_store.get_entry(db, entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found")
+    return entry.to_dict()
 
 @router.post("/")
-async def create_entry(
+def create_entry(
     content: str = Body(..., embed=True),
     mood: Optional[str] = Body(None, embed=True),
-    tags: Optional[List[str]] = Body(None, embed=True)
+    tags: Optional[List[str]] = Body(None, embed=True),
+    db: Session = Depends(get_journal_db)
 ) -> Dict[str, Any]:
     """Create a new journal entry"""
-    entries = get_journal_entries()
-    
-    # Create a new entry
-    new_entry = {
-        "id": str(uuid.uuid4()),
-        "content": content,
-        "mood": mood or "neutral",
-        "tags": tags or [],
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat()
-    }
-    
-    # Add to the list of entries
-    entries.append(new_entry)
-    
-    # Save the updated entries
-    if not save_journal_entries(entries):
+    try:
+        entry = journal_store.create_entry(db, content, mood, tags)
+    except Exception as e:
+        print(f"Error saving journal entry: {e}")
         raise HTTPException(status_code=500, detail="Failed to save journal entry")
-    
-    return new_entry
+    return entry.to_dict()
 
 @router.put("/{entry_id}")
-async def update_entry(
+def update_entry(
     entry_id: str,
     content: Optional[str] = Body(None, embed=True),
     mood: Optional[str] = Body(None, embed=True),
-    tags: Optional[List[str]] = Body(None, embed=True)
+    tags: Optional[List[str]] = Body(None, embed=True),
+    db: Session = Depends(get_journal_db)
 ) -> Dict[str, Any]:
     """Update an existing journal entry"""
-    entries = get_journal_entries()
-    
-    # Find the entry to update
-    for i, entry in enumerate(entries):
-        if entry["id"] == entry_id:
-            # Update the fields
-            if content is not None:
-                entry["content"] = content
-            if mood is not None:
-                entry["mood"] = mood
-            if tags is not None:
-                entry["tags"] = tags
-            
-            entry["updated_at"] = datetime.now().isoformat()
-            
-            # Save the updated entries
-            if not save_journal_entries(entries):
-                raise HTTPException(status_code=500, detail="Failed to save journal entry")
-            
-            return entry
-    
-    raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found")
+    try:
+        entry = journal_store.update_entry(db, entry_id, content, mood, tags)
+    except Exception as e:
+        print(f"Error saving journal entry: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save journal entry")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found")
+    return entry.to_dict()
 
 @router.delete("/{entry_id}")
-async def delete_entry(entry_id: str) -> Dict[str, bool]:
+def delete_entry(entry_id: str, db: Session = Depends(get_journal_db)) -> Dict[str, bool]:
     """Delete a journal entry"""
-    entries = get_journal_entries()
-    
-    # Find the entry to delete
-    for i, entry in enumerate(entries):
-        if entry["id"] == entry_id:
-            # Remove the entry
-            entries.pop(i)
-            
-            # Save the updated entries
-            if not save_journal_entries(entries):
-                raise HTTPException(status_code=500, detail="Failed to delete journal entry")
-            
-            return {"success": True}
-    
-    raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found") 
\ No newline at end of file
+    try:
+        deleted = journal_store.delete_entry(db, entry_id)
+    except Exception as e:
+        print(f"Error deleting journal entry: {e}")
+        raise HTTPException(status_code=500, detail="Failed to delete journal entry")
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Journal entry with ID {entry_id} not found")
+    return {"success": True}
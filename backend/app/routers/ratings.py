@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from typing import List, Dict, Any
+from sqlalchemy import text
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
 from app.database import get_db, SessionLocal
-from app.models.rating import Rating
-from app.schemas.rating import RatingCreate, Rating as RatingSchema, ActivityStats
+from app.api.rating_stats import GRANULARITIES, record_rating, get_aggregate, get_aggregates, get_trend
+from app.api.rating_ingest import rating_buffer
+from app.api.rating_cache import rating_stats_cache
+from starlette.concurrency import run_in_threadpool
+from app.schemas.rating import RatingCreate, Rating as RatingSchema, ActivityStats, ActivityTrend
 import logging
 import traceback
 import json
+import os
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Default trend window per granularity, and the most buckets one request may span
+TREND_DEFAULT_WINDOWS = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+TREND_MAX_BUCKETS = int(os.getenv("RATING_TREND_MAX_BUCKETS", "2000"))
+
+# How long a buffered rating waits for its flush before answering without stats
+RATING_ACK_TIMEOUT = float(os.getenv("RATING_ACK_TIMEOUT", "5"))
+
 # Helper function to add CORS headers to responses
 def add_cors_headers(response: Response):
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -103,22 +115,71 @@ async def debug_database(db: Session = Depends(get_db)):
             "stack_trace": stack_trace
         }
 
+def rating_response(rating: RatingCreate, rating_id, count: Optional[int], avg_rating: Optional[float], status_code: int = 200) -> Response:
+    """Build the create-rating response with CORS headers (stats are null when not yet known)"""
+    response_data = {
+        "rating": {
+            "id": rating_id,
+            "activity_key": rating.activity_key,
+            "rating": rating.rating
+        },
+        "stats": {
+            "activity_key": rating.activity_key,
+            "count": count,
+            "average_rating": avg_rating,
+            "total_ratings": count
+        } if count is not None else None
+    }
+    
+    response = Response(
+        content=json.dumps(response_data),
+        status_code=status_code,
+        media_type="application/json"
+    )
+    
+    # Add CORS headers
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    
+    return response
+
 @router.post("/", status_code=200)
-def create_rating(rating: RatingCreate, db: Session = Depends(get_db)):
+async def create_rating(rating: RatingCreate, db: Session = Depends(get_db)):
     """Create a new rating for an activity"""
+    if rating_buffer.running:
+        return await create_rating_buffered(rating)
+    return await run_in_threadpool(create_rating_direct, rating, db)
+
+async def create_rating_buffered(rating: RatingCreate) -> Response:
+    """Queue the rating for the next batched write (logged locally first, so it is durable)"""
+    try:
+        result = await rating_buffer.submit(rating.activity_key, rating.rating, timeout=RATING_ACK_TIMEOUT)
+    except Exception as e:
+        stack_trace = traceback.format_exc()
+        logger.error(f"Error queueing rating: {str(e)}\n{stack_trace}")
+        raise HTTPException(status_code=500, detail=f"Error creating rating: {str(e)}")
+    
+    if result is None:
+        # Logged but not yet written: it will be on a later flush, so no id or stats yet
+        logger.warning(f"Rating for {rating.activity_key} queued; flush did not complete within {RATING_ACK_TIMEOUT}s")
+        return rating_response(rating, None, None, None, status_code=202)
+    if result.count is None:
+        # Written, but the stats could not be read afterwards
+        return rating_response(rating, result.rating_id, None, None, status_code=202)
+    return rating_response(rating, result.rating_id, result.count, result.average_rating)
+
+def create_rating_direct(rating: RatingCreate, db: Session) -> Response:
+    """Write the rating in its own transaction"""
     try:
         logger.info(f"Creating rating for activity_key={rating.activity_key}, rating={rating.rating}")
         
-        # Create new rating record with very minimal fields
+        # Create new rating record with very minimal fields, updating the
+        # activity's running totals in the same transaction
         try:
-            db_rating = Rating(
-                activity_type=rating.activity_key,
-                rating_value=rating.rating,
-                user_id=None
-            )
-            
-            db.add(db_rating)
+            db_rating = record_rating(db, rating.activity_key, rating.rating)
             db.commit()
+            rating_stats_cache.publish([rating.activity_key])
             db.refresh(db_rating)
             logger.info(f"Successfully saved rating ID={db_rating.id}")
         except Exception as e:
@@ -128,16 +189,12 @@ def create_rating(rating: RatingCreate, db: Session = Depends(get_db)):
         
         # Try to get updated stats for the activity
         try:
-            stats = db.query(
-                Rating.activity_type,
-                func.count(Rating.id).label("count"),
-                func.avg(Rating.rating_value).label("avg_rating")
-            ).filter(Rating.activity_type == rating.activity_key).group_by(Rating.activity_type).first()
+            stats = get_aggregate(db, rating.activity_key)
             
             if stats:
-                logger.info(f"Retrieved stats: {stats}")
+                logger.info(f"Retrieved stats: count={stats.count}, total={stats.total}")
                 count = stats.count
-                avg_rating = float(stats.avg_rating)
+                avg_rating = float(stats.average_rating)
             else:
                 # No stats, use the current rating
                 logger.info("No existing stats, using current rating")
@@ -151,50 +208,26 @@ def create_rating(rating: RatingCreate, db: Session = Depends(get_db)):
             avg_rating = float(rating.rating)
         
         # Create response with CORS headers
-        response_data = {
-            "rating": {
-                "id": db_rating.id,
-                "activity_key": rating.activity_key,
-                "rating": rating.rating
-            },
-            "stats": {
-                "activity_key": rating.activity_key,
-                "count": count,
-                "average_rating": avg_rating,
-                "total_ratings": count
-            }
-        }
-        
-        response = Response(
-            content=json.dumps(response_data),
-            media_type="application/json"
-        )
-        
-        # Add CORS headers
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-        
-        return response
+        return rating_response(rating, db_rating.id, count, avg_rating)
     except Exception as e:
         stack_trace = traceback.format_exc()
         logger.error(f"Error while creating rating: {str(e)}\n{stack_trace}")
         raise HTTPException(status_code=500, detail=f"Error while creating rating: {str(e)}")
 
 @router.put("/")
-def update_rating(rating: RatingCreate, db: Session = Depends(get_db)):
+async def update_rating(rating: RatingCreate, db: Session = Depends(get_db)):
     """Update an existing rating by creating a new one"""
-    return create_rating(rating, db)
+    return await create_rating(rating, db)
 
 @router.post("/{id}")
-def create_rating_with_id(id: str, rating: RatingCreate, db: Session = Depends(get_db)):
+async def create_rating_with_id(id: str, rating: RatingCreate, db: Session = Depends(get_db)):
     """Create a rating with a specified ID (ID is ignored)"""
-    return create_rating(rating, db)
+    return await create_rating(rating, db)
 
 @router.put("/{id}")
-def update_rating_with_id(id: str, rating: RatingCreate, db: Session = Depends(get_db)):
+async def update_rating_with_id(id: str, rating: RatingCreate, db: Session = Depends(get_db)):
     """Update a rating with a specified ID (ID is ignored)"""
-    return create_rating(rating, db)
+    return await create_rating(rating, db)
 
 @router.get("/")
 def get_all_stats():
@@ -203,14 +236,16 @@ def get_all_stats():
         logger.info("Getting statistics for all activities")
         
         try:
+            # Served from memory until a rating is written by any worker
+            generation = rating_stats_cache.generation
+            cached = rating_stats_cache.get("*")
+            if cached is not None:
+                return cached
+            
             # Use direct session instead of generator
             db = get_db_session()
             try:
-                stats = db.query(
-                    Rating.activity_type,
-                    func.count(Rating.id).label("count"),
-                    func.avg(Rating.rating_value).label("avg_rating")
-                ).group_by(Rating.activity_type).all()
+                stats = get_aggregates(db)
                 
                 if stats:
                     logger.info(f"Retrieved stats for {len(stats)} activities")
@@ -219,13 +254,14 @@ def get_all_stats():
                         results.append(ActivityStats(
                             activity_key=stat.activity_type,
                             count=stat.count,
-                            average_rating=float(stat.avg_rating),
+                            average_rating=float(stat.average_rating),
                             total_ratings=stat.count
                         ))
-                    return results
                 else:
                     logger.info("No ratings found in database")
-                    return []
+                    results = []
+                rating_stats_cache.put("*", results, generation)
+                return results
             finally:
                 db.close()
         except Exception as e:
@@ -237,6 +273,64 @@ def get_all_stats():
         logger.error(f"Error while getting all statistics: {str(e)}\n{stack_trace}")
         return []
 
+def activity_stats_response(stats: ActivityStats) -> Response:
+    """Return activity stats as JSON with CORS headers"""
+    # Convert to dict and return as JSON with CORS headers
+    response_data = stats.dict()
+    response = Response(
+        content=json.dumps(response_data),
+        media_type="application/json"
+    )
+    
+    # Add CORS headers
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    
+    return response
+
+@router.get("/trends/{activity_key}", response_model=ActivityTrend)
+def get_activity_trend(
+    activity_key: str,
+    granularity: str = Query("day", description="Bucket size: 'hour' or 'day'"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601, default: 48 hours or 30 days before end)"),
+    end: Optional[datetime] = Query(None, description="Window end, exclusive (ISO 8601, default: now)")
+):
+    """Get rating counts and averages per hour or day for an activity"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Granularity must be one of {sorted(GRANULARITIES)}")
+    end = end or datetime.now(timezone.utc)
+    start = start or end - TREND_DEFAULT_WINDOWS[granularity]
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / GRANULARITIES[granularity] > TREND_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Window spans more than {TREND_MAX_BUCKETS} {granularity} buckets")
+    
+    try:
+        db = get_db_session()
+        try:
+            buckets = get_trend(db, activity_key, granularity, start, end)
+        finally:
+            db.close()
+    except Exception as e:
+        stack_trace = traceback.format_exc()
+        logger.error(f"Error getting rating trend for {activity_key}: {str(e)}\n{stack_trace}")
+        raise HTTPException(status_code=500, detail=f"Error getting rating trend: {str(e)}")
+    
+    trend = ActivityTrend(activity_key=activity_key, granularity=granularity, start=start, end=end, buckets=buckets)
+    response = Response(content=trend.json(), media_type="application/json")
+    
+    # Add CORS headers
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    
+    return response
+
 @router.get("/{activity_key}", response_model=ActivityStats)
 def get_activity_stats(activity_key: str):
     """Get statistics for a specific activity"""
@@ -244,22 +338,24 @@ def get_activity_stats(activity_key: str):
         logger.info(f"Getting statistics for activity {activity_key}")
         
         try:
+            # Served from memory until a rating is written by any worker
+            generation = rating_stats_cache.generation
+            stats = rating_stats_cache.get(activity_key)
+            if stats is not None:
+                return activity_stats_response(stats)
+            
             # Use direct session instead of generator
             db = get_db_session()
             try:
                 # Make sure to use db directly, not as a generator
-                stat = db.query(
-                    Rating.activity_type,
-                    func.count(Rating.id).label("count"),
-                    func.avg(Rating.rating_value).label("avg_rating")
-                ).filter(Rating.activity_type == activity_key).group_by(Rating.activity_type).first()
+                stat = get_aggregate(db, activity_key)
                 
                 if stat:
-                    logger.info(f"Retrieved stats: count={stat.count}, avg={stat.avg_rating}")
+                    logger.info(f"Retrieved stats: count={stat.count}, avg={stat.average_rating}")
                     stats = ActivityStats(
                         activity_key=activity_key,
                         count=stat.count,
-                        average_rating=float(stat.avg_rating),
+                        average_rating=float(stat.average_rating),
                         total_ratings=stat.count
                     )
                 else:
@@ -270,20 +366,9 @@ def get_activity_stats(activity_key: str):
                         average_rating=0.0,
                         total_ratings=0
                     )
+                rating_stats_cache.put(activity_key, stats, generation)
                 
-                # Convert to dict and return as JSON with CORS headers
-                response_data = stats.dict()
-                response = Response(
-                    content=json.dumps(response_data),
-                    media_type="application/json"
-                )
-                
-                # Add CORS headers
-                response.headers["Access-Control-Allow-Origin"] = "*"
-                response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-                response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-                
-                return response
+                return activity_stats_response(stats)
             finally:
                 db.close()
         except Exception as e:
@@ -297,19 +382,7 @@ def get_activity_stats(activity_key: str):
                 total_ratings=0
             )
             
-            # Convert to dict and return as JSON with CORS headers
-            response_data = stats.dict()
-            response = Response(
-                content=json.dumps(response_data),
-                media_type="application/json"
-            )
-            
-            # Add CORS headers
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-            
-            return response
+            return activity_stats_response(stats)
     except Exception as e:
         stack_trace = traceback.format_exc()
         logger.error(f"Error while getting statistics for activity {activity_key}: {str(e)}\n{stack_trace}")
@@ -321,16 +394,4 @@ def get_activity_stats(activity_key: str):
             total_ratings=0
         )
         
-        # Convert to dict and return as JSON with CORS headers
-        response_data = stats.dict()
-        response = Response(
-            content=json.dumps(response_data),
-            media_type="application/json"
-        )
-        
-        # Add CORS headers
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-        
-        return response 
\ No newline at end of file
+        return activity_stats_response(stats) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional
+from datetime import datetime
+
+from app.api.search_index import SearchUnavailable, search_index
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=1, max_length=500, description="Words that must all appear; word* matches a prefix"),
+    kind: Optional[str] = Query(None, regex="^(journal|note)$"),
+    tag: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Only documents created at or after this time (UTC unless an offset is given)"),
+    end: Optional[datetime] = Query(None, description="Only documents created before this time (UTC unless an offset is given)"),
+    limit: int = Query(20, ge=1, le=100)
+) -> Dict[str, Any]:
+    """Search journal entries and notes, best matches first"""
+    try:
+        results = await run_in_threadpool(search_index.search, q, limit, kind, tag, start, end)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"query": q, "results": results}
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, conint
 
 class RatingBase(BaseModel):
@@ -26,4 +26,16 @@ class ActivityStats(BaseModel):
     activity_key: str
     count: int
     average_rating: float
-    total_ratings: int 
\ No newline at end of file
+    total_ratings: int 
+
+class TrendBucket(BaseModel):
+    start: datetime
+    count: int
+    average_rating: float
+
+class ActivityTrend(BaseModel):
+    activity_key: str
+    granularity: str
+    start: datetime
+    end: datetime
+    buckets: List[TrendBucket]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Meme image cache benchmark
+
+Measures requests/sec for the memory match image endpoint served from the
+in-memory byte cache against the previous FileResponse path (stat, open and
+read per request). Requests are driven in-process through the ASGI app, so
+the numbers reflect server-side cost rather than network latency.
+
+Usage:
+    python scripts/benchmark_image_cache.py [image_dir] [requests] [concurrency]
+"""
+
+import sys
+import time
+import random
+import asyncio
+import tempfile
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.games import memory_match  # noqa: E402
+from app.api.utils.byte_cache import image_cache  # noqa: E402
+
+
+def make_sample_images(directory, count=25):
+    """Create sample JPEGs when no image directory is given"""
+    from PIL import Image
+    for i in range(count):
+        Image.effect_noise((480, 360), 40 + i).convert("RGB").save(directory / f"bench_{i}.jpg", quality=85)
+
+
+def build_app():
+    app = FastAPI()
+    app.include_router(memory_match.router, prefix="/api/games/memory_match")
+
+    # The previous serving path, kept here as the baseline
+    @app.get("/baseline/{image_filename}")
+    async def baseline(image_filename: str, request: Request):
+        image_path = memory_match.MEME_IMAGE_DIR / image_filename
+        if not image_path.is_file():
+            return FileResponse(str(image_path), status_code=404)
+        response = FileResponse(str(image_path), media_type="image/jpeg")
+        return memory_match.add_cors_headers(response, request)
+
+    return app
+
+
+async def run(app, path_template, names, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = [path_template.format(name=random.choice(names)) for _ in range(total)]
+        transferred = 0
+
+        async def worker():
+            nonlocal transferred
+            while queue:
+                response = await client.get(queue.pop())
+                assert response.status_code == 200, response.status_code
+                transferred += len(response.content)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, transferred
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    if len(sys.argv) > 1:
+        image_dir = Path(sys.argv[1])
+    else:
+        image_dir = Path(tempfile.mkdtemp(prefix="meme_bench_"))
+        make_sample_images(image_dir)
+    names = sorted(p.name for p in image_dir.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:25]
+
+    memory_match.MEME_IMAGE_DIR = image_dir
+    memory_match.image_manifest.image_dir = image_dir
+    memory_match.image_manifest.scan()
+    app = build_app()
+
+    print(f"Benchmarking {total} requests over {len(names)} images from {image_dir} (concurrency {concurrency})")
+    results = {}
+    for label, path in [
+        ("FileResponse (baseline)", "/baseline/{name}"),
+        ("Byte cache (memoryview)", "/api/games/memory_match/images/{name}"),
+    ]:
+        asyncio.run(run(app, path, names, min(200, total), concurrency))  # Warm up (fills the cache)
+        rps, transferred = asyncio.run(run(app, path, names, total, concurrency))
+        results[label] = rps
+        print(f"{label:<26} {rps:10.1f} req/s  ({transferred / total / 1024:.1f} KiB/response)")
+
+    baseline, cached = results.values()
+    print(f"\nSpeed-up: {cached / baseline:.2f}x")
+    print(f"Cache stats: {image_cache.stats()}")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Relaxation endpoint response cache benchmark
+
+Measures requests/sec for the relaxation endpoints served as pre-serialised
+bytes through ``cached_response``, against the previous path where each
+request rebuilds the dict and FastAPI encodes it with ``jsonable_encoder``
+and ``json.dumps``. Requests are driven in-process through the ASGI app, so
+the numbers reflect server-side cost rather than network latency.
+
+Usage:
+    python scripts/benchmark_response_cache.py [requests] [concurrency]
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.relaxation import routes as relaxation  # noqa: E402
+from app.api.utils.response_cache import HAS_ORJSON, dumps  # noqa: E402
+
+PATHS = ["/", "/breathing", "/meditation", "/stretching"]
+
+
+def build_app(cached):
+    app = FastAPI()
+    if cached:
+        app.include_router(relaxation.router, prefix="/api/relaxation")
+        return app
+
+    # The previous path, kept here as the baseline: the undecorated functions
+    for path, endpoint in [
+        ("/", relaxation.relaxation_root),
+        ("/breathing", relaxation.breathing_exercises),
+        ("/meditation", relaxation.meditation_exercises),
+        ("/stretching", relaxation.stretching_exercises),
+    ]:
+        app.get(f"/api/relaxation{path}")(endpoint.__wrapped__)
+    return app
+
+
+async def run(app, total, concurrency, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = [f"/api/relaxation{random.choice(PATHS)}" for _ in range(total)]
+
+        async def worker():
+            while queue:
+                response = await client.get(queue.pop(), headers=headers)
+                assert response.status_code in (200, 304), response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    print(f"Benchmarking {total} requests over {len(PATHS)} endpoints (concurrency {concurrency}, orjson: {HAS_ORJSON})")
+    baseline_app, cached_app = build_app(cached=False), build_app(cached=True)
+    results = {}
+    for label, app, headers in [
+        ("dict + jsonable_encoder", baseline_app, None),
+        ("cached bytes", cached_app, None),
+        ("cached bytes, 304", cached_app, {"If-None-Match": "*"}),
+    ]:
+        asyncio.run(run(app, min(500, total), concurrency, headers))  # Warm up (fills the cache)
+        rps = asyncio.run(run(app, total, concurrency, headers))
+        results[label] = rps
+        print(f"{label:<24} {rps:10.1f} req/s")
+
+    baseline = results["dict + jsonable_encoder"]
+    print(f"\nSpeed-up: {results['cached bytes'] / baseline:.2f}x (200), {results['cached bytes, 304'] / baseline:.2f}x (304)")
+
+    # Encoding alone, without the ASGI stack
+    payload = asyncio.run(relaxation.breathing_exercises.__wrapped__())
+    calls = 20000
+    for label, encode in [
+        ("jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(payload)).encode("utf-8")),
+        ("orjson" if HAS_ORJSON else "json.dumps", lambda: dumps(payload)),
+    ]:
+        started = time.perf_counter()
+        for _ in range(calls):
+            encode()
+        print(f"Encoding /breathing with {label}: {(time.perf_counter() - started) / calls * 1e6:.1f} us")
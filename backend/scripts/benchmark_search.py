@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Journal search benchmark
+
+Indexes synthetic journal entries (100k by default) in each available
+search backend, then measures query latency for single words, multi-word
+queries, prefixes, and tag/date-filtered queries. The index is used
+directly, without the API, so the numbers show the cost of the index alone.
+
+Usage:
+    python scripts/benchmark_search.py [entries] [queries]
+"""
+
+import sys
+import time
+import random
+import itertools
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.search_index import Fts5Backend, SearchDocument, SearchIndex  # noqa: E402
+
+MOODS = ["happy", "calm", "tired", "anxious", "proud", "sad", "neutral"]
+TAGS = ["work", "family", "health", "creative", "sleep", "social", "goals", "gratitude"]
+
+
+def make_vocabulary(size=20000):
+    rng = random.Random(7)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)}
+    return sorted(words)
+
+
+def make_documents(count, vocabulary):
+    """Entries with Zipf-like word frequencies, spread over two years"""
+    rng = random.Random(42)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    first = datetime(2024, 1, 1)
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(20, 120))
+        yield SearchDocument(
+            "journal",
+            f"entry-{i}",
+            "",
+            " ".join(words) + f" {rng.choice(MOODS)}",
+            tuple(rng.sample(TAGS, rng.randint(0, 3))),
+            (first + timedelta(minutes=10 * i)).isoformat(),
+        )
+
+
+def make_queries(count, vocabulary):
+    rng = random.Random(1)
+    common, rare = vocabulary[:200], vocabulary[200:5000]
+    month = timedelta(days=30)
+    queries = []
+    for _ in range(count):
+        shape = rng.choice(["word", "two words", "prefix", "tag", "date range"])
+        kwargs = {}
+        if shape == "word":
+            query = rng.choice(rare)
+        elif shape == "two words":
+            query = f"{rng.choice(common)} {rng.choice(rare)}"
+        elif shape == "prefix":
+            query = rng.choice(rare)[:3] + "*"
+        elif shape == "tag":
+            query, kwargs = rng.choice(common), {"tag": rng.choice(TAGS)}
+        else:
+            start = datetime(2024, 1, 1) + rng.randint(0, 18) * month
+            query, kwargs = rng.choice(common), {"start": start, "end": start + month}
+        queries.append((shape, query, kwargs))
+    return queries
+
+
+def bench(index, queries):
+    by_shape = {}
+    for shape, query, kwargs in queries:
+        started = time.perf_counter()
+        index.search(query, limit=20, **kwargs)
+        by_shape.setdefault(shape, []).append((time.perf_counter() - started) * 1000)
+    return by_shape
+
+
+def report(by_shape):
+    print(f"  {'query':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for shape, timings in sorted(by_shape.items()):
+        everything.extend(timings)
+        quantiles = statistics.quantiles(timings, n=100)
+        print(f"  {shape:<12} {statistics.median(timings):8.2f} {quantiles[94]:8.2f} {quantiles[98]:8.2f}")
+    quantiles = statistics.quantiles(everything, n=100)
+    print(f"  {'all':<12} {statistics.median(everything):8.2f} {quantiles[94]:8.2f} {quantiles[98]:8.2f}")
+
+
+if __name__ == "__main__":
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    vocabulary = make_vocabulary()
+    queries = make_queries(query_count, vocabulary)
+    backends = ["fts5", "python"] if Fts5Backend.available() else ["python"]
+
+    for backend in backends:
+        index = SearchIndex(backend=backend, path=str(Path(tempfile.mkdtemp(prefix="search_bench_")) / "index.db"))
+        started = time.perf_counter()
+        index.reindex("journal", make_documents(entries, vocabulary))
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(200):
+            doc = next(make_documents(1, vocabulary))
+            index.add(doc._replace(doc_id=f"entry-{i}"))
+        update = (time.perf_counter() - started) / 200 * 1000
+
+        print(f"\n{backend}: indexed {entries} entries in {build:.1f}s, {update:.2f} ms per incremental update")
+        bench(index, queries[:50])  # Warm up
+        report(bench(index, queries))
+        index.close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Meme image caching test script
+
+This script checks that meme images are served with strong validators and
+long-lived caching, and that repeat loads transfer zero body bytes.
+
+Usage:
+    python scripts/test_image_caching.py [base_url] [image_name]
+"""
+
+import os
+import sys
+
+import requests
+
+IMAGE_ROUTES = [
+    "/api/games/memory_match/images/{name}",
+    "/api/games/memory_match/images/{name}?size=thumb",
+    "/memes/{name}",
+]
+
+
+def check(condition, message, failures):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def test_image_route(base_url, path, timeout=10):
+    """
+    Load an image once, then repeat the load the way a browser revalidates it
+    """
+    failures = []
+    url = f"{base_url}{path}"
+    print(f"\nTesting {url}")
+
+    first = requests.get(url, headers={"Accept": "image/webp,*/*"}, timeout=timeout)
+    if first.status_code == 404:
+        print(f"⚠️  {path} returned 404, skipping")
+        return failures
+    check(first.status_code == 200, f"first load returns 200 (got {first.status_code})", failures)
+    etag = first.headers.get("ETag")
+    last_modified = first.headers.get("Last-Modified")
+    cache_control = first.headers.get("Cache-Control", "")
+    check(bool(etag) and not etag.startswith("W/"), f"strong ETag present ({etag})", failures)
+    check("immutable" in cache_control and "max-age=31536000" in cache_control,
+          f"long-lived immutable Cache-Control ({cache_control})", failures)
+    check(len(first.content) > 0, f"first load transfers the image ({len(first.content)} bytes)", failures)
+
+    # Repeat load with the ETag: nothing but headers should come back
+    repeat = requests.get(url, headers={"Accept": "image/webp,*/*", "If-None-Match": etag or ""}, timeout=timeout)
+    check(repeat.status_code == 304, f"If-None-Match revalidation returns 304 (got {repeat.status_code})", failures)
+    check(len(repeat.content) == 0, f"repeat load transfers zero body bytes (got {len(repeat.content)})", failures)
+    check(repeat.headers.get("ETag") == etag, "304 repeats the ETag", failures)
+
+    if last_modified:
+        repeat = requests.get(url, headers={"Accept": "image/webp,*/*", "If-Modified-Since": last_modified}, timeout=timeout)
+        check(repeat.status_code == 304 and len(repeat.content) == 0,
+              f"If-Modified-Since revalidation returns 304 with no body (got {repeat.status_code})", failures)
+
+    # Byte ranges
+    partial = requests.get(url, headers={"Accept": "image/webp,*/*", "Range": "bytes=0-99"}, timeout=timeout)
+    check(partial.status_code == 206, f"Range request returns 206 (got {partial.status_code})", failures)
+    check(partial.content == first.content[:100], "Range body matches the first 100 bytes", failures)
+    check(partial.headers.get("Content-Range", "").startswith("bytes 0-99/"),
+          f"Content-Range header ({partial.headers.get('Content-Range')})", failures)
+
+    outside = requests.get(url, headers={"Accept": "image/webp,*/*", "Range": f"bytes={len(first.content) + 10}-"}, timeout=timeout)
+    check(outside.status_code == 416, f"unsatisfiable Range returns 416 (got {outside.status_code})", failures)
+    return failures
+
+
+if __name__ == "__main__":
+    base_url = os.environ.get("TEST_URL") or (sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000")
+    image_name = os.environ.get("TEST_IMAGE") or (sys.argv[2] if len(sys.argv) > 2 else "image_1.jpg")
+
+    print(f"Testing image caching on {base_url} with {image_name}")
+    all_failures = []
+    for route in IMAGE_ROUTES:
+        all_failures.extend(test_image_route(base_url, route.format(name=image_name)))
+
+    print("\nSummary:")
+    print(f"{'✅ All tests passed!' if not all_failures else '❌ Some tests failed!'}")
+    sys.exit(1 if all_failures else 0)